@@ -1,7 +1,9 @@
 import os
 import json
-from datetime import datetime
-from flask import Flask, render_template, session, request, jsonify, redirect, url_for
+import math
+import click
+from datetime import datetime, timezone
+from flask import Flask, render_template, session, request, jsonify, redirect, url_for, g, make_response
 from mm.repositories.transactions import TransactionRepository
 from mm.repositories.scopes import ScopeRepository
 from mm.repositories.wallets import WalletRepository
@@ -9,13 +11,19 @@ from mm.repositories.categories import CategoryRepository
 from mm.repositories.ai_chats import AiChatRepository
 from mm.repositories.users import UserRepository
 from bson import ObjectId
-from config import ensure_indexes
-# from model import index_specs
 from config import get_gemini_api_key
 from mm.repositories.manual_balance import ManualBalanceRepository
 from mm.repositories.share_public import SharePublicRepository
+from mm.repositories.balance_checkpoints import BalanceCheckpointRepository
+from mm.repositories.tx_rollups import TxRollupRepository, months_between
+from mm.repositories.tag_stats import TagStatsRepository
 from mm.repositories.base import MongoRepository
-from mm.services.wallet_balance_worker import start_wallet_balance_worker
+from mm.services.wallet_balance_worker import start_wallet_balance_worker, get_worker_stats
+from mm.services.balance_cache import get_total_balance
+from mm.services import analytics
+from mm.services import share_cache
+from mm.services.data_version import get_data_version, data_version_time
+from mm.services.index_migrations import apply_index_migrations, index_report
 import traceback
 
 ocr_import_error = None
@@ -31,13 +39,64 @@ app.secret_key = "your-secret-key-here"
 
 start_wallet_balance_worker()
 
-# Ensure database indexes (with error handling)
-# try:
-#     ensure_indexes(index_specs)
-#     print("✅ Database indexes created successfully")
-# except Exception as e:
-#     print(f"⚠️ Warning: Could not create database indexes: {e}")
-#     print("Application will continue without indexes...")
+# Apply pending index migrations (one find_one when already up to date)
+if os.getenv("INDEX_MIGRATIONS_ON_STARTUP", "1") == "1":
+    try:
+        apply_index_migrations()
+    except Exception as e:
+        print(f"⚠️ Warning: Could not apply index migrations: {e}")
+        print("Application will continue without indexes...")
+
+
+@app.cli.command("rebuild-tag-stats")
+@click.option("--user", "user_id", default=None, help="Only rebuild this user_id")
+def rebuild_tag_stats_command(user_id):
+    """Recompute the per-user tag_stats documents from transactions."""
+    tag_repo = TagStatsRepository()
+    if user_id:
+        results = {user_id: tag_repo.rebuild_user(user_id)}
+    else:
+        results = tag_repo.rebuild_all()
+    print(f"✅ [TAG_STATS] Rebuilt {len(results)} user(s), {sum(results.values())} tag(s)")
+
+
+@app.cli.command("rebuild-search-terms")
+@click.option("--user", "user_id", default=None, help="Only rebuild this user_id")
+@click.option("--all", "rebuild_all", is_flag=True, help="Rewrite rows that already have search terms too")
+def rebuild_search_terms_command(user_id, rebuild_all):
+    """Backfill the _search_terms used by the transaction search."""
+    written = TransactionRepository().rebuild_search_terms(user_id, only_missing=not rebuild_all)
+    print(f"✅ [SEARCH] Updated {written} transaction(s)")
+
+
+@app.cli.command("migrate-indexes")
+@click.option("--to", "target_version", type=int, default=None, help="Stop at this migration version")
+def migrate_indexes_command(target_version):
+    """Apply pending versioned index migrations."""
+    applied = apply_index_migrations(target_version)
+    if not applied:
+        print("✅ [INDEXES] Already up to date")
+
+
+@app.cli.command("index-report")
+@click.option("--collection", "collections", multiple=True, help="Only report these collections")
+def index_report_command(collections):
+    """Report missing/unused indexes ($indexStats) and explain plans of hot queries."""
+    print(json.dumps(index_report(collections or None), indent=2, default=str))
+
+
+@app.cli.command("rebuild-rollups")
+@click.option("--user", "user_id", default=None, help="Only rebuild this user_id")
+def rebuild_rollups_command(user_id):
+    """Recompute the tx_rollups monthly sums from transactions."""
+    rollup_repo = TxRollupRepository()
+    if user_id:
+        results = {user_id: rollup_repo.rebuild_user(user_id)}
+    else:
+        results = rollup_repo.rebuild_all()
+    for uid, rows in results.items():
+        print(f"✅ [ROLLUPS] {uid}: {rows} rows")
+    print(f"✅ [ROLLUPS] Rebuilt {len(results)} user(s)")
 
 # Context processor to add total balance and username to all templates
 @app.context_processor
@@ -48,16 +107,11 @@ def inject_global_data():
         username = session.get("username")
            
         if user_id:
-            # Calculate total balance using the same logic as dashboard
-            # Get latest balance_after from all wallets up to current time
-            current_timestamp = int(datetime.now().timestamp())
-            total_balance = calculate_balance_from_transactions(user_id, current_timestamp)
-            
-            # If no transactions found, fallback to wallet actual_balance
-            if total_balance == "-":
-                wallet_repo = WalletRepository()
-                wallets = wallet_repo.list_by_user(user_id)
-                total_balance = sum(float(wallet.get("actual_balance", 0)) for wallet in wallets)
+            # Memoised per request (nested renders) and cached per user until
+            # the wallet balance worker touches that user's balances
+            if "total_balance" not in g:
+                g.total_balance = get_total_balance(user_id, lambda: _compute_total_balance(user_id))
+            total_balance = g.total_balance
 
             return {
                 "total_balance": total_balance,
@@ -78,6 +132,18 @@ def inject_global_data():
             "username": "User"
         }
 
+def _compute_total_balance(user_id):
+    """Total balance as of now: latest balance_after per wallet, else wallet actual_balance."""
+    current_timestamp = int(datetime.now().timestamp())
+    total_balance = calculate_balance_from_transactions(user_id, current_timestamp)
+
+    # If no transactions found, fallback to wallet actual_balance
+    if total_balance == "-":
+        wallet_repo = WalletRepository()
+        wallets = wallet_repo.list_by_user(user_id)
+        total_balance = sum(float(wallet.get("actual_balance", 0)) for wallet in wallets)
+    return total_balance
+
 # Helper function to check authentication
 def require_login():
     """Check if user is logged in, redirect to login if not"""
@@ -167,11 +233,11 @@ def dashboard():
         end_timestamp = int(end_date.timestamp())
         
         # Get data for current month only
-        transactions = tx_repo.get_user_transactions_by_date_range(user_id, start_timestamp, end_timestamp, limit=10)
+        transactions = tx_repo.get_user_transactions_by_date_range(user_id, start_timestamp, end_timestamp, limit=10, projection="list-row")
         
         # If no transactions in current month, get recent transactions from all time
         if not transactions:
-            transactions = tx_repo.get_user_transactions_simple(user_id, limit=10)
+            transactions = tx_repo.get_user_transactions_simple(user_id, limit=10, projection="list-row")
         
         # Filter out system categories (Transfer and Balance Adjustment)
         system_categories = ["transfer", "balance_adjustment"]
@@ -212,24 +278,11 @@ def dashboard():
         # Get current month name for display
         current_month_name = current_date.strftime('%B %Y')
         
-        # Process tags data - get all user transactions to count tags (excluding system categories)
-        all_transactions = tx_repo.get_user_transactions_simple(user_id, limit=1000)  # Get more transactions for better tag analysis
-        all_transactions = [tx for tx in all_transactions if tx.get("category_id") not in system_categories]
-        tag_counts = {}
-        
-        for tx in all_transactions:
-            tags = tx.get("tags", [])
-            if isinstance(tags, list) and tags:
-                for tag in tags:
-                    if tag and tag.strip():  # Skip empty tags
-                        tag = tag.strip().lower()
-                        tag_counts[tag] = tag_counts.get(tag, 0) + 1
-            elif isinstance(tags, str) and tags.strip():
-                tag = tags.strip().lower()
-                tag_counts[tag] = tag_counts.get(tag, 0) + 1
-        
-        # Get top 5 most used tags
-        top_tags = sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)[:5]
+        # Top 5 most used tags (excluding system categories) from the maintained tag stats
+        top_tags = [
+            (row["tag"], row["count"])
+            for row in TagStatsRepository().top_tags(user_id, limit=5, lowercase=True)
+        ]
         
         return render_template("dashboard.html", 
                              transactions=transactions,
@@ -315,18 +368,26 @@ def api_dashboard_data():
         tx_repo = TransactionRepository()
         wallet_repo = WalletRepository()
         
-        # Get transactions for the specified month
-        transactions = tx_repo.get_user_transactions_by_date_range(user_id, start_timestamp, end_timestamp)
-        
         # Filter out system categories (Transfer and Balance Adjustment)
         system_categories = ["transfer", "balance_adjustment"]
-        filtered_transactions = [tx for tx in transactions if tx.get("category_id") not in system_categories]
+
+        # Totals, category breakdown, chart buckets and recent rows in one aggregation
+        if day and month:
+            bucket_unit = "hour"
+        elif month:
+            bucket_unit = "day"
+        else:
+            bucket_unit = "month"
+        summary = tx_repo.get_dashboard_summary(
+            user_id, start_timestamp, end_timestamp,
+            bucket_unit=bucket_unit, exclude_category_ids=system_categories,
+        )
         
         # Calculate totals for the month (excluding system categories)
-        total_income = sum(float(tx.get("amount", 0)) for tx in filtered_transactions if tx.get("type") == "income")
-        total_expenses = sum(float(tx.get("amount", 0)) for tx in filtered_transactions if tx.get("type") == "expense")
-        total_transfer = sum(float(tx.get("amount", 0)) for tx in filtered_transactions if tx.get("type") == "transfer")
-        transaction_count = len(filtered_transactions)
+        total_income = summary["totals"]["income"]
+        total_expenses = summary["totals"]["expense"]
+        total_transfer = summary["totals"]["transfer"]
+        transaction_count = summary["totals"]["count"]
         
         # Calculate total balance based on latest transaction balance_after for each wallet up to selected date
         # For month-only or year-only selection, pass start_timestamp to limit the search to that period
@@ -354,10 +415,9 @@ def api_dashboard_data():
             yesterday_balance = calculate_balance_from_transactions(user_id, yesterday_timestamp)
             
             # Calculate yesterday's income and expenses (excluding system categories)
-            yesterday_transactions = tx_repo.get_user_transactions_by_date_range(user_id, yesterday_timestamp, yesterday_timestamp + 86400)  # 24 hours
-            yesterday_filtered = [tx for tx in yesterday_transactions if tx.get("category_id") not in system_categories]
-            yesterday_income = sum(float(tx.get("amount", 0)) for tx in yesterday_filtered if tx.get("type") == "income")
-            yesterday_expenses = sum(float(tx.get("amount", 0)) for tx in yesterday_filtered if tx.get("type") == "expense")
+            yesterday_totals = tx_repo.get_period_totals(user_id, yesterday_timestamp, yesterday_timestamp + 86400, system_categories)  # 24 hours
+            yesterday_income = yesterday_totals["income"]
+            yesterday_expenses = yesterday_totals["expense"]
             
             # Calculate improvements if data is available
             if yesterday_balance != "-" and total_balance != "-":
@@ -398,10 +458,9 @@ def api_dashboard_data():
             previous_month_balance = calculate_balance_from_transactions(user_id, prev_month_end_timestamp)
             
             # Calculate previous month's income and expenses (excluding system categories)
-            prev_month_transactions = tx_repo.get_user_transactions_by_date_range(user_id, prev_month_timestamp, prev_month_end_timestamp)
-            prev_month_filtered = [tx for tx in prev_month_transactions if tx.get("category_id") not in system_categories]
-            previous_month_income = sum(float(tx.get("amount", 0)) for tx in prev_month_filtered if tx.get("type") == "income")
-            previous_month_expenses = sum(float(tx.get("amount", 0)) for tx in prev_month_filtered if tx.get("type") == "expense")
+            prev_month_totals = tx_repo.get_period_totals(user_id, prev_month_timestamp, prev_month_end_timestamp, system_categories)
+            previous_month_income = prev_month_totals["income"]
+            previous_month_expenses = prev_month_totals["expense"]
             
             # Calculate improvements if data is available
             if previous_month_balance != "-" and total_balance != "-":
@@ -425,10 +484,10 @@ def api_dashboard_data():
                 previous_month_expenses_improvement = None
         
         # Get recent transactions (limit to 5, excluding system categories)
-        recent_transactions = filtered_transactions[:5]
+        recent_transactions = summary["recent"]
 
         # Category breakdown (ranked largest to smallest)
-        category_breakdown = generate_category_breakdown(filtered_transactions)
+        category_breakdown = generate_category_breakdown(summary["categories"])
 
         # Financial health metrics
         net_cashflow = total_income - total_expenses
@@ -440,15 +499,15 @@ def api_dashboard_data():
             month_parts = month.split('-')
             month_num = int(month_parts[1])
             day_num = int(day)
-            chart_data = generate_daily_chart_data(filtered_transactions, year, month_num, day_num)
+            chart_data = generate_daily_chart_data(summary["buckets"], year, month_num, day_num)
         elif month:
             # For month view, show daily breakdown
             month_parts = month.split('-')
             month_num = int(month_parts[1])
-            chart_data = generate_monthly_chart_data(filtered_transactions, year, month_num)
+            chart_data = generate_monthly_chart_data(summary["buckets"], year, month_num)
         else:
             # For year view, show monthly breakdown
-            chart_data = generate_yearly_chart_data(filtered_transactions, year)
+            chart_data = generate_yearly_chart_data(summary["buckets"], year)
         
         return jsonify({
             "total_balance": total_balance,
@@ -536,102 +595,24 @@ def api_balance_analysis():
         return jsonify({"error": "Internal server error"}), 500
 
 def generate_category_breakdown(transactions):
-    """Group transactions by category, return ranked breakdown for expenses and income"""
-    try:
-        expense_by_cat = {}
-        income_by_cat = {}
-
-        for tx in transactions:
-            cat_id = tx.get("category_id") or "uncategorized"
-            snap = tx.get("_snap") or {}
-            cat_path = snap.get("category_path") or []
-            if cat_path:
-                cat_name = cat_path[-1]
-            else:
-                cat_name = cat_id.replace("_", " ").title() if cat_id else "Uncategorized"
-
-            amount = float(tx.get("amount", 0))
-            tx_type = tx.get("type", "")
-
-            if tx_type == "expense":
-                if cat_id not in expense_by_cat:
-                    expense_by_cat[cat_id] = {"name": cat_name, "amount": 0, "count": 0}
-                expense_by_cat[cat_id]["amount"] += amount
-                expense_by_cat[cat_id]["count"] += 1
-            elif tx_type == "income":
-                if cat_id not in income_by_cat:
-                    income_by_cat[cat_id] = {"name": cat_name, "amount": 0, "count": 0}
-                income_by_cat[cat_id]["amount"] += amount
-                income_by_cat[cat_id]["count"] += 1
-
-        expense_list = sorted(expense_by_cat.values(), key=lambda x: x["amount"], reverse=True)
-        income_list = sorted(income_by_cat.values(), key=lambda x: x["amount"], reverse=True)
+    """Group transactions by category, return ranked breakdown for expenses and income
 
-        total_expense = sum(item["amount"] for item in expense_list)
-        for item in expense_list:
-            item["percentage"] = round((item["amount"] / total_expense * 100) if total_expense > 0 else 0, 1)
-
-        total_income = sum(item["amount"] for item in income_list)
-        for item in income_list:
-            item["percentage"] = round((item["amount"] / total_income * 100) if total_income > 0 else 0, 1)
-
-        return {
-            "expenses": expense_list,
-            "income": income_list,
-            "largest_expense": expense_list[0] if expense_list else None,
-            "smallest_expense": expense_list[-1] if len(expense_list) > 1 else None,
-        }
+    Also accepts pre-grouped rows (one per category with summed amount and a count).
+    """
+    try:
+        return analytics.category_breakdown(analytics.build_batch(transactions, exclude_category_ids=()))
     except Exception as e:
         print(f"Error generating category breakdown: {e}")
         return {"expenses": [], "income": [], "largest_expense": None, "smallest_expense": None}
 
 
 def generate_monthly_chart_data(transactions, year, month_num):
-    """Generate chart data for a specific month"""
+    """Generate chart data for a specific month
+
+    transactions may also be bucket rows (type, bucket-start timestamp, summed amount).
+    """
     try:
-        # Get number of days in the month
-        if month_num == 12:
-            next_month = datetime(year + 1, 1, 1)
-        else:
-            next_month = datetime(year, month_num + 1, 1)
-        
-        days_in_month = (next_month - datetime(year, month_num, 1)).days
-        
-        # Initialize daily data
-        daily_income = [0] * days_in_month
-        daily_expenses = [0] * days_in_month
-        labels = []
-        
-        # Generate labels for each day
-        for day in range(1, days_in_month + 1):
-            labels.append(f"{day}")
-        
-        # Process transactions
-        for tx in transactions:
-            try:
-                # Convert timestamp to date
-                tx_date = datetime.fromtimestamp(tx.get("timestamp", 0))
-                day_index = tx_date.day - 1  # 0-based index
-                
-                if 0 <= day_index < days_in_month:
-                    amount = float(tx.get("amount", 0))
-                    tx_type = tx.get("type", "")
-                    
-                    if tx_type == "income":
-                        daily_income[day_index] += amount
-                    elif tx_type == "expense":
-                        daily_expenses[day_index] += amount
-                        
-            except (ValueError, TypeError) as e:
-                print(f"Error processing transaction for chart: {e}")
-                continue
-        
-        return {
-            "labels": labels,
-            "income": daily_income,
-            "expenses": daily_expenses
-        }
-        
+        return analytics.chart_series(analytics.build_batch(transactions, exclude_category_ids=()), year, month_num)
     except Exception as e:
         print(f"Error generating chart data: {e}")
         # Return empty data structure
@@ -642,43 +623,12 @@ def generate_monthly_chart_data(transactions, year, month_num):
         }
 
 def generate_daily_chart_data(transactions, year, month_num, day_num):
-    """Generate chart data for a specific day (hourly breakdown)"""
+    """Generate chart data for a specific day (hourly breakdown)
+
+    transactions may also be bucket rows (type, bucket-start timestamp, summed amount).
+    """
     try:
-        # Initialize hourly data (24 hours)
-        hourly_income = [0] * 24
-        hourly_expenses = [0] * 24
-        labels = []
-        
-        # Generate labels for each hour
-        for hour in range(24):
-            labels.append(f"{hour:02d}:00")
-        
-        # Process transactions
-        for tx in transactions:
-            try:
-                # Convert timestamp to datetime
-                tx_date = datetime.fromtimestamp(tx.get("timestamp", 0))
-                hour_index = tx_date.hour
-                
-                if 0 <= hour_index < 24:
-                    amount = float(tx.get("amount", 0))
-                    tx_type = tx.get("type", "")
-                    
-                    if tx_type == "income":
-                        hourly_income[hour_index] += amount
-                    elif tx_type == "expense":
-                        hourly_expenses[hour_index] += amount
-                        
-            except (ValueError, TypeError) as e:
-                print(f"Error processing transaction for daily chart: {e}")
-                continue
-        
-        return {
-            "labels": labels,
-            "income": hourly_income,
-            "expenses": hourly_expenses
-        }
-        
+        return analytics.chart_series(analytics.build_batch(transactions, exclude_category_ids=()), year, month_num, day_num)
     except Exception as e:
         print(f"Error generating daily chart data: {e}")
         # Return empty data structure
@@ -689,45 +639,12 @@ def generate_daily_chart_data(transactions, year, month_num, day_num):
         }
 
 def generate_yearly_chart_data(transactions, year):
-    """Generate chart data for a specific year (monthly breakdown)"""
+    """Generate chart data for a specific year (monthly breakdown)
+
+    transactions may also be bucket rows (type, bucket-start timestamp, summed amount).
+    """
     try:
-        # Initialize monthly data (12 months)
-        monthly_income = [0] * 12
-        monthly_expenses = [0] * 12
-        labels = []
-        
-        # Generate labels for each month
-        for month in range(1, 13):
-            date = datetime(year, month, 1)
-            month_name = date.strftime('%b')  # Short month name
-            labels.append(month_name)
-        
-        # Process transactions
-        for tx in transactions:
-            try:
-                # Convert timestamp to datetime
-                tx_date = datetime.fromtimestamp(tx.get("timestamp", 0))
-                month_index = tx_date.month - 1  # 0-based index
-                
-                if 0 <= month_index < 12:
-                    amount = float(tx.get("amount", 0))
-                    tx_type = tx.get("type", "")
-                    
-                    if tx_type == "income":
-                        monthly_income[month_index] += amount
-                    elif tx_type == "expense":
-                        monthly_expenses[month_index] += amount
-                        
-            except (ValueError, TypeError) as e:
-                print(f"Error processing transaction for yearly chart: {e}")
-                continue
-        
-        return {
-            "labels": labels,
-            "income": monthly_income,
-            "expenses": monthly_expenses
-        }
-        
+        return analytics.chart_series(analytics.build_batch(transactions, exclude_category_ids=()), year)
     except Exception as e:
         print(f"Error generating yearly chart data: {e}")
         # Return empty data structure
@@ -758,24 +675,37 @@ def get_period_bounds(compare_type, period_str):
     return start, end, label
 
 
+def get_period_rows(user_id, compare_type, bounds):
+    """Pre-grouped (type, category) rows for each (start_dt, end_dt) period, in one round-trip.
+
+    Month/year periods are whole months and come from tx_rollups; day periods
+    are grouped from transactions by one aggregation.
+    """
+    if compare_type in ("month", "year"):
+        rollup_repo = TxRollupRepository()
+        per_period = rollup_repo.get_period_rows(user_id, [months_between(start, end) for start, end in bounds])
+        return [rollup_repo.as_transaction_rows(rows) for rows in per_period]
+    return TransactionRepository().get_period_category_totals(
+        user_id, [(int(start.timestamp()), int(end.timestamp())) for start, end in bounds]
+    )
+
+
 def summarise_period(transactions, label):
-    """Aggregate a list of filtered transactions into a period summary dict."""
-    system_cats = {"transfer", "balance_adjustment"}
-    txs = [t for t in transactions
-           if t.get("type") != "transfer"
-           and t.get("category_id") not in system_cats]
-    income   = sum(float(t.get("amount", 0)) for t in txs if t.get("type") == "income")
-    expenses = sum(float(t.get("amount", 0)) for t in txs if t.get("type") == "expense")
+    """Aggregate a period (transaction dicts or a scan_columns batch) into a summary dict."""
+    batch = analytics.build_batch(transactions, exclude_types=("transfer",))
+    totals = analytics.type_totals(batch)
+    income   = totals["income"]
+    expenses = totals["expense"]
     net      = income - expenses
     savings_rate = round((net / income * 100) if income > 0 else 0, 1)
-    breakdown = generate_category_breakdown(txs)
+    breakdown = analytics.category_breakdown(batch)
     return {
         "label":        label,
         "income":       income,
         "expenses":     expenses,
         "net":          net,
         "savings_rate": savings_rate,
-        "tx_count":     len(txs),
+        "tx_count":     totals["count"],
         "category_breakdown": breakdown,
     }
 
@@ -789,13 +719,16 @@ def pct_change(old, new):
 
 @app.route("/api/comparison-data")
 def api_comparison_data():
-    """Compare two time periods side-by-side."""
+    """Compare two time periods side-by-side (or N consecutive periods with mode=trend)."""
     try:
         user_id = session.get("user_id")
         if not user_id:
             return jsonify({"error": "Not authenticated"}), 401
 
         compare_type = request.args.get("compare_type", "month")   # year | month | day
+        if request.args.get("mode") == "trend":
+            return comparison_trend(user_id, compare_type)
+
         period_a_str = request.args.get("period_a")
         period_b_str = request.args.get("period_b")
 
@@ -805,11 +738,7 @@ def api_comparison_data():
         start_a, end_a, label_a = get_period_bounds(compare_type, period_a_str)
         start_b, end_b, label_b = get_period_bounds(compare_type, period_b_str)
 
-        tx_repo = TransactionRepository()
-        txs_a = tx_repo.get_user_transactions_by_date_range(
-            user_id, int(start_a.timestamp()), int(end_a.timestamp()))
-        txs_b = tx_repo.get_user_transactions_by_date_range(
-            user_id, int(start_b.timestamp()), int(end_b.timestamp()))
+        txs_a, txs_b = get_period_rows(user_id, compare_type, [(start_a, end_a), (start_b, end_b)])
 
         summary_a = summarise_period(txs_a, label_a)
         summary_b = summarise_period(txs_b, label_b)
@@ -825,24 +754,19 @@ def api_comparison_data():
             "tx_change":      summary_b["tx_count"]  - summary_a["tx_count"],
         }
 
-        # Merge category lists for the comparison table
-        all_cat_names = {}
-        for item in (summary_a["category_breakdown"]["expenses"] +
-                     summary_b["category_breakdown"]["expenses"]):
-            all_cat_names[item["name"]] = True
+        # Merge category lists for the comparison table (name -> amount dicts)
+        amounts_a = {item["name"]: item["amount"] for item in summary_a["category_breakdown"]["expenses"]}
+        amounts_b = {item["name"]: item["amount"] for item in summary_b["category_breakdown"]["expenses"]}
         category_compare = []
-        def find_cat(lst, name):
-            return next((x for x in lst if x["name"] == name), {"amount": 0, "percentage": 0})
-        for name in all_cat_names:
-            ca = find_cat(summary_a["category_breakdown"]["expenses"], name)
-            cb = find_cat(summary_b["category_breakdown"]["expenses"], name)
-            diff = cb["amount"] - ca["amount"]
+        for name in {**amounts_a, **amounts_b}:
+            amount_a = amounts_a.get(name, 0)
+            amount_b = amounts_b.get(name, 0)
             category_compare.append({
                 "name": name,
-                "amount_a": ca["amount"],
-                "amount_b": cb["amount"],
-                "diff": diff,
-                "diff_pct": pct_change(ca["amount"], cb["amount"]),
+                "amount_a": amount_a,
+                "amount_b": amount_b,
+                "diff": amount_b - amount_a,
+                "diff_pct": pct_change(amount_a, amount_b),
             })
         category_compare.sort(key=lambda x: max(x["amount_a"], x["amount_b"]), reverse=True)
 
@@ -870,24 +794,91 @@ def api_comparison_data():
         return jsonify({"error": "Internal server error"}), 500
 
 
+TREND_DEFAULT_PERIODS = {"month": 12, "year": 5, "day": 14}
+TREND_MAX_PERIODS = {"month": 60, "year": 20, "day": 92}
+
+
+def trend_period_strings(compare_type, end_str, count):
+    """The `count` consecutive period strings ending with end_str, oldest first."""
+    from datetime import timedelta
+    if compare_type == "year":
+        y = int(end_str)
+        return [str(y - k) for k in range(count - 1, -1, -1)]
+    if compare_type == "month":
+        y, m = int(end_str[:4]), int(end_str[5:7])
+        index = y * 12 + (m - 1)
+        return [f"{(i // 12):04d}-{(i % 12) + 1:02d}" for i in range(index - count + 1, index + 1)]
+    end = datetime.strptime(end_str[:10], "%Y-%m-%d")
+    return [(end - timedelta(days=k)).strftime("%Y-%m-%d") for k in range(count - 1, -1, -1)]
+
+
+def comparison_trend(user_id, compare_type):
+    """mode=trend: N consecutive periods as a period x category matrix plus growth series.
+
+    Query: compare_type, periods (count), end (last period string; default: current).
+    All periods come from one get_period_rows call (rollups or one aggregation).
+    """
+    if compare_type not in TREND_DEFAULT_PERIODS:
+        return jsonify({"error": "Invalid compare_type"}), 400
+    try:
+        count = int(request.args.get("periods", TREND_DEFAULT_PERIODS[compare_type]))
+    except ValueError:
+        return jsonify({"error": "Invalid periods"}), 400
+    count = max(2, min(count, TREND_MAX_PERIODS[compare_type]))
+
+    end_str = request.args.get("end")
+    if not end_str:
+        now = datetime.now()
+        end_str = {"year": "%Y", "month": "%Y-%m", "day": "%Y-%m-%d"}[compare_type]
+        end_str = now.strftime(end_str)
+
+    try:
+        period_strs = trend_period_strings(compare_type, end_str, count)
+        bounds = [get_period_bounds(compare_type, p) for p in period_strs]
+    except ValueError:
+        return jsonify({"error": "Invalid end period"}), 400
+    rows_per_period = get_period_rows(user_id, compare_type, [(start, end) for start, end, _ in bounds])
+    summaries = [summarise_period(rows, label) for rows, (_, _, label) in zip(rows_per_period, bounds)]
+
+    # Period x category matrix (expenses and income), categories ranked by total
+    matrix = {}
+    for kind in ("expenses", "income"):
+        per_category = {}
+        for index, summary in enumerate(summaries):
+            for item in summary["category_breakdown"][kind]:
+                per_category.setdefault(item["name"], [0.0] * count)[index] = item["amount"]
+        ranked = sorted(per_category.items(), key=lambda kv: sum(kv[1]), reverse=True)
+        matrix[kind] = [{"name": name, "amounts": amounts} for name, amounts in ranked]
+
+    # Period-over-period growth (first period has no baseline)
+    growth = {"income_pct": [None], "expense_pct": [None], "net_change": [None]}
+    for prev, cur in zip(summaries, summaries[1:]):
+        growth["income_pct"].append(pct_change(prev["income"], cur["income"]))
+        growth["expense_pct"].append(pct_change(prev["expenses"], cur["expenses"]))
+        growth["net_change"].append(cur["net"] - prev["net"])
+
+    return jsonify({
+        "compare_type": compare_type,
+        "mode":         "trend",
+        "periods":      [{k: v for k, v in s.items() if k != "category_breakdown"} for s in summaries],
+        "period_keys":  period_strs,
+        "category_matrix": matrix,
+        "growth":       growth,
+        "chart_data": {
+            "labels":   [s["label"] for s in summaries],
+            "income":   [s["income"] for s in summaries],
+            "expenses": [s["expenses"] for s in summaries],
+            "net":      [s["net"] for s in summaries],
+        },
+    })
+
+
 def get_per_wallet_balances(user_id):
-    """Return {wallet_id_str: balance_after} using the same aggregation as the sidebar total."""
+    """Return {wallet_id_str: balance_after} using the same checkpoints as the sidebar total."""
     try:
-        from config import get_collection
-        coll = get_collection("transactions")
         current_ts = int(datetime.now().timestamp())
-        pipeline = [
-            {"$match": {"user_id": user_id, "timestamp": {"$lte": current_ts}}},
-            {"$sort": {"wallet_id": 1, "timestamp": -1, "sequence_number": -1}},
-            {"$group": {"_id": "$wallet_id", "latest_tx": {"$first": "$$ROOT"}}},
-        ]
-        result = {}
-        for row in coll.aggregate(pipeline):
-            wid = str(row["_id"])          # normalise to string
-            bal = row["latest_tx"].get("balance_after")
-            if bal is not None:
-                result[wid] = float(bal)
-        return result
+        balances = BalanceCheckpointRepository().get_balances_at(user_id, current_ts)
+        return {wid: bal for wid, bal in balances.items() if bal is not None}
     except Exception as e:
         print(f"Error in get_per_wallet_balances: {e}")
         return {}
@@ -896,50 +887,17 @@ def get_per_wallet_balances(user_id):
 def calculate_balance_from_transactions(user_id, end_timestamp, start_timestamp=None):
     """Calculate total balance based on latest transaction balance_after for each wallet up to selected date"""
     try:
-        from config import get_collection
-        
-        # Get all transactions for the user up to the end timestamp
-        coll = get_collection("transactions")
-        
-        # For balance calculation, we always want the latest transaction up to the end_timestamp
-        # regardless of start_timestamp (which is used for income/expense filtering)
-        balance_match_query = {
-            "user_id": user_id,
-            "timestamp": {"$lte": end_timestamp}
-        }
-        
-        # Find the latest transaction for each wallet up to the end timestamp
-        pipeline = [
-            {
-                "$match": balance_match_query
-            },
-            {
-                "$sort": {"wallet_id": 1, "timestamp": -1, "sequence_number": -1}
-            },
-            {
-                "$group": {
-                    "_id": "$wallet_id",
-                    "latest_transaction": {"$first": "$$ROOT"}
-                }
-            }
-        ]
-        
-        latest_transactions = list(coll.aggregate(pipeline))
-        
+        # Balance is always "as of end_timestamp" regardless of start_timestamp
+        # (which is only used for income/expense filtering). Per-wallet daily
+        # checkpoints replace the full-history $sort/$group over transactions.
+        balances = BalanceCheckpointRepository().get_balances_at(user_id, end_timestamp)
+
         # If no transactions found for the period, return "-"
-        if not latest_transactions:
+        if not balances:
             return "-"
-        
-        # Sum up the balance_after from the latest transaction of each wallet
-        total_balance = 0
-        for wallet_data in latest_transactions:
-            latest_tx = wallet_data.get("latest_transaction", {})
-            balance_after = latest_tx.get("balance_after", 0)
-            if balance_after is not None:
-                total_balance += float(balance_after)
-        
-        return total_balance
-        
+
+        return sum(bal for bal in balances.values() if bal is not None)
+
     except Exception as e:
         print(f"Error calculating balance from transactions: {e}")
         # Fallback to current wallet balance if there's an error
@@ -953,26 +911,10 @@ def calculate_balance_from_transactions(user_id, end_timestamp, start_timestamp=
 def get_latest_wallet_balance(user_id, wallet_id, end_timestamp):
     """Get the latest balance_after for a specific wallet up to the given timestamp"""
     try:
-        from config import get_collection
-        
-        coll = get_collection("transactions")
-        
-        # Find the latest transaction for this specific wallet up to the end timestamp
-        latest_tx = coll.find_one(
-            {
-                "user_id": user_id,
-                "wallet_id": wallet_id,
-                "timestamp": {"$lte": end_timestamp}
-            },
-            sort=[("timestamp", -1), ("sequence_number", -1)]
-        )
-        
-        if latest_tx and latest_tx.get("balance_after") is not None:
-            return float(latest_tx.get("balance_after", 0))
-        else:
-            # If no transactions found, return 0
-            return 0.0
-            
+        balance = BalanceCheckpointRepository().get_wallet_balance_at(user_id, wallet_id, end_timestamp)
+        # If no transactions found, return 0
+        return balance if balance is not None else 0.0
+
     except Exception as e:
         print(f"Error getting latest wallet balance: {e}")
         return 0.0
@@ -1043,9 +985,13 @@ def transactions():
         amount_max = request.args.get("amount_max")
         search = (request.args.get("search") or "").strip()
         
-        # Get pagination parameters
+        # Get pagination parameters. Prev/next navigation uses an opaque keyset
+        # cursor (constant cost at any depth); "page" is kept for the counter
+        # and for jumping straight to a numbered page.
         page = int(request.args.get("page", 1))
         per_page = int(request.args.get("per_page", 10))  # Default 10 transactions per page
+        cursor = request.args.get("cursor")
+        known_total = request.args.get("total", type=int)
         
         # Build filters
         filters = {}
@@ -1071,8 +1017,20 @@ def transactions():
             filters["search"] = search
         
         # Get transactions with filters and pagination
+        next_cursor = prev_cursor = None
         try:
-            if filters:
+            if cursor or page == 1:
+                cursor_page = tx_repo.get_transactions_with_filters_cursor(
+                    user_id, filters, cursor=cursor, per_page=per_page,
+                    with_count=not (cursor and known_total is not None),
+                )
+                transactions = cursor_page["transactions"]
+                next_cursor = cursor_page["next_cursor"]
+                prev_cursor = cursor_page["prev_cursor"]
+                total_count = cursor_page["total_count"]
+                if total_count is None:
+                    total_count = known_total
+            elif filters:
                 transactions, total_count = tx_repo.get_transactions_with_filters_paginated(user_id, filters, page, per_page)
             elif scope_id:
                 transactions, total_count = tx_repo.get_transactions_by_scope_paginated(user_id, scope_id, page, per_page)
@@ -1091,8 +1049,8 @@ def transactions():
         
         # Calculate pagination info
         total_pages = (total_count + per_page - 1) // per_page  # Ceiling division
-        has_prev = page > 1
-        has_next = page < total_pages
+        has_prev = page > 1 or bool(prev_cursor)
+        has_next = page < total_pages or bool(next_cursor)
         
         # Get master data for filters
         scopes = scope_repo.list_by_user(user_id)
@@ -1101,9 +1059,7 @@ def transactions():
 
         # Distinct tag suggestions for the filter modal datalist
         try:
-            all_tags = sorted(
-                t for t in tx_repo.collection.distinct("tags", {"user_id": user_id}) if t
-            )
+            all_tags = tx_repo.distinct_tags(user_id)
         except Exception:
             all_tags = []
         
@@ -1151,6 +1107,8 @@ def transactions():
                              total_count=total_count,
                              has_prev=has_prev,
                              has_next=has_next,
+                             next_cursor=next_cursor,
+                             prev_cursor=prev_cursor,
                              selected_category=selected_category,
                              selected_wallet=selected_wallet,
                              current_scope_id=scope_id,
@@ -1282,6 +1240,8 @@ def wallet_scope():
                 "type":  t.get("type", ""),
                 "amount": float(t.get("amount", 0)),
             })
+    keep = analytics.lttb_indices([p["ts"] for p in chart_points], [p["bal"] for p in chart_points], CHART_MAX_POINTS)
+    chart_points = [chart_points[k] for k in keep]
 
     # Recent transactions for the list (newest first, money only)
     recent_txs = list(reversed(money_txs))
@@ -1553,10 +1513,11 @@ def api_wealth_pulse():
         ts_a_start = int(date_a.timestamp())
 
         # ── Wealth snapshots ────────────────────────────────────────────
-        raw_a = calculate_balance_from_transactions(user_id, ts_a_end)
-        raw_b = calculate_balance_from_transactions(user_id, ts_b_end)
-        wealth_a = float(raw_a) if raw_a != "-" else 0.0
-        wealth_b = float(raw_b) if raw_b != "-" else 0.0
+        # Per-wallet balances at both cut-offs in one batched checkpoint read;
+        # totals and the per-wallet breakdown below both come from it.
+        snap_a, snap_b = BalanceCheckpointRepository().get_balances_at_many(user_id, [ts_a_end, ts_b_end])
+        wealth_a = sum(bal for bal in snap_a.values() if bal is not None)
+        wealth_b = sum(bal for bal in snap_b.values() if bal is not None)
 
         wealth_change     = wealth_b - wealth_a
         wealth_change_pct = pct_change(wealth_a, wealth_b)
@@ -1564,56 +1525,39 @@ def api_wealth_pulse():
 
         # ── Period cashflow ─────────────────────────────────────────────
         tx_repo   = TransactionRepository()
-        period_txs = tx_repo.get_user_transactions_by_date_range(
-            user_id, ts_a_start, ts_b_end, limit=10000)
+        cols = tx_repo.scan_columns(user_id, ts_a_start, ts_b_end)
         system_cats = {"transfer", "balance_adjustment"}
-        money_txs = [t for t in period_txs
-                     if t.get("type") != "transfer"
-                     and t.get("category_id") not in system_cats]
-
-        total_income  = sum(float(t.get("amount", 0)) for t in money_txs if t.get("type") == "income")
-        total_expense = sum(float(t.get("amount", 0)) for t in money_txs if t.get("type") == "expense")
-        net_cashflow  = total_income - total_expense
-        savings_rate  = round((net_cashflow / total_income * 100) if total_income > 0 else 0, 1)
-        burn_rate     = round(total_expense / days, 0) if days > 0 else 0
-        income_vel    = round(total_income  / days, 0) if days > 0 else 0
 
         # ── Category id → name lookup from DB ──────────────────────────
         cat_repo   = CategoryRepository()
         db_cats    = cat_repo.list_by_user_with_defaults(user_id) or []
         cat_id_map = {str(c.get("_id", c.get("id", ""))): c.get("name", "") for c in db_cats}
 
-        def resolve_cat(t):
-            snap = t.get("_snap") or {}
-            path = snap.get("category_path") or []
-            if path:
-                return path[-1]
-            cid = str(t.get("category_id") or "")
+        def resolve_cat(snap_name, cid):
+            if snap_name:
+                return snap_name
             return cat_id_map.get(cid) or cid or "Uncategorized"
 
+        # ── Totals + category breakdown ─────────────────────────────────
         # Exclude 'transfer' category by resolved name (fund movements, not income/expense)
-        money_txs = [t for t in money_txs if resolve_cat(t).lower() != "transfer"]
-        total_income  = sum(float(t.get("amount", 0)) for t in money_txs if t.get("type") == "income")
-        total_expense = sum(float(t.get("amount", 0)) for t in money_txs if t.get("type") == "expense")
+        def money_category(cid, snap_name):
+            name = resolve_cat(snap_name, cid)
+            return None if name.lower() == "transfer" else name
+
+        batch = analytics.build_batch(cols, exclude_category_ids=tuple(system_cats),
+                                      exclude_types=("transfer",), category_key=money_category)
+        totals        = analytics.type_totals(batch)
+        total_income  = totals["income"]
+        total_expense = totals["expense"]
+        money_count   = totals["count"]
+
         net_cashflow  = total_income - total_expense
         savings_rate  = round((net_cashflow / total_income * 100) if total_income > 0 else 0, 1)
         burn_rate     = round(total_expense / days, 0) if days > 0 else 0
         income_vel    = round(total_income  / days, 0) if days > 0 else 0
 
-        # ── Category breakdown ──────────────────────────────────────────
-        cat_income, cat_expense = {}, {}
-        for t in money_txs:
-            name = resolve_cat(t)
-            amt  = float(t.get("amount", 0))
-            if t.get("type") == "income":
-                cat_income[name]  = cat_income.get(name, 0) + amt
-            elif t.get("type") == "expense":
-                cat_expense[name] = cat_expense.get(name, 0) + amt
-
-        top_income  = sorted([{"name": k, "amount": v} for k, v in cat_income.items()],
-                              key=lambda x: x["amount"], reverse=True)[:6]
-        top_expense = sorted([{"name": k, "amount": v} for k, v in cat_expense.items()],
-                              key=lambda x: x["amount"], reverse=True)[:6]
+        top_income  = [{"name": c["name"], "amount": c["amount"]} for c in analytics.category_totals(batch, "income")[:6]]
+        top_expense = [{"name": c["name"], "amount": c["amount"]} for c in analytics.category_totals(batch, "expense")[:6]]
 
         # ── Per-wallet breakdown ────────────────────────────────────────
         wallet_repo = WalletRepository()
@@ -1621,8 +1565,8 @@ def api_wealth_pulse():
         wallet_breakdown = []
         for w in wallets:
             wid   = str(w.get("_id", ""))
-            bal_a = get_latest_wallet_balance(user_id, wid, ts_a_end)
-            bal_b = get_latest_wallet_balance(user_id, wid, ts_b_end)
+            bal_a = snap_a.get(wid)
+            bal_b = snap_b.get(wid)
             bal_a = float(bal_a) if bal_a is not None else 0.0
             bal_b = float(bal_b) if bal_b is not None else 0.0
             if bal_a == 0 and bal_b == 0:
@@ -1641,9 +1585,7 @@ def api_wealth_pulse():
         wallet_id_map = {str(w.get("_id", "")): w.get("name", "") for w in wallets}
         transfer_movements = []
         seen_transfers = set()   # dedup key: (from_wallet_id, to_wallet_id, amount, date)
-        for t in period_txs:
-            if t.get("category_id") != "transfer" and not t.get("is_transfer"):
-                continue
+        for t in tx_repo.get_transfers_by_date_range(user_id, ts_a_start, ts_b_end):
             ts           = t.get("timestamp", 0)
             date_str     = datetime.fromtimestamp(ts).strftime("%Y-%m-%d") if ts else ""
             from_wid     = str(t.get("from_wallet_id", "") or t.get("wallet_id", ""))
@@ -1680,7 +1622,7 @@ def api_wealth_pulse():
             score_ctrl = max(0, 20 + (net_cashflow / total_expense * 20))
         else:
             score_ctrl = 0
-        tx_per_day     = len(money_txs) / days if days > 0 else 0
+        tx_per_day     = money_count / days if days > 0 else 0
         score_activity = min(15, tx_per_day * 7.5)
         wealth_score   = round(score_savings + score_growth + score_ctrl + score_activity)
 
@@ -1778,7 +1720,7 @@ def api_wealth_pulse():
             "score_color": score_color,
             "projections": projections,
             "insights": insights,
-            "tx_count": len(money_txs),
+            "tx_count": money_count,
             "transfer_movements": transfer_movements,
             "total_transferred": total_transferred,
         })
@@ -1822,7 +1764,7 @@ def accounts():
     elif scope_id:
         try:
             tx_repo = TransactionRepository()
-            scope_txs = tx_repo.get_transactions_by_scope(user_id, scope_id, limit=5000)
+            scope_txs = tx_repo.get_transactions_by_scope(user_id, scope_id, limit=5000, projection="totals")
 
             system_cats = {"transfer", "balance_adjustment"}
             wallet_scope_data = {}
@@ -1864,6 +1806,63 @@ def accounts():
         selected_scope=selected_scope,
     )
 
+# Upper bound of points shipped to the balance growth charts
+CHART_MAX_POINTS = 1000
+# Rows per server page of the /all-detail list (the page then paginates client-side)
+ALL_DETAIL_PAGE_SIZE = 200
+
+
+@app.route("/api/wealth-series")
+def api_wealth_series():
+    """Net-worth (or one wallet's) balance series with day/week/month resolution and LTTB.
+
+    Query: resolution=raw|day|week|month (default day), max_points (default 500),
+    start/end (YYYY-MM-DD, inclusive), wallet_id (optional).
+    """
+    try:
+        from datetime import timedelta
+        user_id = session.get("user_id")
+        if not user_id:
+            return jsonify({"error": "Not authenticated"}), 401
+
+        resolution = request.args.get("resolution", "day")
+        if resolution not in ("raw", "day", "week", "month"):
+            return jsonify({"error": "resolution must be raw, day, week or month"}), 400
+        try:
+            max_points = max(3, min(int(request.args.get("max_points", 500)), 5000))
+            start_str = request.args.get("start")
+            end_str = request.args.get("end")
+            start_ts = int(datetime.strptime(start_str, "%Y-%m-%d").timestamp()) if start_str else None
+            end_ts = int((datetime.strptime(end_str, "%Y-%m-%d") + timedelta(days=1)).timestamp()) if end_str else None
+        except ValueError:
+            return jsonify({"error": "Invalid max_points/start/end"}), 400
+        wallet_id = request.args.get("wallet_id") or None
+
+        # Wallet balances carried into the window from before start
+        opening = {}
+        if start_ts is not None:
+            before = BalanceCheckpointRepository().get_balances_at(user_id, start_ts - 1)
+            opening = {wid: bal for wid, bal in before.items()
+                       if bal is not None and (wallet_id is None or wid == wallet_id)}
+
+        cols = TransactionRepository().scan_columns(
+            user_id, start_ts, end_ts, extra_query={"wallet_id": wallet_id} if wallet_id else None)
+        rows, totals = analytics.net_worth_series(cols, opening)
+        ts, values = analytics.resample_last([cols.timestamp[i] for i in rows], totals, resolution)
+        keep = analytics.lttb_indices(ts, values, max_points)
+
+        return jsonify({
+            "resolution":    resolution,
+            "wallet_id":     wallet_id,
+            "source_points": len(ts),
+            "downsampled":   len(keep) < len(ts),
+            "points":        [{"ts": ts[k], "value": values[k]} for k in keep],
+        })
+    except Exception as e:
+        print(f"Error in api_wealth_series: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
 @app.route("/all-detail")
 def all_detail():
     auth_check = require_login()
@@ -1876,18 +1875,13 @@ def all_detail():
     wallet_repo   = WalletRepository()
     category_repo = CategoryRepository()
 
-    # All transactions sorted oldest-first
-    all_txs = tx_repo.get_transactions_with_filters(user_id, {}, limit=5000)
-    all_txs_sorted = sorted(all_txs,
-        key=lambda t: (t.get("timestamp", 0), t.get("sequence_number", 0)))
+    # Columnar scan of all transactions, oldest-first (totals + chart)
+    cols = tx_repo.scan_columns(user_id)
 
-    system_cats = {"transfer", "balance_adjustment"}
-    money_txs = [t for t in all_txs_sorted
-                 if t.get("type") != "transfer"
-                 and t.get("category_id") not in system_cats]
-
-    total_income  = sum(float(t.get("amount", 0)) for t in money_txs if t.get("type") == "income")
-    total_expense = sum(float(t.get("amount", 0)) for t in money_txs if t.get("type") == "expense")
+    # Money only: transfers and system categories are left out of the totals and the list
+    totals = analytics.type_totals(analytics.build_batch(cols, exclude_types=("transfer",)))
+    total_income  = totals["income"]
+    total_expense = totals["expense"]
     net = total_income - total_expense
 
     # Total current balance = sum of actual_balance across all wallets
@@ -1896,27 +1890,37 @@ def all_detail():
 
     # Base amount = sum of balance_before of the very first transaction per wallet
     first_tx_per_wallet = {}
-    for t in all_txs_sorted:
-        wid = t.get("wallet_id")
+    for wid, before in zip(cols.wallet_id, cols.balance_before):
         if wid and wid not in first_tx_per_wallet:
-            first_tx_per_wallet[wid] = float(t.get("balance_before", 0))
+            first_tx_per_wallet[wid] = 0.0 if math.isnan(before) else before
     base_amount = sum(first_tx_per_wallet.values())
 
-    # Chart points: running total balance across all wallets
-    wallet_balances = {}
-    chart_points = []
-    for t in all_txs_sorted:
-        if t.get("balance_after") is not None:
-            wid = t.get("wallet_id", "")
-            wallet_balances[wid] = float(t.get("balance_after", 0))
-            chart_points.append({
-                "ts":     t.get("timestamp", 0),
-                "bal":    sum(wallet_balances.values()),
-                "type":   t.get("type", ""),
-                "amount": float(t.get("amount", 0)),
-            })
+    # Chart points: running total balance across all wallets, LTTB-downsampled
+    rows, totals = analytics.net_worth_series(cols)
+    keep = analytics.lttb_indices([cols.timestamp[i] for i in rows], totals, CHART_MAX_POINTS)
+    chart_points = [
+        {
+            "ts":     int(cols.timestamp[rows[k]]),
+            "bal":    totals[k],
+            "type":   cols.type[rows[k]],
+            "amount": cols.amount[rows[k]],
+        }
+        for k in keep
+    ]
 
-    recent_txs = list(reversed(money_txs))
+    # List rows (newest first, money only): one keyset page of list-row fields
+    cursor = request.args.get("cursor")
+    known_total = request.args.get("total", type=int)
+    list_page = tx_repo.get_transactions_with_filters_cursor(
+        user_id, {}, cursor=cursor, per_page=ALL_DETAIL_PAGE_SIZE,
+        extra_query={
+            "type": {"$ne": "transfer"},
+            "category_id": {"$nin": list(analytics.SYSTEM_CATEGORIES)},
+        },
+        with_count=not (cursor and known_total is not None),
+        projection="list-row",
+    )
+    list_total = list_page["total_count"] if list_page["total_count"] is not None else known_total
     categories = category_repo.list_by_user_with_defaults(user_id) or []
 
     return render_template(
@@ -1929,7 +1933,10 @@ def all_detail():
         total_expense=total_expense,
         net=net,
         chart_points=chart_points,
-        transactions=recent_txs,
+        transactions=list_page["transactions"],
+        list_total=list_total,
+        next_cursor=list_page["next_cursor"],
+        prev_cursor=list_page["prev_cursor"],
         wallet_id="",
         scope_id="",
         is_all_view=True,
@@ -3226,6 +3233,18 @@ def list_transactions():
         print(f"Error in list_transactions: {e}")
         return jsonify([])
 
+@app.route("/api/transactions/search", methods=["GET"])
+def search_transactions_api():
+    """Relevance-ordered note/tag search (?q=, optional wallet_id/scope_id/category_id/type, limit)."""
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Authentication required"}), 401
+    text = (request.args.get("q") or "").strip()
+    limit = min(max(request.args.get("limit", 20, type=int) or 20, 1), 100)
+    filters = {key: request.args.get(key) for key in ("wallet_id", "scope_id", "category_id", "type") if request.args.get(key)}
+    rows = TransactionRepository().search_transactions(user_id, text, filters=filters, limit=limit, with_names=True)
+    return jsonify({"query": text, "transactions": rows})
+
 @app.route("/api/transactions/", methods=["POST"])
 def create_transaction():
     """Create transaksi baru"""
@@ -3340,6 +3359,18 @@ def recalculate_balances():
         print(f"Error in recalculate_balances: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/balance-worker/stats")
+def balance_worker_stats():
+    """Balance worker pool state, queue depth and latency for the user's wallets"""
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Not authenticated"}), 401
+    try:
+        return jsonify(get_worker_stats(user_id))
+    except Exception as e:
+        print(f"Error in balance_worker_stats: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route("/api/transactions/transfer", methods=["POST"])
 def create_transfer_transaction():
     """Create a transfer transaction between wallets"""
@@ -4044,10 +4075,16 @@ def _normalize_special_tags(value):
 
 @app.route("/api/tags", methods=["GET"])
 def list_tags():
-    """Distinct tags already used by the current user (for the tag picker)."""
+    """Distinct tags already used by the current user (for the tag picker).
+
+    ?q= returns autocomplete matches instead: tags starting with q, most used first.
+    """
     user_id = session.get("user_id")
     if not user_id:
         return jsonify({"error": "Authentication required"}), 401
+    if "q" in request.args:
+        limit = min(max(request.args.get("limit", 20, type=int) or 20, 1), 100)
+        return jsonify([row["tag"] for row in TagStatsRepository().suggest(user_id, request.args.get("q", ""), limit)])
     return jsonify(TransactionRepository().distinct_tags(user_id))
 
 
@@ -4332,7 +4369,6 @@ def balance_history(manual_balance_id):
         tx_repo = TransactionRepository()
         manual_balance_repo = ManualBalanceRepository()
         wallet_repo = WalletRepository()
-        category_repo = CategoryRepository()
         
         # Get manual balance info
         manual_balance = manual_balance_repo.find_by_id(manual_balance_id)
@@ -4355,9 +4391,8 @@ def balance_history(manual_balance_id):
         # Get transactions berdasarkan fk_manual_balance_id
         transactions = tx_repo.get_transactions_by_manual_balance(user_id, manual_balance_id, limit=1000)
         
-        # Get categories untuk display (including defaults)
-        categories = category_repo.list_by_user_with_defaults(user_id)
-        category_map = {cat["_id"]: cat["name"] for cat in categories}
+        # Resolve category names for just the categories on this page
+        tx_repo.attach_names(transactions, fields=("category",))
         
         # Calculate totals
         total_debit = 0
@@ -4376,14 +4411,7 @@ def balance_history(manual_balance_id):
         # Format transactions dengan category name dan balance info
         formatted_transactions = []
         for tx in transactions:
-            # Handle both string IDs (default categories) and ObjectId (user categories)
-            category_id = tx.get("category_id")
-            if category_id:
-                # Convert ObjectId to string if needed
-                if hasattr(category_id, '__str__'):
-                    category_id = str(category_id)
-                tx["category_name"] = category_map.get(category_id, "Unknown")
-            else:
+            if not tx.get("category_id"):
                 tx["category_name"] = "Unknown"
             # Safe timestamp formatting
             try:
@@ -4485,7 +4513,7 @@ def process_ocr_upload():
             
         # Check against existing transactions to flag duplicates
         tx_repo = TransactionRepository()
-        user_txs = tx_repo.get_user_transactions_simple(user_id, limit=2000)
+        user_txs = tx_repo.get_user_transactions_simple(user_id, limit=2000, projection="chart-point")
         
         for p_tx in parsed_txs:
             try:
@@ -4540,7 +4568,7 @@ def confirm_ocr_scan():
             
         tx_repo = TransactionRepository()
         
-        inserted_count = 0
+        new_txs = []
         for tx in transactions:
             fallback_id = "income_general" if tx["type"] == "income" else "expense_general"
             cat_id = tx.get("category_id")
@@ -4559,9 +4587,10 @@ def confirm_ocr_scan():
                 "note": tx.get("note", ""),
                 "timestamp": tx.get("timestamp", int(datetime.now().timestamp()))
             }
-            res = tx_repo.insert_one(new_tx)
-            if res:
-                inserted_count += 1
+            new_txs.append(new_tx)
+
+        # One bulk insert + one balance job instead of a round-trip chain per row
+        inserted_count = len(tx_repo.insert_many(new_txs))
             
         return jsonify({"success": True, "inserted_count": inserted_count})
     except Exception as e:
@@ -4694,33 +4723,18 @@ def _has_minimum_share_filter(filters_dict):
     )
 
 
-def _special_aggregate(transactions, special_tags):
+def _special_aggregate(user_id, filters, special_tags):
     """Aggregate transactions matching ANY special tag (OR; each tx counted once).
 
+    Runs in Mongo over the full filtered set (see get_special_tag_totals).
     Returns {tags, count, amount, breakdown:[{tag,count,amount}]}.
     """
     specials = [str(t) for t in (special_tags or []) if t]
     if not specials:
         return {"tags": [], "count": 0, "amount": 0.0, "breakdown": []}
 
-    def amt(t):
-        try:
-            return float(t.get("amount", 0) or 0)
-        except Exception:
-            return 0.0
-
-    special_set = set(specials)
-    matched = [t for t in transactions if special_set & set(t.get("tags") or [])]
-    total_amount = sum(amt(t) for t in matched)
-
-    breakdown = []
-    for tag in specials:
-        ts = [t for t in transactions if tag in (t.get("tags") or [])]
-        if ts:
-            breakdown.append({"tag": tag, "count": len(ts), "amount": sum(amt(x) for x in ts)})
-    breakdown.sort(key=lambda x: x["amount"], reverse=True)
-
-    return {"tags": specials, "count": len(matched), "amount": total_amount, "breakdown": breakdown}
+    totals = TransactionRepository().get_special_tag_totals(user_id, specials, filters)
+    return {"tags": specials, "count": totals["count"], "amount": totals["amount"], "breakdown": totals["breakdown"]}
 
 
 _SHARE_CHART_PALETTE = [
@@ -5263,8 +5277,7 @@ def api_preview_special():
     if date_to:
         filters["date_to"] = date_to
 
-    txs = TransactionRepository().get_transactions_with_filters(user_id, filters, limit=1000)
-    return jsonify(_special_aggregate(txs, specials))
+    return jsonify(_special_aggregate(user_id, filters, specials))
 
 
 @app.route("/myuangly/<username>/<slug>")
@@ -5291,6 +5304,41 @@ def share_public_view(username, slug):
     if date_to:
         filters["date_to"] = date_to
 
+    owner_id = str(owner["_id"])
+
+    # Rendered-page cache: a new share config, date range or owner data version
+    # yields a new ETag, so conditional requests and cache hits skip all queries below
+    data_version = get_data_version(owner_id)
+    etag = share_cache.page_etag(share, owner, data_version, request.args, (date_from, date_to))
+    last_modified = datetime.fromtimestamp(
+        max(int(share.get("updated_at") or 0), data_version_time(data_version)), timezone.utc
+    )
+    if request.if_none_match:
+        # RFC 9110: If-None-Match wins over If-Modified-Since
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        since = request.if_modified_since
+        if since is not None and since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # Strictly older only: an edit in the same second as the cached copy has the same Last-Modified
+        not_modified = bool(since and last_modified.replace(microsecond=0) < since)
+    if not_modified:
+        response = make_response("", 304)
+    else:
+        html = share_cache.get_page(etag)
+        if html is None:
+            html = _render_share_public_view(share, owner, username, owner_id, filters)
+            share_cache.store_page(etag, html)
+        response = make_response(html)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Shared caches may keep it but must revalidate (cheap 304s)
+    response.headers["Cache-Control"] = "public, no-cache"
+    return response
+
+
+def _render_share_public_view(share, owner, username, owner_id, filters):
+    """Full render of a published share page (report over the filtered set + paginated list)."""
     try:
         page = max(1, int(request.args.get("page", 1)))
     except Exception:
@@ -5300,8 +5348,6 @@ def share_public_view(username, slug):
     except Exception:
         per_page = 10
 
-    owner_id = str(owner["_id"])
-
     # Viewer type filter (server-side). The REPORT always reflects the full shared
     # set; only the paginated transaction list is narrowed by the viewer's choice.
     viewer_type = (request.args.get("tx_type") or "all").lower()
@@ -5325,8 +5371,25 @@ def share_public_view(username, slug):
             ]
         }
 
-    transactions, total_count = TransactionRepository().\
-        get_transactions_with_filters_paginated(owner_id, tx_filters, page, per_page, extra_query)
+    # Prev/next walk a keyset cursor (constant cost at any depth); numbered
+    # page links still jump with skip.
+    cursor = request.args.get("cursor")
+    known_total = request.args.get("total", type=int)
+    next_cursor = prev_cursor = None
+    if cursor or page == 1:
+        cursor_page = TransactionRepository().get_transactions_with_filters_cursor(
+            owner_id, tx_filters, cursor=cursor, per_page=per_page, extra_query=extra_query,
+            with_count=not (cursor and known_total is not None),
+        )
+        transactions = cursor_page["transactions"]
+        next_cursor = cursor_page["next_cursor"]
+        prev_cursor = cursor_page["prev_cursor"]
+        total_count = cursor_page["total_count"]
+        if total_count is None:
+            total_count = known_total
+    else:
+        transactions, total_count = TransactionRepository().\
+            get_transactions_with_filters_paginated(owner_id, tx_filters, page, per_page, extra_query)
     total_pages = (total_count + per_page - 1) // per_page
 
     wallets = WalletRepository().list_by_user(owner_id)
@@ -5352,7 +5415,7 @@ def share_public_view(username, slug):
     else:
         _pl, _pl_id = "all time", "semua waktu"
     report = _build_share_report(report_txs, wallets, scopes, categories, _pl, _pl_id)
-    special = _special_aggregate(report_txs, share.get("special_tags") or [])
+    special = _special_aggregate(owner_id, filters, share.get("special_tags") or [])
 
     return render_template(
         "share_public_view.html",
@@ -5368,8 +5431,10 @@ def share_public_view(username, slug):
         per_page=per_page,
         total_count=total_count,
         total_pages=total_pages,
-        has_prev=page > 1,
-        has_next=page < total_pages,
+        has_prev=page > 1 or bool(prev_cursor),
+        has_next=page < total_pages or bool(next_cursor),
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
         viewer_type=viewer_type,
         report=report,
         special=special,
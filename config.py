@@ -10,6 +10,7 @@ mainDB_string: str = "mongodb://127.0.0.1:27017/" + mainDB
 
 
 _mongo_client: Optional[MongoClient] = None
+_app_timezone: Optional[str] = None
 
 
 def get_mongo_client() -> MongoClient:
@@ -55,4 +56,31 @@ def ensure_indexes(index_specs: Dict[str, List[Tuple]]):
             coll.create_index([keys] if isinstance(keys[0], str) else keys, **(options or {}))
 
 
+def get_app_timezone() -> Optional[str]:
+    """IANA name of the zone dates are bucketed in (e.g. "Asia/Jakarta"), or None if unknown.
 
+    Dashboard ranges are built from naive local datetimes, so this is the
+    process's local zone: TZ when it names an IANA zone, else /etc/localtime.
+    """
+    global _app_timezone
+    if _app_timezone is None:
+        from zoneinfo import ZoneInfo
+
+        candidates = [os.getenv("TZ", "").lstrip(":")]
+        try:
+            target = os.path.realpath("/etc/localtime")
+            if "zoneinfo/" in target:
+                candidates.append(target.split("zoneinfo/", 1)[1])
+        except OSError:
+            pass
+        _app_timezone = ""
+        for name in candidates:
+            if not name or name.startswith("/"):
+                continue
+            try:
+                ZoneInfo(name)
+            except Exception:
+                continue
+            _app_timezone = name
+            break
+    return _app_timezone or None
@@ -4,36 +4,33 @@ from typing import Any, Dict
 
 from flask import Blueprint, jsonify, request, session
 
-from config import get_collection
+from mm.repositories.tx_rollups import TxRollupRepository, months_between
 
 
 bp = Blueprint("reports", __name__)
 
 
+def _rollup_breakdown(user_id: str, field: str):
+    rows = TxRollupRepository().sum_by(user_id, (field, "type"))
+    return [{"_id": row["_id"], "amount": row["amount"]} for row in rows]
+
+
 @bp.get("/summary")
 def summary():
     user_id = session.get("user_id", "demo_user")
     period = request.args.get("period", "monthly")  # monthly | yearly
 
-    coll = get_collection("transactions")
-
     now = int(time.time())
+    dt = datetime.fromtimestamp(now)
     if period == "yearly":
-        start = int(datetime(datetime.utcfromtimestamp(now).year, 1, 1).timestamp())
+        start_dt = datetime(dt.year, 1, 1)
     else:
-        dt = datetime.utcfromtimestamp(now)
-        start = int(datetime(dt.year, dt.month, 1).timestamp())
-
-    pipeline = [
-        {"$match": {"user_id": user_id, "timestamp": {"$gte": start}}},
-        {"$group": {
-            "_id": {
-                "type": "$type"
-            },
-            "amount": {"$sum": "$amount"}
-        }}
-    ]
-    grouped = list(coll.aggregate(pipeline))
+        start_dt = datetime(dt.year, dt.month, 1)
+    start = int(start_dt.timestamp())
+    end_dt = datetime(dt.year + 1, 1, 1) if dt.month == 12 else datetime(dt.year, dt.month + 1, 1)
+
+    # Sum the monthly rollups instead of every transaction since start
+    grouped = TxRollupRepository().sum_by(user_id, ("type",), months=months_between(start_dt, end_dt))
     income = next((g["amount"] for g in grouped if g["_id"]["type"] == "income"), 0)
     expense = next((g["amount"] for g in grouped if g["_id"]["type"] == "expense"), 0)
 
@@ -51,48 +48,18 @@ def summary():
 @bp.get("/breakdown/category")
 def breakdown_by_category():
     user_id = session.get("user_id", "demo_user")
-    coll = get_collection("transactions")
-    pipeline = [
-        {"$match": {"user_id": user_id}},
-        {"$group": {
-            "_id": {"category_id": "$category_id", "type": "$type"},
-            "amount": {"$sum": "$amount"}
-        }},
-        {"$sort": {"amount": -1}}
-    ]
-    data = list(coll.aggregate(pipeline))
-    return jsonify(data)
+    return jsonify(_rollup_breakdown(user_id, "category_id"))
 
 
 @bp.get("/breakdown/wallet")
 def breakdown_by_wallet():
     user_id = session.get("user_id", "demo_user")
-    coll = get_collection("transactions")
-    pipeline = [
-        {"$match": {"user_id": user_id}},
-        {"$group": {
-            "_id": {"wallet_id": "$wallet_id", "type": "$type"},
-            "amount": {"$sum": "$amount"}
-        }},
-        {"$sort": {"amount": -1}}
-    ]
-    data = list(coll.aggregate(pipeline))
-    return jsonify(data)
+    return jsonify(_rollup_breakdown(user_id, "wallet_id"))
 
 
 @bp.get("/breakdown/scope")
 def breakdown_by_scope():
     user_id = request.args.get("user_id", "demo_user")
-    coll = get_collection("transactions")
-    pipeline = [
-        {"$match": {"user_id": user_id}},
-        {"$group": {
-            "_id": {"scope_id": "$scope_id", "type": "$type"},
-            "amount": {"$sum": "$amount"}
-        }},
-        {"$sort": {"amount": -1}}
-    ]
-    data = list(coll.aggregate(pipeline))
-    return jsonify(data)
+    return jsonify(_rollup_breakdown(user_id, "scope_id"))
 
 
@@ -0,0 +1,263 @@
+from typing import Any, Dict, List, Optional
+import time
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+from config import get_collection
+from mm.repositories.base import MongoRepository
+
+
+DAY_SECONDS = 86400
+
+_indexes_ready = False
+_backfilled_users = set()
+
+
+def day_start(timestamp: int) -> int:
+    """UTC day bucket (epoch seconds) that a timestamp falls in."""
+    ts = int(timestamp)
+    return ts - ts % DAY_SECONDS
+
+
+class BalanceCheckpointRepository(MongoRepository):
+    """Per-wallet daily balance snapshots derived from transactions.
+
+    One document per (user_id, wallet_id, day) holding the balance_after of the
+    latest transaction (by timestamp, sequence_number) on that UTC day. The
+    wallet balance worker refreshes the affected day whenever it writes a
+    balance_after, so "balance of every wallet at time T" becomes a walk over
+    the checkpoint index plus at most one day of raw transactions instead of a
+    $sort/$group over the user's whole history.
+    """
+
+    def __init__(self):
+        super().__init__("wallet_balance_checkpoints")
+        self.transactions = get_collection("transactions")
+        self.state = get_collection("wallet_balance_checkpoint_state")
+        global _indexes_ready
+        if not _indexes_ready:
+            try:
+                self.collection.create_index(
+                    [("user_id", ASCENDING), ("wallet_id", ASCENDING), ("day", DESCENDING)],
+                    name="idx_ckpt_user_wallet_day",
+                    unique=True,
+                )
+                self.state.create_index([("user_id", ASCENDING)], name="idx_ckpt_state_user", unique=True)
+                _indexes_ready = True
+            except Exception:
+                pass
+
+    # ---- reads ------------------------------------------------------------
+    def get_balances_at(self, user_id: str, end_timestamp: int) -> Dict[str, Optional[float]]:
+        """Return {wallet_id: balance_after} of each wallet's latest transaction <= end_timestamp.
+
+        Wallets without any transaction up to end_timestamp are absent; a wallet
+        whose latest transaction has no balance_after maps to None.
+        """
+        self.ensure_backfilled(user_id)
+        cutoff_day = day_start(end_timestamp)
+        balances: Dict[str, Optional[float]] = {}
+
+        # Whole days before the cut-off: newest checkpoint per wallet, one
+        # idx_ckpt_user_wallet_day lookup each (cost doesn't grow with history)
+        for wallet_id in self.collection.distinct("wallet_id", {"user_id": user_id}):
+            checkpoint = self.collection.find_one(
+                {"user_id": user_id, "wallet_id": wallet_id, "day": {"$lt": cutoff_day}},
+                sort=[("day", -1)],
+                projection={"balance_after": 1},
+            )
+            if checkpoint:
+                balances[str(wallet_id)] = _as_float(checkpoint.get("balance_after"))
+
+        # The partial day up to the cut-off comes straight from transactions
+        for row in self.transactions.aggregate([
+            {"$match": {"user_id": user_id, "timestamp": {"$gte": cutoff_day, "$lte": end_timestamp}}},
+            {"$sort": {"wallet_id": 1, "timestamp": -1, "sequence_number": -1}},
+            {"$group": {"_id": "$wallet_id", "balance_after": {"$first": "$balance_after"}}},
+        ]):
+            balances[str(row["_id"])] = _as_float(row.get("balance_after"))
+
+        return balances
+
+    def get_balances_at_many(self, user_id: str, end_timestamps: List[int]) -> List[Dict[str, Optional[float]]]:
+        """get_balances_at for several cut-offs in two round-trips (one $facet per collection).
+
+        Returns one {wallet_id: balance_after} dict per entry of end_timestamps.
+        """
+        if not end_timestamps:
+            return []
+        self.ensure_backfilled(user_id)
+        cutoffs = [(int(ts), day_start(ts)) for ts in end_timestamps]
+        results: List[Dict[str, Optional[float]]] = [{} for _ in cutoffs]
+
+        checkpoint_facets = {
+            f"c{i}": [
+                {"$match": {"day": {"$lt": cutoff_day}}},
+                {"$sort": {"wallet_id": 1, "day": -1}},
+                {"$group": {"_id": "$wallet_id", "balance_after": {"$first": "$balance_after"}}},
+            ]
+            for i, (_, cutoff_day) in enumerate(cutoffs)
+        }
+        partial_facets = {
+            f"c{i}": [
+                {"$match": {"timestamp": {"$gte": cutoff_day, "$lte": end_ts}}},
+                {"$sort": {"wallet_id": 1, "timestamp": -1, "sequence_number": -1}},
+                {"$group": {"_id": "$wallet_id", "balance_after": {"$first": "$balance_after"}}},
+            ]
+            for i, (end_ts, cutoff_day) in enumerate(cutoffs)
+        }
+
+        # Whole days before each cut-off: newest checkpoint per wallet
+        checkpoint_rows = next(self.collection.aggregate([
+            {"$match": {"user_id": user_id, "day": {"$lt": max(day for _, day in cutoffs)}}},
+            {"$facet": checkpoint_facets},
+        ]), {})
+        # The partial days up to each cut-off come straight from transactions
+        partial_rows = next(self.transactions.aggregate([
+            {"$match": {"user_id": user_id, "$or": [
+                {"timestamp": {"$gte": cutoff_day, "$lte": end_ts}} for end_ts, cutoff_day in cutoffs
+            ]}},
+            {"$facet": partial_facets},
+        ]), {})
+
+        for i, balances in enumerate(results):
+            for rows in (checkpoint_rows.get(f"c{i}", []), partial_rows.get(f"c{i}", [])):
+                for row in rows:
+                    balances[str(row["_id"])] = _as_float(row.get("balance_after"))
+        return results
+
+    def get_wallet_balance_at(self, user_id: str, wallet_id: str, end_timestamp: int) -> Optional[float]:
+        """balance_after of one wallet's latest transaction <= end_timestamp (None if none)."""
+        self.ensure_backfilled(user_id)
+        cutoff_day = day_start(end_timestamp)
+
+        latest_tx = self.transactions.find_one(
+            {
+                "user_id": user_id,
+                "wallet_id": wallet_id,
+                "timestamp": {"$gte": cutoff_day, "$lte": end_timestamp},
+            },
+            sort=[("timestamp", -1), ("sequence_number", -1)],
+            projection={"balance_after": 1},
+        )
+        if latest_tx:
+            return _as_float(latest_tx.get("balance_after"))
+
+        checkpoint = self.collection.find_one(
+            {"user_id": user_id, "wallet_id": wallet_id, "day": {"$lt": cutoff_day}},
+            sort=[("day", -1)],
+            projection={"balance_after": 1},
+        )
+        if checkpoint:
+            return _as_float(checkpoint.get("balance_after"))
+        return None
+
+    # ---- maintenance --------------------------------------------------------
+    def refresh_day(self, user_id: str, wallet_id: str, timestamp: int) -> None:
+        """Re-derive the checkpoint of the day containing timestamp from its transactions."""
+        if not user_id or not wallet_id or timestamp is None:
+            return
+        day = day_start(timestamp)
+        key = {"user_id": user_id, "wallet_id": wallet_id, "day": day}
+
+        latest_tx = self.transactions.find_one(
+            {
+                "user_id": user_id,
+                "wallet_id": wallet_id,
+                "timestamp": {"$gte": day, "$lt": day + DAY_SECONDS},
+            },
+            sort=[("timestamp", -1), ("sequence_number", -1)],
+            projection={"timestamp": 1, "sequence_number": 1, "balance_after": 1},
+        )
+        if not latest_tx:
+            self.collection.delete_one(key)
+            return
+
+        self.collection.update_one(
+            key,
+            {"$set": {
+                "balance_after": latest_tx.get("balance_after"),
+                "timestamp": latest_tx.get("timestamp"),
+                "sequence_number": latest_tx.get("sequence_number", 0),
+                "updated_at": int(time.time()),
+            }},
+            upsert=True,
+        )
+
+    def rebuild_wallet(self, user_id: str, wallet_id: str, from_timestamp: Optional[int] = None) -> int:
+        """Rebuild one wallet's checkpoints (optionally only from the day of from_timestamp on)."""
+        return self._rebuild({"user_id": user_id, "wallet_id": wallet_id}, from_timestamp)
+
+    def rebuild_user(self, user_id: str) -> int:
+        """Rebuild every checkpoint of a user from their transactions."""
+        written = self._rebuild({"user_id": user_id}, None)
+        self.state.update_one(
+            {"user_id": user_id},
+            {"$set": {"backfilled_at": int(time.time())}},
+            upsert=True,
+        )
+        _backfilled_users.add(user_id)
+        return written
+
+    def ensure_backfilled(self, user_id: str) -> None:
+        """Build checkpoints for users whose history predates this collection (once)."""
+        if not user_id or user_id in _backfilled_users:
+            return
+        if self.state.find_one({"user_id": user_id}, projection={"_id": 1}):
+            _backfilled_users.add(user_id)
+            return
+        self.rebuild_user(user_id)
+
+    def _rebuild(self, scope: Dict[str, Any], from_timestamp: Optional[int]) -> int:
+        match: Dict[str, Any] = dict(scope)
+        stale: Dict[str, Any] = dict(scope)
+        if from_timestamp is not None:
+            first_day = day_start(from_timestamp)
+            match["timestamp"] = {"$gte": first_day}
+            stale["day"] = {"$gte": first_day}
+
+        pipeline = [
+            {"$match": match},
+            {"$sort": {"timestamp": 1, "sequence_number": 1}},
+            {"$group": {
+                "_id": {
+                    "wallet_id": "$wallet_id",
+                    "day": {"$subtract": ["$timestamp", {"$mod": ["$timestamp", DAY_SECONDS]}]},
+                },
+                "balance_after": {"$last": "$balance_after"},
+                "timestamp": {"$last": "$timestamp"},
+                "sequence_number": {"$last": "$sequence_number"},
+            }},
+        ]
+
+        now = int(time.time())
+        ops: List[UpdateOne] = []
+        for row in self.transactions.aggregate(pipeline, allowDiskUse=True):
+            wallet_id = row["_id"].get("wallet_id")
+            day = row["_id"].get("day")
+            if not wallet_id or day is None:
+                continue
+            ops.append(UpdateOne(
+                {"user_id": scope["user_id"], "wallet_id": wallet_id, "day": int(day)},
+                {"$set": {
+                    "balance_after": row.get("balance_after"),
+                    "timestamp": row.get("timestamp"),
+                    "sequence_number": row.get("sequence_number") or 0,
+                    "updated_at": now,
+                }},
+                upsert=True,
+            ))
+
+        self.collection.delete_many(stale)
+        if ops:
+            self.collection.bulk_write(ops, ordered=False)
+        return len(ops)
+
+
+def _as_float(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
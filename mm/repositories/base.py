@@ -1,10 +1,14 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Union
 
 from bson import ObjectId
 
 from config import get_collection
 
 
+# Projection accepted by the find helpers: {"field": 1, ...} or ["field", ...]
+Projection = Union[Dict[str, Any], List[str], None]
+
+
 class MongoRepository:
     def __init__(self, collection_name: str):
         self.collection = get_collection(collection_name)
@@ -20,22 +24,22 @@ class MongoRepository:
             print(f"❌ [BASE] Error traceback: {traceback.format_exc()}")
             raise e
 
-    def find_by_id(self, id_str: str) -> Optional[Dict[str, Any]]:
+    def find_by_id(self, id_str: str, projection: Projection = None) -> Optional[Dict[str, Any]]:
         """Find dokumen berdasarkan ID"""
         try:
             obj_id = ObjectId(id_str)
         except Exception:
             return None
         
-        doc = self.collection.find_one({"_id": obj_id})
+        doc = self.collection.find_one({"_id": obj_id}, projection)
         if doc:
             doc["_id"] = str(doc["_id"])
         return doc
 
-    def find_many(self, query: Dict[str, Any], limit: int = 100, sort: Optional[List] = None, skip: int = 0) -> List[Dict[str, Any]]:
-        """Find banyak dokumen dengan query sederhana"""
+    def find_many(self, query: Dict[str, Any], limit: int = 100, sort: Optional[List] = None, skip: int = 0, projection: Projection = None) -> List[Dict[str, Any]]:
+        """Find banyak dokumen dengan query sederhana (projection: field yang diambil saja)"""
         try:          
-            cursor = self.collection.find(query)
+            cursor = self.collection.find(query, projection)
            
             if sort:
                 cursor = cursor.sort(sort) 
@@ -55,9 +59,9 @@ class MongoRepository:
             print(f"❌ [BASE] Error traceback: {traceback.format_exc()}")
             return []
 
-    def find_one(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    def find_one(self, query: Dict[str, Any], projection: Projection = None) -> Optional[Dict[str, Any]]:
         """Find satu dokumen"""
-        doc = self.collection.find_one(query)
+        doc = self.collection.find_one(query, projection)
         if doc:
             doc["_id"] = str(doc["_id"])
         return doc
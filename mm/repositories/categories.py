@@ -1,8 +1,66 @@
 import json
 import os
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, Dict, List, Optional, Tuple
 from bson import ObjectId
-from mm.repositories.base import MongoRepository
+from mm.repositories.base import MongoRepository, Projection
+from mm.services import master_cache
+
+
+DEFAULT_CATEGORIES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+    'static', 'data', 'default_categories.json',
+)
+# How often the JSON's mtime is checked for a reload
+DEFAULTS_RECHECK_SECONDS = 5
+
+# (mtime, checked_at, categories, {id: category})
+_defaults: Tuple[Optional[float], float, Tuple[Dict[str, Any], ...], Dict[str, Dict[str, Any]]] = (None, 0.0, (), {})
+
+
+def _load_defaults() -> Tuple[Tuple[Dict[str, Any], ...], Dict[str, Dict[str, Any]]]:
+    """Default categories + id index, re-read only when the JSON file changes."""
+    global _defaults
+    mtime, checked_at, categories, by_id = _defaults
+    now = time.time()
+    if mtime is not None and now - checked_at < DEFAULTS_RECHECK_SECONDS:
+        return categories, by_id
+
+    try:
+        current_mtime = os.path.getmtime(DEFAULT_CATEGORIES_PATH)
+    except OSError:
+        current_mtime = None
+    if current_mtime is not None and current_mtime == mtime:
+        _defaults = (mtime, now, categories, by_id)
+        return categories, by_id
+
+    formatted: List[Dict[str, Any]] = []
+    if current_mtime is not None:
+        try:
+            with open(DEFAULT_CATEGORIES_PATH, 'r', encoding='utf-8') as f:
+                default_categories = json.load(f)
+            # Convert ke format yang sesuai dengan database
+            for cat in default_categories:
+                formatted.append({
+                    "_id": cat["id"],  # Use string ID for default categories
+                    "name": cat["name"],
+                    "type": cat["type"],
+                    "description": cat.get("description", ""),
+                    "icon": cat.get("icon", "fas fa-tag"),
+                    "color": cat.get("color", "#6c757d"),
+                    "is_default": cat.get("is_default", True),
+                    "is_system": cat.get("is_system", False),
+                    "user_id": "system"  # Mark as system category
+                })
+        except Exception as e:
+            print(f"❌ [CATEGORY] Could not load default categories: {e}")
+            # Keep serving the last good copy
+            return categories, by_id
+
+    categories = tuple(formatted)
+    by_id = {cat["_id"]: cat for cat in categories}
+    _defaults = (current_mtime if current_mtime is not None else -1.0, now, categories, by_id)
+    return categories, by_id
 
 
 class CategoryRepository(MongoRepository):
@@ -10,16 +68,24 @@ class CategoryRepository(MongoRepository):
         super().__init__("categories")
 
     def list_by_user(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get semua kategori untuk user tertentu"""
+        """Get semua kategori untuk user tertentu (cached, see master_cache)"""
         try:
-            return self.find_many({"user_id": user_id}, limit=100)
+            return master_cache.cached_list(
+                "categories", user_id, lambda: self.find_many({"user_id": user_id}, limit=100)
+            )
         except Exception:
             return []
 
-    def find_one(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    def insert_one(self, data: Dict[str, Any]) -> str:
+        """Insert kategori baru (invalidates the user's cached list)"""
+        inserted_id = super().insert_one(data)
+        master_cache.invalidate("categories", data.get("user_id"))
+        return inserted_id
+
+    def find_one(self, query: Dict[str, Any], projection: Projection = None) -> Optional[Dict[str, Any]]:
         """Find satu dokumen"""
         try:
-            return super().find_one(query)
+            return super().find_one(query, projection)
         except Exception as e:
             print(f"Error in category find_one: {e}")
             return None
@@ -41,6 +107,7 @@ class CategoryRepository(MongoRepository):
             
             # Update dengan ObjectId
             result = self.collection.update_one({"_id": obj_id}, {"$set": updates})
+            master_cache.invalidate("categories", user_id)
             return result.modified_count > 0
         except Exception:
             return False
@@ -62,41 +129,16 @@ class CategoryRepository(MongoRepository):
             
             # Delete dengan ObjectId
             result = self.collection.delete_one({"_id": obj_id})
+            master_cache.invalidate("categories", user_id)
             return result.deleted_count > 0
         except Exception:
             return False
     
     def get_default_categories(self) -> List[Dict[str, Any]]:
-        """Get default categories dari JSON file"""
+        """Get default categories dari JSON file (loaded once, reloaded when the file changes)"""
         try:
-            # Path ke file JSON default categories
-            json_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 
-                                   'static', 'data', 'default_categories.json')
-            
-            if os.path.exists(json_path):
-                with open(json_path, 'r', encoding='utf-8') as f:
-                    default_categories = json.load(f)
-                
-                # Convert ke format yang sesuai dengan database
-                formatted_categories = []
-                for cat in default_categories:
-                    formatted_cat = {
-                        "_id": cat["id"],  # Use string ID for default categories
-                        "name": cat["name"],
-                        "type": cat["type"],
-                        "description": cat.get("description", ""),
-                        "icon": cat.get("icon", "fas fa-tag"),
-                        "color": cat.get("color", "#6c757d"),
-                        "is_default": cat.get("is_default", True),
-                        "is_system": cat.get("is_system", False),
-                        "user_id": "system"  # Mark as system category
-                    }
-                    formatted_categories.append(formatted_cat)
-                
-                return formatted_categories
-            else:
-                return []
-                
+            categories, _ = _load_defaults()
+            return [dict(cat) for cat in categories]
         except Exception as e:
             return []
     
@@ -121,10 +163,9 @@ class CategoryRepository(MongoRepository):
         """Get category by ID (bisa dari default atau user)"""
         try:
             # First check default categories
-            default_categories = self.get_default_categories()
-            for cat in default_categories:
-                if cat["_id"] == category_id:
-                    return cat
+            _, defaults_by_id = _load_defaults()
+            if category_id in defaults_by_id:
+                return dict(defaults_by_id[category_id])
                     
             # If not found in defaults, check user categories
             if user_id:
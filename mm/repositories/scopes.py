@@ -1,6 +1,7 @@
 from typing import Any, Dict, List, Optional
 from bson import ObjectId
-from mm.repositories.base import MongoRepository
+from mm.repositories.base import MongoRepository, Projection
+from mm.services import master_cache
 
 
 class ScopeRepository(MongoRepository):
@@ -8,24 +9,29 @@ class ScopeRepository(MongoRepository):
         super().__init__("scopes")
 
     def list_by_user(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get semua scope untuk user tertentu"""
+        """Get semua scope untuk user tertentu (cached, see master_cache)"""
         try:  
-            result = self.find_many({"user_id": user_id}, limit=100)        
-            for scope in result:
-                print("  - Scope:", scope.get('name', 'No name'), "ID:", scope.get('_id', 'No ID'))
-            return result
+            return master_cache.cached_list(
+                "scopes", user_id, lambda: self.find_many({"user_id": user_id}, limit=100)
+            )
         except Exception as e:
             print(" [SCOPE_REPO] Error fetching scopes:", e)
             return []
 
-    def find_one(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    def find_one(self, query: Dict[str, Any], projection: Projection = None) -> Optional[Dict[str, Any]]:
         """Find satu dokumen"""
         try:
-            return super().find_one(query)
+            return super().find_one(query, projection)
         except Exception as e:
             print(f"Error in scope find_one: {e}")
             return None
 
+    def insert_one(self, data: Dict[str, Any]) -> str:
+        """Insert scope baru (invalidates the user's cached list)"""
+        inserted_id = super().insert_one(data)
+        master_cache.invalidate("scopes", data.get("user_id"))
+        return inserted_id
+
     def update_scope(self, scope_id: str, user_id: str, updates: Dict[str, Any]) -> bool:
         """Update scope dengan validasi user ownership"""
         try:
@@ -39,6 +45,7 @@ class ScopeRepository(MongoRepository):
             
             # Update dengan ObjectId
             result = self.collection.update_one({"_id": obj_id}, {"$set": updates})
+            master_cache.invalidate("scopes", user_id)
             return result.modified_count > 0
         except Exception:
             return False
@@ -56,6 +63,7 @@ class ScopeRepository(MongoRepository):
             
             # Delete dengan ObjectId
             result = self.collection.delete_one({"_id": obj_id})
+            master_cache.invalidate("scopes", user_id)
             return result.deleted_count > 0
         except Exception:
             return False
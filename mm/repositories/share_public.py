@@ -13,8 +13,8 @@ class SharePublicRepository(MongoRepository):
     def __init__(self):
         super().__init__("share_public")
         # The public URL is /myuangly/<username>/<slug> — enforce uniqueness of that pair.
-        # Inline create_index is the only live unique-index pattern in the codebase
-        # (see mm/repositories/ai_chats.py); ensure_indexes() is commented out in app.py.
+        # Inline create_index like mm/repositories/ai_chats.py; the core collections'
+        # indexes live in mm/services/index_migrations.py.
         try:
             self.collection.create_index(
                 [("username", ASCENDING), ("slug", ASCENDING)],
@@ -0,0 +1,205 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+import time
+
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from config import get_collection
+from mm.repositories.base import MongoRepository
+
+
+# Rows in these categories are counted in system_count (dashboard top tags skip them)
+SYSTEM_CATEGORIES = ("transfer", "balance_adjustment")
+
+# Idempotency keys remembered per stats document (worker replays after a lease expiry)
+TAG_STATS_OPS_KEPT = 200
+
+_indexes_ready = False
+
+
+def _tags_of(tx: Dict[str, Any]) -> List[str]:
+    """Stripped, de-duplicated tags of a transaction (legacy rows store a single string)."""
+    tags = tx.get("tags") or []
+    if isinstance(tags, str):
+        tags = [tags]
+    seen: Dict[str, None] = {}
+    for tag in tags:
+        if isinstance(tag, str) and tag.strip():
+            seen.setdefault(tag.strip(), None)
+    return list(seen)
+
+
+def _field(tag: str) -> str:
+    """Tag -> safe sub-document key ("." and "$" can't appear in field names)."""
+    return tag.replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+
+def _unfield(key: str) -> str:
+    return key.replace("%24", "$").replace("%2E", ".").replace("%25", "%")
+
+
+def tag_deltas(tx: Dict[str, Any], sign: int) -> List[Dict[str, Any]]:
+    """[{"tag", "count", "system_count", "amount", "last_used"}] adding (sign=1) or removing (-1) tx."""
+    tags = _tags_of(tx)
+    if not tags or not tx.get("user_id"):
+        return []
+    try:
+        amount = float(tx.get("amount", 0) or 0)
+    except (ValueError, TypeError):
+        amount = 0.0
+    is_system = tx.get("category_id") in SYSTEM_CATEGORIES
+    last_used = int(tx.get("timestamp") or 0) if sign > 0 else 0
+    return [
+        {
+            "user_id": tx["user_id"],
+            "tag": tag,
+            "count": sign,
+            "system_count": sign if is_system else 0,
+            "amount": sign * amount,
+            "last_used": last_used,
+        }
+        for tag in tags
+    ]
+
+
+def merge_tag_deltas(deltas: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Combine deltas of the same (user, tag); drop ones that cancel out."""
+    merged: Dict[tuple, Dict[str, Any]] = {}
+    for delta in deltas:
+        ident = (delta["user_id"], delta["tag"])
+        row = merged.get(ident)
+        if row is None:
+            merged[ident] = dict(delta)
+            continue
+        row["count"] += delta["count"]
+        row["system_count"] += delta["system_count"]
+        row["amount"] += delta["amount"]
+        row["last_used"] = max(row["last_used"], delta["last_used"])
+    return [
+        row for row in merged.values()
+        if row["count"] or row["system_count"] or abs(row["amount"]) > 1e-9 or row["last_used"]
+    ]
+
+
+class TagStatsRepository(MongoRepository):
+    """Per-user tag statistics: one document {user_id, tags: {tag: {count, system_count, amount, last_used}}}.
+
+    Kept up to date by the "tag_deltas" of rollup jobs of the wallet balance
+    worker. last_used only moves forward (deletes don't rewind it until the
+    next rebuild). A user's document is rebuilt from transactions the first
+    time it is read (flask rebuild-tag-stats for everyone).
+    """
+
+    def __init__(self):
+        super().__init__("tag_stats")
+        self.transactions = get_collection("transactions")
+        global _indexes_ready
+        if not _indexes_ready:
+            try:
+                self.collection.create_index([("user_id", ASCENDING)], name="idx_tag_stats_user", unique=True)
+                _indexes_ready = True
+            except Exception:
+                pass
+
+    # ---- reads ------------------------------------------------------------
+    def get_stats(self, user_id: str) -> Dict[str, Dict[str, Any]]:
+        """{tag: {"count", "system_count", "amount", "last_used"}} of tags still in use."""
+        try:
+            doc = self.collection.find_one({"user_id": user_id}, projection={"tags": 1, "bootstrapped": 1})
+            if not doc or not doc.get("bootstrapped"):
+                self.rebuild_user(user_id)
+                doc = self.collection.find_one({"user_id": user_id}, projection={"tags": 1}) or {}
+            return {
+                _unfield(key): stats
+                for key, stats in (doc.get("tags") or {}).items()
+                if int(stats.get("count", 0)) > 0
+            }
+        except Exception as e:
+            print(f"❌ [TAG_STATS] Error reading tag stats: {e}")
+            return {}
+
+    def list_tags(self, user_id: str) -> List[str]:
+        """Sorted tags the user has on at least one transaction."""
+        return sorted(self.get_stats(user_id))
+
+    def top_tags(self, user_id: str, limit: int = 5, include_system: bool = False,
+                 lowercase: bool = False) -> List[Dict[str, Any]]:
+        """[{"tag", "count", "amount", "last_used"}] by usage, most used first."""
+        merged: Dict[str, Dict[str, Any]] = {}
+        for tag, stats in self.get_stats(user_id).items():
+            count = int(stats.get("count", 0)) - (0 if include_system else int(stats.get("system_count", 0)))
+            if count <= 0:
+                continue
+            key = tag.lower() if lowercase else tag
+            row = merged.setdefault(key, {"tag": key, "count": 0, "amount": 0.0, "last_used": 0})
+            row["count"] += count
+            row["amount"] += float(stats.get("amount", 0))
+            row["last_used"] = max(row["last_used"], int(stats.get("last_used", 0)))
+        rows = sorted(merged.values(), key=lambda row: (row["count"], row["last_used"]), reverse=True)
+        return rows[:limit] if limit else rows
+
+    def suggest(self, user_id: str, prefix: str = "", limit: int = 20) -> List[Dict[str, Any]]:
+        """Autocomplete: tags starting with prefix (case-insensitive), most used then most recent first."""
+        needle = (prefix or "").strip().lower()
+        rows = [
+            {"tag": tag, "count": int(stats.get("count", 0)), "last_used": int(stats.get("last_used", 0))}
+            for tag, stats in self.get_stats(user_id).items()
+            if tag.lower().startswith(needle)
+        ]
+        rows.sort(key=lambda row: (row["count"], row["last_used"]), reverse=True)
+        return rows[:limit]
+
+    # ---- maintenance --------------------------------------------------------
+    def apply_deltas(self, user_id: str, deltas: Sequence[Dict[str, Any]], op_id: str) -> bool:
+        """Apply one job's tag deltas once; replaying op_id is a no-op."""
+        if not deltas:
+            return False
+        inc: Dict[str, Any] = {}
+        max_: Dict[str, Any] = {}
+        for delta in deltas:
+            base = f"tags.{_field(delta['tag'])}"
+            inc[f"{base}.count"] = inc.get(f"{base}.count", 0) + delta["count"]
+            inc[f"{base}.system_count"] = inc.get(f"{base}.system_count", 0) + delta["system_count"]
+            inc[f"{base}.amount"] = inc.get(f"{base}.amount", 0.0) + delta["amount"]
+            max_[f"{base}.last_used"] = max(max_.get(f"{base}.last_used", 0), delta["last_used"])
+        update = {
+            "$inc": inc,
+            "$max": max_,
+            "$set": {"updated_at": int(time.time())},
+            "$push": {"ops": {"$each": [op_id], "$slice": -TAG_STATS_OPS_KEPT}},
+        }
+        try:
+            # A document that already has op_id doesn't match; the upsert then hits the unique key
+            self.collection.update_one({"user_id": user_id, "ops": {"$ne": op_id}}, update, upsert=True)
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def rebuild_user(self, user_id: str) -> int:
+        """Recompute a user's tag stats from their transactions. Returns the number of tags."""
+        tags: Dict[str, Dict[str, Any]] = {}
+        for row in self.transactions.aggregate([
+            {"$match": {"user_id": user_id, "tags": {"$exists": True, "$nin": [None, "", []]}}},
+            {"$project": {"tags": 1, "amount": 1, "timestamp": 1, "category_id": 1}},
+        ]):
+            for delta in tag_deltas(dict(row, user_id=user_id), 1):
+                stats = tags.setdefault(_field(delta["tag"]), {"count": 0, "system_count": 0, "amount": 0.0, "last_used": 0})
+                stats["count"] += delta["count"]
+                stats["system_count"] += delta["system_count"]
+                stats["amount"] += delta["amount"]
+                stats["last_used"] = max(stats["last_used"], delta["last_used"])
+        # ops is left alone: a job replayed after its lease expired must still be recognised
+        self.collection.update_one(
+            {"user_id": user_id},
+            {"$set": {"tags": tags, "bootstrapped": True, "updated_at": int(time.time())}},
+            upsert=True,
+        )
+        return len(tags)
+
+    def rebuild_all(self) -> Dict[str, int]:
+        """rebuild_user for every user that has transactions."""
+        return {
+            user_id: self.rebuild_user(user_id)
+            for user_id in self.transactions.distinct("user_id")
+            if user_id
+        }
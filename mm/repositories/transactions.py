@@ -1,20 +1,235 @@
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from array import array
+import base64
+import json
 import re
 import time
+import math
+import sys
 from bson import ObjectId
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
 from pymongo import UpdateOne
-from mm.repositories.base import MongoRepository
-from datetime import datetime
+from pymongo.errors import BulkWriteError
+from config import get_app_timezone
+from mm.repositories.base import MongoRepository, Projection
+from mm.repositories.tx_rollups import merge_deltas, rollup_delta
+from mm.repositories.tag_stats import merge_tag_deltas, tag_deltas
+from datetime import datetime, timezone
+
+
+def encode_cursor(tx: Dict[str, Any], direction: str) -> str:
+    """Opaque keyset token for a transaction row: (timestamp, _id) + direction."""
+    payload = json.dumps({"t": tx.get("timestamp"), "i": str(tx.get("_id")), "d": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Optional[Dict[str, Any]]:
+    """Inverse of encode_cursor; None for malformed/foreign tokens."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        if data.get("d") not in ("next", "prev") or not ObjectId.is_valid(data.get("i")):
+            return None
+        if not isinstance(data.get("t"), (int, float)):
+            return None
+        return data
+    except Exception:
+        return None
+
+
+def _pick_manual_balance(balances: List[Dict[str, Any]], timestamp: int) -> Optional[str]:
+    """In-memory version of get_active_manual_balance_id over preloaded balances."""
+    eligible = [b for b in balances if b.get("balance_date", 0) <= timestamp]
+    latest = [b for b in eligible if b.get("is_latest")]
+    if latest:
+        return str(max(latest, key=lambda b: b.get("sequence_number", 0))["_id"])
+    if eligible:
+        return str(max(eligible, key=lambda b: b.get("balance_date", 0))["_id"])
+    return None
+
+
+def _local_utc_offset(timestamp: int) -> str:
+    """Server-local UTC offset ("+0700") at timestamp, for Mongo date operators."""
+    return datetime.fromtimestamp(timestamp).astimezone().strftime("%z") or "+0000"
+
+
+def _mongo_timezone(timestamp: int) -> str:
+    """Server-local zone for Mongo date operators: the IANA name (DST-aware) when known,
+    else the UTC offset at timestamp."""
+    return get_app_timezone() or _local_utc_offset(timestamp)
+
+
+def _utc_epoch(value: datetime) -> int:
+    """Epoch seconds of a BSON date (naive datetimes from pymongo are UTC)."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+# Search: note/tags words are stored as every prefix (up to SEARCH_PREFIX_MAX
+# chars) plus the whole word with an EXACT_MARK suffix, in _search_terms
+SEARCH_PREFIX_MAX = 15
+SEARCH_EXACT_MARK = "$"
+_SEARCH_WORD = re.compile(r"[^\W_]+")
+
+
+def search_words(text: Any) -> List[str]:
+    """Lowercased words of a note / tag / search box input, in order, deduplicated."""
+    seen: Dict[str, None] = {}
+    for word in _SEARCH_WORD.findall(str(text or "").lower()):
+        seen.setdefault(word, None)
+    return list(seen)
+
+
+def search_terms(note: Any, tags: Any = None) -> List[str]:
+    """_search_terms of a transaction: word prefixes + exact-word markers of note and tags."""
+    words = search_words(note)
+    for tag in tags if isinstance(tags, list) else []:
+        words.extend(search_words(tag))
+    terms: Dict[str, None] = {}
+    for word in words:
+        for size in range(1, min(len(word), SEARCH_PREFIX_MAX) + 1):
+            terms.setdefault(word[:size], None)
+        terms.setdefault(word + SEARCH_EXACT_MARK, None)
+    return list(terms)
+
+
+def _search_condition(text: Any) -> Optional[Dict[str, Any]]:
+    """Index-backed match for every word of text as a word prefix in note/tags.
+
+    Rows written before _search_terms existed fall back to one anchored regex
+    per word on note/tags with the same all-words semantics (an empty index
+    range once `flask rebuild-search-terms` has run).
+    """
+    words = search_words(text)
+    if not words:
+        return None
+    prefixes = [word[:SEARCH_PREFIX_MAX] for word in words]
+    legacy = []
+    for prefix in prefixes:
+        # Word start: beginning of the field or a non letter/digit before it
+        pattern = {"$regex": r"(^|[^\p{L}\p{N}])" + re.escape(prefix), "$options": "i"}
+        legacy.append({"$or": [{"note": pattern}, {"tags": pattern}]})
+    return {"$or": [
+        {"_search_terms": {"$all": prefixes}},
+        {"_search_terms": None, "$and": legacy},
+    ]}
+
+
+# Order in which a wallet's rows accumulate balance_before/balance_after. Every
+# balance path (recalculation, checkpoints, scans) uses it so same-timestamp rows
+# never disagree; it matches the idx_tx_user_wallet_time index.
+BALANCE_ORDER = [("timestamp", 1), ("sequence_number", 1)]
+
+
+# Named projections for hot read paths (pass the name as projection=...)
+TRANSACTION_PROJECTIONS: Dict[str, Dict[str, int]] = {
+    # Sums and category breakdowns
+    "totals": {
+        "type": 1, "amount": 1, "category_id": 1, "wallet_id": 1,
+        "timestamp": 1, "_snap.category_path": 1,
+    },
+    # Transaction list rows (dashboard / recent lists)
+    "list-row": {
+        "user_id": 1, "type": 1, "amount": 1, "timestamp": 1, "note": 1, "description": 1,
+        "tags": 1, "category_id": 1, "scope_id": 1, "wallet_id": 1,
+        "balance_before": 1, "balance_after": 1, "admin_fee": 1,
+        "is_balance_adjustment": 1, "is_transfer": 1, "is_transfer_fee": 1,
+        "from_wallet_id": 1, "to_wallet_id": 1, "_snap.category_path": 1,
+    },
+    # Balance / cashflow chart points
+    "chart-point": {
+        "type": 1, "amount": 1, "timestamp": 1, "sequence_number": 1,
+        "wallet_id": 1, "balance_before": 1, "balance_after": 1,
+    },
+}
+
+
+def resolve_projection(projection: Any) -> Projection:
+    """Map a preset name from TRANSACTION_PROJECTIONS to its field spec (others pass through)."""
+    if isinstance(projection, str):
+        if projection not in TRANSACTION_PROJECTIONS:
+            raise ValueError(f"Unknown transaction projection: {projection}")
+        return dict(TRANSACTION_PROJECTIONS[projection])
+    return projection
+
+
+# Fields decoded by TransactionRepository.scan_columns
+_SCAN_PROJECTION = {
+    "timestamp": 1, "amount": 1, "type": 1, "wallet_id": 1, "category_id": 1,
+    "balance_before": 1, "balance_after": 1, "_snap.category_path": 1,
+}
+
+
+class TransactionColumns:
+    """Parallel arrays of the numeric/key fields of a transaction scan.
+
+    Numbers live in array('d') (balance_before/after are NaN when missing);
+    type/wallet_id/category_id are interned strings, category_name is the last
+    _snap.category_path element or None. Row i is the i-th transaction of the scan.
+    """
+
+    __slots__ = ("timestamp", "amount", "balance_before", "balance_after",
+                 "type", "wallet_id", "category_id", "category_name")
+
+    def __init__(self):
+        self.timestamp = array("d")
+        self.amount = array("d")
+        self.balance_before = array("d")
+        self.balance_after = array("d")
+        self.type: List[str] = []
+        self.wallet_id: List[str] = []
+        self.category_id: List[str] = []
+        self.category_name: List[Optional[str]] = []
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def append(self, doc: Any) -> None:
+        """Append one (raw or decoded) transaction document."""
+        get = doc.get
+        self.timestamp.append(_as_number(get("timestamp"), 0.0))
+        self.amount.append(_as_number(get("amount"), 0.0))
+        self.balance_before.append(_as_number(get("balance_before"), math.nan))
+        self.balance_after.append(_as_number(get("balance_after"), math.nan))
+        self.type.append(sys.intern(str(get("type") or "expense")))
+        self.wallet_id.append(sys.intern(str(get("wallet_id") or "")))
+        self.category_id.append(sys.intern(str(get("category_id") or "")))
+        snap = get("_snap")
+        path = snap.get("category_path") if snap else None
+        self.category_name.append(str(path[-1]) if path else None)
+
+
+def _as_number(value: Any, default: float) -> float:
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return default
+
+
+# (field prefix, collection, label when the transaction has no reference)
+_NAME_SOURCES = (
+    ("category", "categories", "Uncategorized"),
+    ("scope", "scopes", "No Scope"),
+    ("wallet", "wallets", "No Wallet"),
+)
 
 
 class TransactionRepository(MongoRepository):
     def __init__(self):
         super().__init__("transactions")
 
-    def list_by_user(self, user_id: str, limit: int = 200) -> List[Dict[str, Any]]:
+    def find_many(self, query: Dict[str, Any], limit: int = 100, sort: Optional[List] = None, skip: int = 0, projection: Projection = None) -> List[Dict[str, Any]]:
+        """find_many without the internal _search_terms array on full documents"""
+        return super().find_many(query, limit=limit, sort=sort, skip=skip, projection=projection or {"_search_terms": 0})
+
+    def list_by_user(self, user_id: str, limit: int = 200, projection: Any = None) -> List[Dict[str, Any]]:
         """Query sederhana untuk mendapatkan transaksi user"""
         try:
-            transactions = self.find_many({"user_id": user_id}, limit=limit, sort=[("timestamp", -1)])
+            transactions = self.find_many({"user_id": user_id}, limit=limit, sort=[("timestamp", -1)], projection=resolve_projection(projection))
             # Ensure we always return a list, never None
             if transactions is None:
                 transactions = []
@@ -23,11 +238,14 @@ class TransactionRepository(MongoRepository):
             print(f"Error in list_by_user: {e}")
             return []
 
-    def get_user_transactions_simple(self, user_id: str, limit: int = 200) -> List[Dict[str, Any]]:
-        """Method sederhana untuk mendapatkan transaksi user"""
+    def get_user_transactions_simple(self, user_id: str, limit: int = 200, projection: Any = None) -> List[Dict[str, Any]]:
+        """Method sederhana untuk mendapatkan transaksi user
+
+        projection: field spec or a TRANSACTION_PROJECTIONS preset name.
+        """
         try:
             query = {"user_id": user_id}
-            transactions = self.find_many(query, limit=limit, sort=[("timestamp", -1)])
+            transactions = self.find_many(query, limit=limit, sort=[("timestamp", -1)], projection=resolve_projection(projection))
             
             # Ensure we always return a list, never None
             if transactions is None:
@@ -59,8 +277,12 @@ class TransactionRepository(MongoRepository):
             print(f"Error in get_user_transactions_simple: {e}")
             return []
 
-    def get_user_transactions_by_date_range(self, user_id: str, start_timestamp: int, end_timestamp: int, limit: int = 200) -> List[Dict[str, Any]]:
-        """Get user transactions within a specific date range"""
+    def get_user_transactions_by_date_range(self, user_id: str, start_timestamp: int, end_timestamp: int, limit: int = 200, projection: Any = None) -> List[Dict[str, Any]]:
+        """Get user transactions within a specific date range
+
+        projection: field spec or a TRANSACTION_PROJECTIONS preset name; names
+        are only resolved for full rows and the "list-row" preset.
+        """
         try:
             query = {
                 "user_id": user_id,
@@ -69,7 +291,7 @@ class TransactionRepository(MongoRepository):
                     "$lt": end_timestamp
                 }
             }
-            transactions = self.find_many(query, limit=limit, sort=[("timestamp", -1)])
+            transactions = self.find_many(query, limit=limit, sort=[("timestamp", -1)], projection=resolve_projection(projection))
             
             # Ensure we always return a list, never None
             if transactions is None:
@@ -97,64 +319,244 @@ class TransactionRepository(MongoRepository):
                     except (ValueError, TypeError):
                         tx["formatted_time"] = "Invalid Date"
                         tx["date"] = "Invalid Date"
-                
-                # Get category name if category_id exists
-                if tx.get("category_id"):
-                    try:
-                        from mm.repositories.categories import CategoryRepository
-                        category_repo = CategoryRepository()
-                        category = category_repo.find_by_id(tx["category_id"])
-                        if category:
-                            tx["category_name"] = category.get("name", "Unknown")
-                        else:
-                            tx["category_name"] = "Unknown"
-                    except Exception:
-                        tx["category_name"] = "Unknown"
-                else:
-                    tx["category_name"] = "Uncategorized"
-                
-                # Get scope name if scope_id exists
-                if tx.get("scope_id"):
-                    try:
-                        from mm.repositories.scopes import ScopeRepository
-                        scope_repo = ScopeRepository()
-                        scope = scope_repo.find_by_id(tx["scope_id"])
-                        if scope:
-                            tx["scope_name"] = scope.get("name", "Unknown")
-                        else:
-                            tx["scope_name"] = "Unknown"
-                    except Exception:
-                        tx["scope_name"] = "Unknown"
-                else:
-                    tx["scope_name"] = "No Scope"
-                
-                # Get wallet name if wallet_id exists
-                if tx.get("wallet_id"):
-                    try:
-                        from mm.repositories.wallets import WalletRepository
-                        wallet_repo = WalletRepository()
-                        wallet = wallet_repo.find_by_id(tx["wallet_id"])
-                        if wallet:
-                            tx["wallet_name"] = wallet.get("name", "Unknown")
-                        else:
-                            tx["wallet_name"] = "Unknown"
-                            print(f"❌ [TX] Wallet not found for wallet_id: {tx['wallet_id']}")
-                    except Exception as e:
-                        tx["wallet_name"] = "Unknown"
-                        print(f"❌ [TX] Error getting wallet for wallet_id {tx['wallet_id']}: {e}")
-                else:
-                    tx["wallet_name"] = "No Wallet"
+
+            # Resolve category/scope/wallet names in one batch
+            if projection is None or projection == "list-row":
+                self.attach_names(transactions)
             
             return transactions
         except Exception as e:
             print(f"Error in get_user_transactions_by_date_range: {e}")
             return []
     
-    def get_transactions_by_scope(self, user_id: str, scope_id: str, limit: int = 200) -> List[Dict[str, Any]]:
+    def get_dashboard_summary(self, user_id: str, start_timestamp: int, end_timestamp: int, bucket_unit: str = "day",
+                              exclude_category_ids: Optional[List[str]] = None, recent_limit: int = 5) -> Dict[str, Any]:
+        """Totals, category breakdown, chart buckets and recent rows of a period in one $facet.
+
+        bucket_unit is a $dateTrunc unit ("hour", "day", "month"); buckets are cut
+        in the server's local timezone, the same one the dashboard date ranges are
+        built in. Bucket/category rows keep the transaction field names
+        (type, amount, timestamp, category_id, _snap) so the chart and breakdown
+        helpers in app.py can consume them unchanged.
+        """
+        empty = {
+            "totals": {"income": 0.0, "expense": 0.0, "transfer": 0.0, "count": 0},
+            "categories": [],
+            "buckets": [],
+            "recent": [],
+        }
+        try:
+            match: Dict[str, Any] = {
+                "user_id": user_id,
+                "timestamp": {"$gte": start_timestamp, "$lt": end_timestamp},
+            }
+            if exclude_category_ids:
+                match["category_id"] = {"$nin": list(exclude_category_ids)}
+
+            amount = {"$convert": {"input": "$amount", "to": "double", "onError": 0, "onNull": 0}}
+            bucket = {"$dateTrunc": {
+                "date": {"$toDate": {"$multiply": ["$timestamp", 1000]}},
+                "unit": bucket_unit,
+                "timezone": _mongo_timezone(start_timestamp),
+            }}
+
+            pipeline = [
+                {"$match": match},
+                {"$facet": {
+                    "totals": [
+                        {"$group": {"_id": "$type", "amount": {"$sum": amount}, "count": {"$sum": 1}}},
+                    ],
+                    "categories": [
+                        {"$match": {"type": {"$in": ["income", "expense"]}}},
+                        {"$group": {
+                            "_id": {"type": "$type", "category_id": "$category_id"},
+                            "amount": {"$sum": amount},
+                            "count": {"$sum": 1},
+                            "category_path": {"$first": "$_snap.category_path"},
+                        }},
+                    ],
+                    "buckets": [
+                        {"$match": {"type": {"$in": ["income", "expense"]}}},
+                        {"$group": {
+                            "_id": {"type": "$type", "bucket": bucket},
+                            "amount": {"$sum": amount},
+                        }},
+                    ],
+                    "recent": [
+                        {"$sort": {"timestamp": -1, "_id": -1}},
+                        {"$limit": recent_limit},
+                        {"$project": TRANSACTION_PROJECTIONS["list-row"]},
+                    ],
+                }},
+            ]
+            result = next(self.collection.aggregate(pipeline, allowDiskUse=True), None) or {}
+
+            summary = dict(empty, totals=dict(empty["totals"]))
+            count = 0
+            for row in result.get("totals", []):
+                count += row.get("count", 0)
+                if row.get("_id") in ("income", "expense", "transfer"):
+                    summary["totals"][row["_id"]] = float(row.get("amount", 0))
+            summary["totals"]["count"] = count
+
+            summary["categories"] = [
+                {
+                    "type": row["_id"].get("type"),
+                    "category_id": row["_id"].get("category_id") or "",
+                    "amount": float(row.get("amount", 0)),
+                    "count": row.get("count", 0),
+                    "_snap": {"category_path": row.get("category_path") or []},
+                }
+                for row in result.get("categories", [])
+            ]
+            summary["buckets"] = [
+                {
+                    "type": row["_id"].get("type"),
+                    "timestamp": _utc_epoch(row["_id"]["bucket"]),
+                    "amount": float(row.get("amount", 0)),
+                }
+                for row in result.get("buckets", [])
+                if row["_id"].get("bucket") is not None
+            ]
+
+            recent = result.get("recent", [])
+            for tx in recent:
+                tx["_id"] = str(tx["_id"])
+                if "timestamp" in tx:
+                    try:
+                        tx["date"] = datetime.fromtimestamp(tx["timestamp"]).strftime("%Y-%m-%d")
+                    except (ValueError, TypeError):
+                        tx["date"] = "Invalid Date"
+            summary["recent"] = self._format_transactions(recent, with_names=True)
+            return summary
+        except Exception as e:
+            print(f"❌ [TRANSACTIONS] Error in get_dashboard_summary: {e}")
+            return empty
+
+    def get_period_totals(self, user_id: str, start_timestamp: int, end_timestamp: int,
+                          exclude_category_ids: Optional[List[str]] = None) -> Dict[str, float]:
+        """Income/expense/transfer sums of a period via $group (no row limit)."""
+        totals = {"income": 0.0, "expense": 0.0, "transfer": 0.0}
+        try:
+            match: Dict[str, Any] = {
+                "user_id": user_id,
+                "timestamp": {"$gte": start_timestamp, "$lt": end_timestamp},
+            }
+            if exclude_category_ids:
+                match["category_id"] = {"$nin": list(exclude_category_ids)}
+            amount = {"$convert": {"input": "$amount", "to": "double", "onError": 0, "onNull": 0}}
+            for row in self.collection.aggregate([
+                {"$match": match},
+                {"$group": {"_id": "$type", "amount": {"$sum": amount}}},
+            ]):
+                if row.get("_id") in totals:
+                    totals[row["_id"]] = float(row.get("amount", 0))
+        except Exception as e:
+            print(f"❌ [TRANSACTIONS] Error in get_period_totals: {e}")
+        return totals
+
+    def get_period_category_totals(self, user_id: str, periods: List[Tuple[int, int]]) -> List[List[Dict[str, Any]]]:
+        """Per-period (type, category) sums for several [start, end) ranges in one aggregation.
+
+        Every transaction is tagged with the index of the range it falls in
+        ($switch) and grouped by (period, type, category_id). Returns one list of
+        pre-grouped rows (type, category_id, amount, count, _snap) per period, in
+        the order of periods; overlapping ranges count a row in the first match.
+        """
+        result: List[List[Dict[str, Any]]] = [[] for _ in periods]
+        if not periods:
+            return result
+        try:
+            timestamp_range = {"$gte": min(start for start, _ in periods), "$lt": max(end for _, end in periods)}
+            amount = {"$convert": {"input": "$amount", "to": "double", "onError": 0, "onNull": 0}}
+            branches = [
+                {
+                    "case": {"$and": [{"$gte": ["$timestamp", start]}, {"$lt": ["$timestamp", end]}]},
+                    "then": index,
+                }
+                for index, (start, end) in enumerate(periods)
+            ]
+            pipeline = [
+                {"$match": {"user_id": user_id, "timestamp": timestamp_range}},
+                {"$project": {
+                    "type": 1, "category_id": 1, "amount": amount,
+                    "category_path": "$_snap.category_path",
+                    "period": {"$switch": {"branches": branches, "default": -1}},
+                }},
+                {"$match": {"period": {"$gte": 0}}},
+                {"$group": {
+                    "_id": {"period": "$period", "type": "$type", "category_id": "$category_id"},
+                    "amount": {"$sum": "$amount"},
+                    "count": {"$sum": 1},
+                    "category_path": {"$first": "$category_path"},
+                }},
+            ]
+            for row in self.collection.aggregate(pipeline, allowDiskUse=True):
+                key = row["_id"]
+                result[key["period"]].append({
+                    "type": key.get("type"),
+                    "category_id": key.get("category_id") or "",
+                    "amount": float(row.get("amount", 0)),
+                    "count": row.get("count", 0),
+                    "_snap": {"category_path": row.get("category_path") or []},
+                })
+        except Exception as e:
+            print(f"❌ [TRANSACTIONS] Error in get_period_category_totals: {e}")
+        return result
+
+    def iter_scan(self, query: Dict[str, Any], batch_size: int = 2000) -> Iterator[RawBSONDocument]:
+        """Stream raw (lazily decoded) transaction docs oldest-first for analytics scans."""
+        raw_collection = self.collection.with_options(
+            codec_options=CodecOptions(document_class=RawBSONDocument)
+        )
+        cursor = raw_collection.find(
+            query,
+            projection=_SCAN_PROJECTION,
+            sort=BALANCE_ORDER,
+            batch_size=batch_size,
+        )
+        for doc in cursor:
+            yield doc
+
+    def scan_columns(self, user_id: str, start_timestamp: Optional[int] = None, end_timestamp: Optional[int] = None,
+                     extra_query: Optional[Dict[str, Any]] = None) -> TransactionColumns:
+        """Columnar scan of a user's transactions (oldest first, no row limit).
+
+        Rows come back as RawBSONDocument and only the scanned fields are copied
+        into TransactionColumns, so large analytics reads don't build a formatted
+        dict per transaction. end_timestamp is exclusive.
+        """
+        columns = TransactionColumns()
+        try:
+            query: Dict[str, Any] = {"user_id": user_id}
+            if start_timestamp is not None or end_timestamp is not None:
+                query["timestamp"] = {}
+                if start_timestamp is not None:
+                    query["timestamp"]["$gte"] = start_timestamp
+                if end_timestamp is not None:
+                    query["timestamp"]["$lt"] = end_timestamp
+            if extra_query:
+                query = {"$and": [query, extra_query]}
+            for doc in self.iter_scan(query):
+                columns.append(doc)
+        except Exception as e:
+            print(f"❌ [TRANSACTIONS] Error in scan_columns: {e}")
+        return columns
+
+    def get_transfers_by_date_range(self, user_id: str, start_timestamp: int, end_timestamp: int, limit: int = 10000) -> List[Dict[str, Any]]:
+        """Transfer rows (category transfer or is_transfer) in a date range, newest first."""
+        query = {
+            "user_id": user_id,
+            "timestamp": {"$gte": start_timestamp, "$lt": end_timestamp},
+            "$or": [{"category_id": "transfer"}, {"is_transfer": True}],
+        }
+        return self.find_many(query, limit=limit, sort=[("timestamp", -1)], projection=resolve_projection("list-row"))
+
+    def get_transactions_by_scope(self, user_id: str, scope_id: str, limit: int = 200, projection: Any = None) -> List[Dict[str, Any]]:
         """Method untuk mendapatkan transaksi berdasarkan scope tertentu"""
         try:
             query = {"user_id": user_id, "scope_id": scope_id}
-            transactions = self.find_many(query, limit=limit, sort=[("timestamp", -1)])
+            transactions = self.find_many(query, limit=limit, sort=[("timestamp", -1)], projection=resolve_projection(projection))
             
             # Ensure we always return a list, never None
             if transactions is None:
@@ -365,57 +767,16 @@ class TransactionRepository(MongoRepository):
             print(f"❌ [TRANSACTIONS] Error getting next sequence number: {e}")
             return 1
 
-    def get_transactions_with_filters(self, user_id: str, filters: Dict[str, Any] = None, limit: int = 200) -> List[Dict[str, Any]]:
-        """Method untuk mendapatkan transaksi dengan multiple filters"""
+    def get_transactions_with_filters(self, user_id: str, filters: Dict[str, Any] = None, limit: int = 200, with_names: bool = False, projection: Any = None) -> List[Dict[str, Any]]:
+        """Method untuk mendapatkan transaksi dengan multiple filters
+
+        with_names: also resolve category_name/scope_name/wallet_name (batched).
+        projection: field spec or a TRANSACTION_PROJECTIONS preset name.
+        """
         try:
-            # Base query selalu include user_id
-            query = {"user_id": user_id}
-            
-            # Apply filters
-            if filters:
-                if filters.get("scope_id"):
-                    query["scope_id"] = filters["scope_id"]
-                
-                if filters.get("category_id"):
-                    query["category_id"] = filters["category_id"]
-                
-                if filters.get("wallet_id"):
-                    query["wallet_id"] = filters["wallet_id"]
-                
-                if filters.get("type"):
-                    query["type"] = filters["type"]
-                
-                if filters.get("tags") and isinstance(filters["tags"], list):
-                    # Filter berdasarkan tags (OR condition)
-                    query["tags"] = {"$in": filters["tags"]}
-                
-                if filters.get("date_from") or filters.get("date_to"):
-                    date_query = {}
-                    if filters.get("date_from"):
-                        date_query["$gte"] = int(filters["date_from"])
-                    if filters.get("date_to"):
-                        date_query["$lte"] = int(filters["date_to"])
-                    if date_query:
-                        query["timestamp"] = date_query
-                
-                if filters.get("amount_min") or filters.get("amount_max"):
-                    amount_query = {}
-                    if filters.get("amount_min"):
-                        amount_query["$gte"] = float(filters["amount_min"])
-                    if filters.get("amount_max"):
-                        amount_query["$lte"] = float(filters["amount_max"])
-                    if amount_query:
-                        query["amount"] = amount_query
-
-                if filters.get("search"):
-                    # Free-text search over note (case-insensitive). Special chars
-                    # are escaped so user input is treated literally.
-                    safe = re.escape(str(filters["search"]).strip())
-                    if safe:
-                        query["note"] = {"$regex": safe, "$options": "i"}
-            
-  
-            transactions = self.find_many(query, limit=limit, sort=[("timestamp", -1)])
+            query = self._build_filters_query(user_id, filters)
+
+            transactions = self.find_many(query, limit=limit, sort=[("timestamp", -1)], projection=resolve_projection(projection))
 
             # Ensure we always return a list, never None
             if transactions is None:
@@ -443,6 +804,9 @@ class TransactionRepository(MongoRepository):
                         tx["formatted_time"] = datetime.fromtimestamp(tx["timestamp"]).strftime("%Y-%m-%d %H:%M:%S")
                     except (ValueError, TypeError):
                         tx["formatted_time"] = "Invalid Time"
+
+            if with_names:
+                self.attach_names(transactions)
             
             return transactions
         except Exception as e:
@@ -474,47 +838,7 @@ class TransactionRepository(MongoRepository):
                     next_sequence = self.get_next_sequence_number(user_id, wallet_id, manual_balance_id)
                     data["sequence_number"] = next_sequence
 
-            # Set timestamp jika tidak ada
-            if "timestamp" not in data:
-                data["timestamp"] = int(datetime.now().timestamp())
-            
-            # Validasi dan konversi amount field
-            if "amount" in data:
-                try:
-                    # Handle berbagai tipe data amount
-                    amount_value = data["amount"]
-                    if isinstance(amount_value, str):
-                        # Jika string kosong atau whitespace, set ke 0
-                        if not amount_value.strip():
-                            data["amount"] = 0.0
-                        else:
-                            # Coba konversi string ke float
-                            data["amount"] = float(amount_value)
-                    elif isinstance(amount_value, (int, float)):
-                        # Jika sudah numeric, pastikan float
-                        data["amount"] = float(amount_value)
-                    else:
-                        # Jika tipe data tidak valid, set ke 0
-                        data["amount"] = 0.0
-                except (ValueError, TypeError) as e:
-                    data["amount"] = 0.0
-            else:
-                # Jika amount tidak ada, set default 0
-                data["amount"] = 0.0
-            
-            # Set created_at dan updated_at
-            current_time = int(datetime.now().timestamp())
-            data["created_at"] = current_time
-            data["updated_at"] = current_time
-
-            should_sync_balance = (
-                data.get("wallet_id")
-                and data.get("user_id")
-                and not data.get("skip_balance_update", False)
-                and not data.get("is_transfer_fee")
-            )
-            if should_sync_balance and "balance_sync" not in data:
-                data["balance_sync"] = "pending"
+            should_sync_balance = self._normalize_new_transaction(data)
 
             # Insert ke database
             result = self.collection.insert_one(data)
@@ -529,6 +853,7 @@ class TransactionRepository(MongoRepository):
                         transaction_type=data.get("type", "expense"),
                         amount=float(data.get("amount", 0)),
                     )
+                self._enqueue_rollups([(data, 1)])
 
                 return str(result.inserted_id)
             else:
@@ -539,6 +864,169 @@ class TransactionRepository(MongoRepository):
             print(f"❌ [TRANSACTIONS] Error traceback: {traceback.format_exc()}")
             return None
 
+    def insert_many(self, docs: List[Dict[str, Any]]) -> List[str]:
+        """Bulk insert (OCR confirm / imports) with the same auto-fill as insert_one.
+
+        Manual balances are loaded once per wallet, sequence numbers are handed
+        out as a contiguous block per manual balance, all rows go in with one
+        insert_many and every wallet gets a single aggregated balance job.
+        Returns the inserted ids in input order; if the insert stops part-way,
+        the rows that landed still get their jobs and only their ids are returned.
+        """
+        if not docs:
+            return []
+        try:
+            from mm.repositories.manual_balance import ManualBalanceRepository
+            balance_coll = ManualBalanceRepository().collection
+            now_ts = int(datetime.now().timestamp())
+
+            for data in docs:
+                data.setdefault("timestamp", now_ts)
+
+            # Manual balance candidates, one query per (user, wallet)
+            needs_balance: Dict[Tuple[str, str], int] = {}
+            for data in docs:
+                if not data.get("fk_manual_balance_id") and data.get("user_id") and data.get("wallet_id"):
+                    key = (data["user_id"], data["wallet_id"])
+                    needs_balance[key] = max(needs_balance.get(key, 0), int(data["timestamp"]))
+            balances_by_wallet: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+            for (user_id, wallet_id), max_ts in needs_balance.items():
+                balances_by_wallet[(user_id, wallet_id)] = list(balance_coll.find(
+                    {"user_id": user_id, "wallet_id": wallet_id, "balance_date": {"$lte": max_ts}},
+                    projection={"balance_date": 1, "is_latest": 1, "sequence_number": 1},
+                ))
+            for data in docs:
+                key = (data.get("user_id"), data.get("wallet_id"))
+                if not data.get("fk_manual_balance_id") and key in balances_by_wallet:
+                    manual_balance_id = _pick_manual_balance(balances_by_wallet[key], int(data["timestamp"]))
+                    if manual_balance_id:
+                        data["fk_manual_balance_id"] = manual_balance_id
+
+            # Contiguous sequence block per (user, wallet, manual balance)
+            next_sequence: Dict[Tuple[str, str, str], int] = {}
+            for data in docs:
+                if data.get("sequence_number"):
+                    continue
+                manual_balance_id = data.get("fk_manual_balance_id")
+                if not (data.get("user_id") and data.get("wallet_id") and manual_balance_id):
+                    continue
+                key = (data["user_id"], data["wallet_id"], manual_balance_id)
+                if key not in next_sequence:
+                    next_sequence[key] = self.get_next_sequence_number(*key)
+                data["sequence_number"] = next_sequence[key]
+                next_sequence[key] += 1
+
+            sync_flags = [self._normalize_new_transaction(data) for data in docs]
+
+            try:
+                result = self.collection.insert_many(docs, ordered=True)
+            except BulkWriteError as e:
+                # Ordered: exactly the first nInserted docs landed (their _id was set client-side)
+                landed = docs[:int(e.details.get("nInserted", 0))]
+                inserted_ids = [str(data["_id"]) for data in landed]
+                self._enqueue_inserted(landed, inserted_ids, sync_flags)
+                print(f"❌ [TRANSACTIONS] Bulk insert stopped after {len(landed)} of {len(docs)} rows: {e.details.get('writeErrors')}")
+                return inserted_ids
+            inserted_ids = [str(_id) for _id in result.inserted_ids]
+            self._enqueue_inserted(docs, inserted_ids, sync_flags)
+
+            return inserted_ids
+        except Exception as e:
+            import traceback
+            print(f"❌ [TRANSACTIONS] Error traceback: {traceback.format_exc()}")
+            return []
+
+    def _enqueue_inserted(self, docs: List[Dict[str, Any]], inserted_ids: List[str], sync_flags: List[bool]) -> None:
+        """Balance and rollup jobs of rows inserted by insert_many (one balance job per wallet, in input order)."""
+        per_wallet: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for data, tx_id, should_sync in zip(docs, inserted_ids, sync_flags):
+            if not should_sync:
+                continue
+            per_wallet.setdefault((data["user_id"], data["wallet_id"]), []).append({
+                "transaction_id": tx_id,
+                "transaction_type": data.get("type", "expense"),
+                "amount": float(data.get("amount", 0)),
+            })
+        if per_wallet:
+            from mm.services.wallet_balance_worker import enqueue_apply_transactions
+            for (user_id, wallet_id), items in per_wallet.items():
+                enqueue_apply_transactions(user_id, wallet_id, items)
+        if docs:
+            self._enqueue_rollups([(data, 1) for data in docs])
+
+    def _enqueue_rollups(self, changes: List[Tuple[Dict[str, Any], int]]) -> None:
+        """Hand tx_rollups and tag_stats deltas of (transaction, +1/-1) changes to the worker, one job per user.
+
+        Also bumps the users' data version (every transaction write passes here).
+        """
+        try:
+            per_user: Dict[str, List[Dict[str, Any]]] = {}
+            for delta in merge_deltas(rollup_delta(tx, sign) for tx, sign in changes):
+                per_user.setdefault(delta["key"]["user_id"], []).append(delta)
+            tags_per_user: Dict[str, List[Dict[str, Any]]] = {}
+            for delta in merge_tag_deltas(d for tx, sign in changes for d in tag_deltas(tx, sign)):
+                tags_per_user.setdefault(delta["user_id"], []).append(delta)
+            from mm.services.data_version import bump_data_version
+            for user_id in {tx.get("user_id") for tx, _ in changes}:
+                bump_data_version(user_id)
+            if per_user or tags_per_user:
+                from mm.services.wallet_balance_worker import enqueue_rollup_deltas
+                for user_id in set(per_user) | set(tags_per_user):
+                    enqueue_rollup_deltas(user_id, per_user.get(user_id, []), tags_per_user.get(user_id))
+        except Exception as e:
+            # Rollups/tag stats drift until the next `flask rebuild-rollups` / `flask rebuild-tag-stats`;
+            # the transaction itself is saved
+            print(f"❌ [TRANSACTIONS] Could not enqueue rollup deltas: {e}")
+
+    def _normalize_new_transaction(self, data: Dict[str, Any]) -> bool:
+        """Defaults/coercion shared by insert_one and insert_many.
+
+        Returns True when the wallet balance worker should apply the row.
+        """
+        # Set timestamp jika tidak ada
+        if "timestamp" not in data:
+            data["timestamp"] = int(datetime.now().timestamp())
+        
+        # Validasi dan konversi amount field
+        if "amount" in data:
+            try:
+                # Handle berbagai tipe data amount
+                amount_value = data["amount"]
+                if isinstance(amount_value, str):
+                    # Jika string kosong atau whitespace, set ke 0
+                    if not amount_value.strip():
+                        data["amount"] = 0.0
+                    else:
+                        # Coba konversi string ke float
+                        data["amount"] = float(amount_value)
+                elif isinstance(amount_value, (int, float)):
+                    # Jika sudah numeric, pastikan float
+                    data["amount"] = float(amount_value)
+                else:
+                    # Jika tipe data tidak valid, set ke 0
+                    data["amount"] = 0.0
+            except (ValueError, TypeError) as e:
+                data["amount"] = 0.0
+        else:
+            # Jika amount tidak ada, set default 0
+            data["amount"] = 0.0
+        
+        # Set created_at dan updated_at
+        current_time = int(datetime.now().timestamp())
+        data["created_at"] = current_time
+        data["updated_at"] = current_time
+        data["_search_terms"] = search_terms(data.get("note"), data.get("tags"))
+
+        should_sync_balance = bool(
+            data.get("wallet_id")
+            and data.get("user_id")
+            and not data.get("skip_balance_update", False)
+            and not data.get("is_transfer_fee")
+        )
+        if should_sync_balance and "balance_sync" not in data:
+            data["balance_sync"] = "pending"
+        return should_sync_balance
+
     def _update_wallet_balance_after_transaction(self, wallet_id: str, user_id: str, transaction_type: str, amount: float) -> bool:
         """Update wallet balance (sync path — used by background worker internals)."""
         try:
@@ -578,11 +1066,18 @@ class TransactionRepository(MongoRepository):
                 old_amount = 0.0
             # Tambah timestamp update
             updates["updated_at"] = int(time.time())
+            if "note" in updates or "tags" in updates:
+                updates["_search_terms"] = search_terms(
+                    updates.get("note", existing_tx.get("note")),
+                    updates.get("tags", existing_tx.get("tags")),
+                )
             
             # Update dengan ObjectId
             result = self.collection.update_one({"_id": obj_id}, {"$set": updates})
             
             if result.modified_count > 0:
+                self._enqueue_rollups([(existing_tx, -1), ({**existing_tx, **updates}, 1)])
+
                 balance_affecting_change = old_wallet_id and (
                     updates.get("wallet_id") != old_wallet_id
                     or updates.get("type") != old_type
@@ -601,7 +1096,7 @@ class TransactionRepository(MongoRepository):
                         from mm.services.wallet_balance_worker import enqueue_update_transaction_balances
                         self.collection.update_one(
                             {"_id": obj_id},
-                            {"$set": {"balance_sync": "pending", "updated_at": int(time.time())}},
+                            {"$set": {"balance_sync": "pending", "balance_sync_op": "update", "updated_at": int(time.time())}},
                         )
                         enqueue_update_transaction_balances(
                             transaction_id=transaction_id,
@@ -618,10 +1113,13 @@ class TransactionRepository(MongoRepository):
                     # bulk_write (cheap), so we can afford to run it on every balance-affecting
                     # edit. Recalculate both the old wallet and (if the tx moved) the new one,
                     # since the chronological saldo shifts in each.
+                    # Only rows from the earliest touched timestamp on can change.
                     from mm.services.wallet_balance_worker import enqueue_recalculate_wallet
+                    touched = [t for t in (old_timestamp, updates.get("timestamp")) if isinstance(t, (int, float))]
+                    from_timestamp = int(min(touched)) if touched else None
                     affected_wallets = {w for w in (old_wallet_id, new_wallet_id) if w}
                     for affected_wallet_id in affected_wallets:
-                        enqueue_recalculate_wallet(user_id, affected_wallet_id)
+                        enqueue_recalculate_wallet(user_id, affected_wallet_id, from_timestamp=from_timestamp)
 
                 return True
             else:
@@ -675,6 +1173,7 @@ class TransactionRepository(MongoRepository):
             result = self.collection.delete_one({"_id": obj_id})
             
             if result.deleted_count > 0:
+                self._enqueue_rollups([(existing_tx, -1)])
                 if wallet_id and transaction_type and amount > 0:
                     from mm.services.wallet_balance_worker import enqueue_revert_transaction
                     enqueue_revert_transaction(
@@ -682,6 +1181,7 @@ class TransactionRepository(MongoRepository):
                         user_id=user_id,
                         transaction_type=transaction_type,
                         amount=amount,
+                        timestamp=existing_tx.get("timestamp"),
                     )
 
                 return True
@@ -692,19 +1192,30 @@ class TransactionRepository(MongoRepository):
             print(f"❌ [TRANSACTIONS] Error deleting transaction: {e}")
             return False
     
-    def recalculate_wallet_balances(self, user_id: str, wallet_id: str) -> Dict[str, Any]:
-        """Recalculate all balance_before and balance_after for transactions in a specific wallet"""
+    def recalculate_wallet_balances(self, user_id: str, wallet_id: str, from_timestamp: Optional[int] = None) -> Dict[str, Any]:
+        """Recalculate all balance_before and balance_after for transactions in a specific wallet
+
+        from_timestamp: incremental mode — only rows at/after it are rewritten,
+        seeded from the preceding row's balance_after. Falls back to the full
+        pass when there is no usable seed or the result doesn't land on the
+        wallet's actual_balance (i.e. earlier rows are out of sync too).
+        """
         try:
+            if from_timestamp is not None:
+                result = self._recalculate_wallet_suffix(user_id, wallet_id, int(from_timestamp))
+                if result is not None:
+                    return result
   
-            # Get all transactions for this wallet, sorted by timestamp ascending
+            # Get all transactions for this wallet, oldest first in balance order
             query = {
                 "user_id": user_id,
                 "wallet_id": wallet_id
             }
             
-            transactions = list(self.collection.find(query).sort("timestamp", 1))
+            transactions = list(self.collection.find(query).sort(BALANCE_ORDER))
             
             if not transactions:
+                self._rebuild_balance_checkpoints(user_id, wallet_id)
                 return {"success": True, "message": "No transactions to recalculate", "updated_count": 0}
             
 
@@ -782,6 +1293,8 @@ class TransactionRepository(MongoRepository):
                 result = self.collection.bulk_write(ops, ordered=False)
                 updated_count = result.modified_count
 
+            self._rebuild_balance_checkpoints(user_id, wallet_id)
+
             return {
                 "success": True,
                 "message": f"Successfully recalculated {updated_count} transactions",
@@ -796,13 +1309,86 @@ class TransactionRepository(MongoRepository):
             print(f"❌ [BALANCE] Error traceback: {traceback.format_exc()}")
             return {"success": False, "error": str(e)}
 
+    def _recalculate_wallet_suffix(self, user_id: str, wallet_id: str, from_timestamp: int) -> Optional[Dict[str, Any]]:
+        """Incremental recalculate: rewrite only rows with timestamp >= from_timestamp.
+
+        Returns None when the caller should fall back to the full pass.
+        """
+        query = {"user_id": user_id, "wallet_id": wallet_id}
+        seed = self.collection.find_one(
+            dict(query, timestamp={"$lt": from_timestamp}),
+            sort=[(field, -1) for field, _ in BALANCE_ORDER],
+            projection={"balance_after": 1},
+        )
+        if not seed or seed.get("balance_after") is None:
+            return None
+
+        from mm.repositories.wallets import WalletRepository
+        wallet = WalletRepository().get_wallet_by_id(wallet_id, user_id)
+        if not wallet:
+            print(f"❌ [BALANCE] Wallet not found: {wallet_id}")
+            return {"success": False, "error": "Wallet not found"}
+
+        suffix = self.collection.find(
+            dict(query, timestamp={"$gte": from_timestamp}),
+            projection={"type": 1, "amount": 1},
+        ).sort(BALANCE_ORDER)
+
+        starting_balance = float(seed["balance_after"])
+        running_balance = starting_balance
+        now = int(time.time())
+        ops = []
+        for tx in suffix:
+            tx_type = tx.get("type", "expense")
+            tx_amount = float(tx.get("amount", 0))
+            balance_before = running_balance
+            if tx_type == "income":
+                running_balance += tx_amount
+            elif tx_type == "expense":
+                running_balance -= tx_amount
+            ops.append(UpdateOne(
+                {"_id": tx["_id"]},
+                {"$set": {
+                    "balance_before": balance_before,
+                    "balance_after": running_balance,
+                    "updated_at": now,
+                }},
+            ))
+
+        # Earlier rows are out of sync as well -> only a full pass can fix it
+        if abs(running_balance - float(wallet.get("actual_balance", 0))) > 0.01:
+            return None
+
+        updated_count = 0
+        if ops:
+            updated_count = self.collection.bulk_write(ops, ordered=False).modified_count
+
+        self._rebuild_balance_checkpoints(user_id, wallet_id, from_timestamp)
+
+        return {
+            "success": True,
+            "message": f"Successfully recalculated {updated_count} transactions",
+            "updated_count": updated_count,
+            "starting_balance": starting_balance,
+            "final_balance": running_balance,
+            "from_timestamp": from_timestamp,
+        }
+
+    def _rebuild_balance_checkpoints(self, user_id: str, wallet_id: str, from_timestamp: Optional[int] = None) -> None:
+        """Keep the daily balance checkpoints in line after balance_after was rewritten."""
+        try:
+            from mm.repositories.balance_checkpoints import BalanceCheckpointRepository
+            BalanceCheckpointRepository().rebuild_wallet(user_id, wallet_id, from_timestamp)
+        except Exception as e:
+            print(f"❌ [BALANCE] Error rebuilding balance checkpoints: {e}")
+
     def get_transaction_by_id(self, transaction_id: str, user_id: str) -> Dict[str, Any]:
         """Get transaksi berdasarkan ID dengan validasi user ownership"""
         try:
             # Convert string ID ke ObjectId
             obj_id = ObjectId(transaction_id)
             
-            transaction = self.collection.find_one({"_id": obj_id, "user_id": user_id})
+            transaction = self.collection.find_one({"_id": obj_id, "user_id": user_id}, {"_search_terms": 0})
             if transaction:
                 # Convert ObjectId ke string
                 transaction["_id"] = str(transaction["_id"])
@@ -830,8 +1416,11 @@ class TransactionRepository(MongoRepository):
         except Exception:
             return {}
 
-    def get_user_transactions_paginated(self, user_id: str, page: int = 1, per_page: int = 20) -> Tuple[List[Dict[str, Any]], int]:
-        """Get user transactions with pagination"""
+    def get_user_transactions_paginated(self, user_id: str, page: int = 1, per_page: int = 20, projection: Any = None) -> Tuple[List[Dict[str, Any]], int]:
+        """Get user transactions with pagination.
+
+        projection: field spec or a TRANSACTION_PROJECTIONS preset name.
+        """
         try:
             skip = (page - 1) * per_page
             
@@ -840,7 +1429,7 @@ class TransactionRepository(MongoRepository):
             
             # Get paginated transactions
             query = {"user_id": user_id}
-            transactions = self.find_many(query, limit=per_page, sort=[("timestamp", -1)], skip=skip)
+            transactions = self.find_many(query, limit=per_page, sort=[("timestamp", -1)], skip=skip, projection=resolve_projection(projection))
             
             # Format transactions
             transactions = self._format_transactions(transactions)
@@ -870,7 +1459,7 @@ class TransactionRepository(MongoRepository):
             print(f"Error in get_transactions_by_scope_paginated: {e}")
             return [], 0
 
-    def get_transactions_with_filters_paginated(self, user_id: str, filters: Dict[str, Any] = None, page: int = 1, per_page: int = 20, extra_query: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], int]:
+    def get_transactions_with_filters_paginated(self, user_id: str, filters: Dict[str, Any] = None, page: int = 1, per_page: int = 20, extra_query: Optional[Dict[str, Any]] = None, with_names: bool = False, projection: Any = None) -> Tuple[List[Dict[str, Any]], int]:
         """Get transactions with filters and pagination.
 
         extra_query: optional raw Mongo conditions AND-ed onto the built query
@@ -881,61 +1470,208 @@ class TransactionRepository(MongoRepository):
             skip = (page - 1) * per_page
             
             # Build query
-            query = {"user_id": user_id}
-            if filters:
-                if filters.get("scope_id"):
-                    query["scope_id"] = filters["scope_id"]
-                if filters.get("category_id"):
-                    query["category_id"] = filters["category_id"]
-                if filters.get("wallet_id"):
-                    query["wallet_id"] = filters["wallet_id"]
-                if filters.get("type"):
-                    query["type"] = filters["type"]
-                if filters.get("tags") and isinstance(filters["tags"], list):
-                    query["tags"] = {"$in": filters["tags"]}
-                if filters.get("date_from") or filters.get("date_to"):
-                    date_query = {}
-                    if filters.get("date_from"):
-                        date_query["$gte"] = int(filters["date_from"])
-                    if filters.get("date_to"):
-                        date_query["$lte"] = int(filters["date_to"])
-                    if date_query:
-                        query["timestamp"] = date_query
-                if filters.get("amount_min") or filters.get("amount_max"):
-                    amount_query = {}
-                    if filters.get("amount_min"):
-                        amount_query["$gte"] = float(filters["amount_min"])
-                    if filters.get("amount_max"):
-                        amount_query["$lte"] = float(filters["amount_max"])
-                    if amount_query:
-                        query["amount"] = amount_query
-
-                if filters.get("search"):
-                    # Free-text search over note (case-insensitive). Special chars
-                    # are escaped so user input is treated literally.
-                    safe = re.escape(str(filters["search"]).strip())
-                    if safe:
-                        query["note"] = {"$regex": safe, "$options": "i"}
-
-            # AND extra raw conditions (viewer type filter) without key clashes
-            if extra_query:
-                query = {"$and": [query, extra_query]}
+            query = self._build_filters_query(user_id, filters, extra_query)
 
             # Get total count
             total_count = self.collection.count_documents(query)
             
             # Get paginated transactions
-            transactions = self.find_many(query, limit=per_page, sort=[("timestamp", -1)], skip=skip)
+            transactions = self.find_many(query, limit=per_page, sort=[("timestamp", -1)], skip=skip, projection=resolve_projection(projection))
             
             # Format transactions
-            transactions = self._format_transactions(transactions)
+            transactions = self._format_transactions(transactions, with_names=with_names)
             
             return transactions, total_count
         except Exception as e:
             print(f"Error in get_transactions_with_filters_paginated: {e}")
             return [], 0
 
-    def _format_transactions(self, transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def get_transactions_with_filters_cursor(self, user_id: str, filters: Dict[str, Any] = None, cursor: Optional[str] = None, per_page: int = 20, extra_query: Optional[Dict[str, Any]] = None, with_count: bool = False, with_names: bool = False, projection: Any = None) -> Dict[str, Any]:
+        """Keyset-paginated variant of get_transactions_with_filters_paginated.
+
+        Pages are ordered by (timestamp, _id) descending and addressed by opaque
+        cursor tokens, so every page is an index range scan of per_page rows no
+        matter how deep it is. The exact count is only computed when with_count
+        is set (callers typically count once and carry it along).
+
+        Returns {"transactions", "next_cursor", "prev_cursor", "total_count"}.
+        """
+        result = {"transactions": [], "next_cursor": None, "prev_cursor": None, "total_count": None}
+        try:
+            query = self._build_filters_query(user_id, filters, extra_query)
+            total_count = self.collection.count_documents(query) if with_count else None
+
+            position = decode_cursor(cursor) if cursor else None
+            direction = position["d"] if position else "next"
+            if position:
+                op = "$lt" if direction == "next" else "$gt"
+                query = {"$and": [query, {"$or": [
+                    {"timestamp": {op: position["t"]}},
+                    {"timestamp": position["t"], "_id": {op: ObjectId(position["i"])}},
+                ]}]}
+
+            order = -1 if direction == "next" else 1
+            rows = self.find_many(
+                query,
+                limit=per_page + 1,
+                sort=[("timestamp", order), ("_id", order)],
+                projection=resolve_projection(projection),
+            )
+            has_more = len(rows) > per_page
+            rows = rows[:per_page]
+            if direction == "prev":
+                rows.reverse()
+
+            if rows:
+                if direction == "prev":
+                    result["next_cursor"] = encode_cursor(rows[-1], "next")
+                    if has_more:
+                        result["prev_cursor"] = encode_cursor(rows[0], "prev")
+                else:
+                    if has_more:
+                        result["next_cursor"] = encode_cursor(rows[-1], "next")
+                    if position:
+                        result["prev_cursor"] = encode_cursor(rows[0], "prev")
+
+            result["transactions"] = self._format_transactions(rows, with_names=with_names)
+            result["total_count"] = total_count
+            return result
+        except Exception as e:
+            print(f"Error in get_transactions_with_filters_cursor: {e}")
+            return result
+
+    def _build_filters_query(self, user_id: str, filters: Optional[Dict[str, Any]] = None, extra_query: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Mongo query for the transaction list filters (shared by the paginated readers)."""
+        query: Dict[str, Any] = {"user_id": user_id}
+        if filters:
+            if filters.get("scope_id"):
+                query["scope_id"] = filters["scope_id"]
+            if filters.get("category_id"):
+                query["category_id"] = filters["category_id"]
+            if filters.get("wallet_id"):
+                query["wallet_id"] = filters["wallet_id"]
+            if filters.get("type"):
+                query["type"] = filters["type"]
+            if filters.get("tags") and isinstance(filters["tags"], list):
+                query["tags"] = {"$in": filters["tags"]}
+            if filters.get("date_from") or filters.get("date_to"):
+                date_query = {}
+                if filters.get("date_from"):
+                    date_query["$gte"] = int(filters["date_from"])
+                if filters.get("date_to"):
+                    date_query["$lte"] = int(filters["date_to"])
+                if date_query:
+                    query["timestamp"] = date_query
+            if filters.get("amount_min") or filters.get("amount_max"):
+                amount_query = {}
+                if filters.get("amount_min"):
+                    amount_query["$gte"] = float(filters["amount_min"])
+                if filters.get("amount_max"):
+                    amount_query["$lte"] = float(filters["amount_max"])
+                if amount_query:
+                    query["amount"] = amount_query
+
+            if filters.get("search"):
+                # Word-prefix search over note and tags ({user_id, _search_terms} index)
+                condition = _search_condition(filters["search"])
+                if condition:
+                    query["$or"] = condition["$or"]
+
+        # AND extra raw conditions (viewer type filter) without key clashes
+        if extra_query:
+            query = {"$and": [query, extra_query]}
+        return query
+
+    def get_special_tag_totals(self, user_id: str, special_tags: List[str], filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Count/amount of transactions carrying ANY of special_tags (each counted once) plus a per-tag breakdown.
+
+        One $facet over the filtered rows that have one of the tags; the
+        breakdown $unwinds only the special tags of each row.
+        Returns {"count", "amount", "breakdown": [{"tag", "count", "amount"}]} (largest amount first).
+        """
+        result: Dict[str, Any] = {"count": 0, "amount": 0.0, "breakdown": []}
+        specials = [str(tag) for tag in special_tags if tag]
+        if not specials:
+            return result
+        try:
+            query = self._build_filters_query(user_id, filters)
+            query = {"$and": [query, {"tags": {"$in": specials}}]}
+            amount = {"$convert": {"input": "$amount", "to": "double", "onError": 0.0, "onNull": 0.0}}
+            rows = list(self.collection.aggregate([
+                {"$match": query},
+                {"$project": {
+                    "_id": 0,
+                    "amount": amount,
+                    # Legacy rows may store tags as a plain string
+                    "tags": {"$setIntersection": [{"$cond": [{"$isArray": "$tags"}, "$tags", []]}, specials]},
+                }},
+                {"$facet": {
+                    "total": [{"$group": {"_id": None, "count": {"$sum": 1}, "amount": {"$sum": "$amount"}}}],
+                    "breakdown": [
+                        {"$unwind": "$tags"},
+                        {"$group": {"_id": "$tags", "count": {"$sum": 1}, "amount": {"$sum": "$amount"}}},
+                        {"$sort": {"amount": -1}},
+                    ],
+                }},
+            ]))
+            facet = rows[0] if rows else {}
+            total = (facet.get("total") or [{}])[0]
+            result["count"] = int(total.get("count", 0))
+            result["amount"] = float(total.get("amount", 0.0))
+            result["breakdown"] = [
+                {"tag": row["_id"], "count": int(row["count"]), "amount": float(row["amount"])}
+                for row in facet.get("breakdown") or []
+            ]
+        except Exception as e:
+            print(f"❌ [TRANSACTIONS] Error in get_special_tag_totals: {e}")
+        return result
+
+    def search_transactions(self, user_id: str, text: str, filters: Optional[Dict[str, Any]] = None, limit: int = 50, with_names: bool = False) -> List[Dict[str, Any]]:
+        """Transactions whose note/tags contain every word of text as a word prefix, most relevant first.
+
+        Relevance = how many search words match a whole word (not just a
+        prefix), then newest first. Other list filters still apply.
+        """
+        try:
+            words = search_words(text)
+            if not words:
+                return []
+            query = self._build_filters_query(user_id, dict(filters or {}, search=text))
+            exact = [word + SEARCH_EXACT_MARK for word in words]
+            rows = list(self.collection.aggregate([
+                {"$match": query},
+                {"$addFields": {"_score": {"$size": {"$setIntersection": [{"$ifNull": ["$_search_terms", []]}, exact]}}}},
+                {"$sort": {"_score": -1, "timestamp": -1, "_id": -1}},
+                {"$limit": int(limit)},
+                {"$project": dict(TRANSACTION_PROJECTIONS["list-row"], _score=1)},
+            ]))
+            for row in rows:
+                row["_id"] = str(row["_id"])
+                row["relevance"] = row.pop("_score", 0)
+            return self._format_transactions(rows, with_names=with_names)
+        except Exception as e:
+            print(f"❌ [TRANSACTIONS] Error in search_transactions: {e}")
+            return []
+
+    def rebuild_search_terms(self, user_id: Optional[str] = None, only_missing: bool = True, batch_size: int = 1000) -> int:
+        """Backfill _search_terms (flask rebuild-search-terms). Returns rows written."""
+        query: Dict[str, Any] = {}
+        if user_id:
+            query["user_id"] = user_id
+        if only_missing:
+            query["_search_terms"] = {"$exists": False}
+        written = 0
+        ops: List[UpdateOne] = []
+        for doc in self.collection.find(query, projection={"note": 1, "tags": 1}):
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"_search_terms": search_terms(doc.get("note"), doc.get("tags"))}}))
+            if len(ops) >= batch_size:
+                written += self.collection.bulk_write(ops, ordered=False).modified_count
+                ops = []
+        if ops:
+            written += self.collection.bulk_write(ops, ordered=False).modified_count
+        return written
+
+    def _format_transactions(self, transactions: List[Dict[str, Any]], with_names: bool = False) -> List[Dict[str, Any]]:
         """Format transactions for display"""
         if not transactions:
             return []
@@ -960,14 +1696,60 @@ class TransactionRepository(MongoRepository):
                 except (ValueError, TypeError):
                     tx["formatted_time"] = "Invalid Time"
 
+        if with_names:
+            self.attach_names(transactions)
+
         return transactions
 
+    def attach_names(self, transactions: List[Dict[str, Any]], fields: Tuple[str, ...] = ("category", "scope", "wallet")) -> List[Dict[str, Any]]:
+        """Set category_name/scope_name/wallet_name on a batch of transactions.
+
+        Collects the distinct ids in the batch and resolves each collection with a
+        single $in query (default categories come from the bundled JSON), instead
+        of one find_by_id round-trip per row.
+        """
+        if not transactions:
+            return transactions
+
+        for field, collection_name, empty_label in _NAME_SOURCES:
+            if field not in fields:
+                continue
+            id_field = f"{field}_id"
+            name_field = f"{field}_name"
+
+            ids = {str(tx[id_field]) for tx in transactions if tx.get(id_field)}
+            names = self._resolve_names(collection_name, ids) if ids else {}
+
+            for tx in transactions:
+                ref = tx.get(id_field)
+                tx[name_field] = names.get(str(ref), "Unknown") if ref else empty_label
+
+        return transactions
+
+    def _resolve_names(self, collection_name: str, ids: set) -> Dict[str, str]:
+        """Map id -> name for the given ids with one $in query."""
+        names: Dict[str, str] = {}
+        try:
+            if collection_name == "categories":
+                from mm.repositories.categories import CategoryRepository
+                for cat in CategoryRepository().get_default_categories():
+                    if cat["_id"] in ids:
+                        names[cat["_id"]] = cat.get("name", "Unknown")
+
+            object_ids = [ObjectId(i) for i in ids if i not in names and ObjectId.is_valid(i)]
+            if object_ids:
+                coll = self.collection.database[collection_name]
+                for doc in coll.find({"_id": {"$in": object_ids}}, {"name": 1}):
+                    names[str(doc["_id"])] = doc.get("name", "Unknown")
+        except Exception as e:
+            print(f"❌ [TX] Error resolving {collection_name} names: {e}")
+        return names
+
     def distinct_tags(self, user_id: str) -> List[str]:
-        """Return the sorted distinct set of tags used across a user's transactions."""
+        """Return the sorted distinct set of tags used across a user's transactions (from tag_stats)."""
         try:
-            tags = self.collection.distinct("tags", {"user_id": user_id})
-            tags = [t for t in tags if t and isinstance(t, str)]
-            return sorted(set(tags))
+            from mm.repositories.tag_stats import TagStatsRepository
+            return TagStatsRepository().list_tags(user_id)
         except Exception as e:
             print(f"Error in distinct_tags: {e}")
             return []
@@ -0,0 +1,273 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from datetime import datetime
+import time
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from config import get_collection
+from mm.repositories.base import MongoRepository
+
+
+# Rollup rows are keyed by these fields (month is the server-local "YYYY-MM")
+ROLLUP_KEY_FIELDS = ("user_id", "month", "wallet_id", "scope_id", "category_id", "type")
+
+# Idempotency keys remembered per rollup row (worker replays after a lease expiry)
+ROLLUP_OPS_KEPT = 200
+
+_indexes_ready = False
+_bootstrapped_users = set()
+
+
+def month_key(timestamp: Any) -> str:
+    """Server-local month bucket ("YYYY-MM") of a unix timestamp."""
+    try:
+        return datetime.fromtimestamp(int(timestamp)).strftime("%Y-%m")
+    except (ValueError, TypeError, OSError):
+        return "0000-00"
+
+
+def months_between(start: datetime, end: datetime) -> List[str]:
+    """Month keys covering [start, end) when both are month starts."""
+    months = []
+    year, month = start.year, start.month
+    while (year, month) < (end.year, end.month):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def rollup_delta(tx: Dict[str, Any], sign: int) -> Optional[Dict[str, Any]]:
+    """{"key", "count", "sum", "category_name"} adding (sign=1) or removing (-1) tx."""
+    if not tx.get("user_id"):
+        return None
+    try:
+        amount = float(tx.get("amount", 0) or 0)
+    except (ValueError, TypeError):
+        amount = 0.0
+    snap = tx.get("_snap") or {}
+    path = snap.get("category_path") or []
+    return {
+        "key": {
+            "user_id": tx["user_id"],
+            "month": month_key(tx.get("timestamp", 0)),
+            "wallet_id": str(tx.get("wallet_id") or ""),
+            "scope_id": str(tx.get("scope_id") or ""),
+            "category_id": str(tx.get("category_id") or ""),
+            "type": tx.get("type") or "expense",
+        },
+        "count": sign,
+        "sum": sign * amount,
+        "category_name": path[-1] if path else None,
+    }
+
+
+def _ident(key: Dict[str, Any]) -> tuple:
+    return tuple(key.get(field) for field in ROLLUP_KEY_FIELDS)
+
+
+def merge_deltas(deltas: Iterable[Optional[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Combine deltas hitting the same rollup row; drop ones that cancel out."""
+    merged: Dict[tuple, Dict[str, Any]] = {}
+    for delta in deltas:
+        if not delta:
+            continue
+        ident = _ident(delta["key"])
+        row = merged.get(ident)
+        if row is None:
+            merged[ident] = dict(delta)
+            continue
+        row["count"] += delta["count"]
+        row["sum"] += delta["sum"]
+        row["category_name"] = delta.get("category_name") or row.get("category_name")
+    return [row for row in merged.values() if row["count"] != 0 or abs(row["sum"]) > 1e-9]
+
+
+class TxRollupRepository(MongoRepository):
+    """Monthly (wallet, scope, category, type) count/sum rollups of transactions.
+
+    Kept up to date by "rollup" jobs of the wallet balance worker, which carry
+    the +/- deltas of inserts, edits and deletes. rebuild_user() recomputes a
+    user's rows from scratch; reads do that once for users whose history
+    predates this collection (flask rebuild-rollups for everyone).
+    """
+
+    def __init__(self):
+        super().__init__("tx_rollups")
+        self.transactions = get_collection("transactions")
+        self.state = get_collection("tx_rollup_state")
+        global _indexes_ready
+        if not _indexes_ready:
+            try:
+                self.collection.create_index(
+                    [(field, ASCENDING) for field in ROLLUP_KEY_FIELDS],
+                    name="idx_rollup_key",
+                    unique=True,
+                )
+                self.state.create_index([("user_id", ASCENDING)], name="idx_rollup_state_user", unique=True)
+                _indexes_ready = True
+            except Exception:
+                pass
+
+    # ---- reads ------------------------------------------------------------
+    def get_rows(self, user_id: str, months: Optional[Sequence[str]] = None,
+                 extra_query: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Rollup rows of a user (optionally only some months), without op bookkeeping."""
+        self.ensure_bootstrapped(user_id)
+        query: Dict[str, Any] = {"user_id": user_id, "count": {"$ne": 0}}
+        if months is not None:
+            query["month"] = {"$in": list(months)}
+        if extra_query:
+            query.update(extra_query)
+        return list(self.collection.find(query, projection={"_id": 0, "ops": 0}))
+
+    def get_period_rows(self, user_id: str, periods: Sequence[Sequence[str]]) -> List[List[Dict[str, Any]]]:
+        """Rollup rows of several month lists with one query, split per period (in order)."""
+        all_months = sorted({month for months in periods for month in months})
+        by_month: Dict[str, List[Dict[str, Any]]] = {}
+        for row in self.get_rows(user_id, all_months):
+            by_month.setdefault(row["month"], []).append(row)
+        return [[row for month in months for row in by_month.get(month, [])] for months in periods]
+
+    def sum_by(self, user_id: str, group_fields: Sequence[str], months: Optional[Sequence[str]] = None,
+               extra_query: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """[{"_id": {field: value}, "amount", "count"}] summed over rollup rows."""
+        self.ensure_bootstrapped(user_id)
+        match: Dict[str, Any] = {"user_id": user_id}
+        if months is not None:
+            match["month"] = {"$in": list(months)}
+        if extra_query:
+            match.update(extra_query)
+        return list(self.collection.aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": {field: f"${field}" for field in group_fields},
+                "amount": {"$sum": "$sum"},
+                "count": {"$sum": "$count"},
+            }},
+            {"$match": {"count": {"$ne": 0}}},
+            {"$sort": {"amount": -1}},
+        ]))
+
+    @staticmethod
+    def as_transaction_rows(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Rollup rows shaped like pre-grouped transactions (for app analytics helpers)."""
+        return [
+            {
+                "type": row.get("type"),
+                "category_id": row.get("category_id"),
+                "wallet_id": row.get("wallet_id"),
+                "scope_id": row.get("scope_id"),
+                "amount": float(row.get("sum", 0)),
+                "count": int(row.get("count", 0)),
+                "_snap": {"category_path": [row["category_name"]] if row.get("category_name") else []},
+            }
+            for row in rows
+        ]
+
+    # ---- maintenance --------------------------------------------------------
+    def apply_deltas(self, deltas: Sequence[Dict[str, Any]], op_prefix: str) -> int:
+        """$inc each delta once; op ids "{op_prefix}:{i}" make worker replays no-ops."""
+        applied = 0
+        now = int(time.time())
+        for index, delta in enumerate(deltas):
+            op_id = f"{op_prefix}:{index}"
+            update: Dict[str, Any] = {
+                "$inc": {"count": delta["count"], "sum": delta["sum"]},
+                "$set": {"updated_at": now},
+                "$push": {"ops": {"$each": [op_id], "$slice": -ROLLUP_OPS_KEPT}},
+            }
+            if delta.get("category_name"):
+                update["$set"]["category_name"] = delta["category_name"]
+            try:
+                # A row that already has op_id doesn't match; the upsert then hits the unique key
+                self.collection.update_one(dict(delta["key"], ops={"$ne": op_id}), update, upsert=True)
+                applied += 1
+            except DuplicateKeyError:
+                pass
+        return applied
+
+    def rebuild_user(self, user_id: str) -> int:
+        """Recompute every rollup row of a user from their transactions.
+
+        Rows are overwritten in place ($set of count/sum), so their applied op
+        ids survive and a rollup job replayed afterwards stays a no-op. Jobs
+        still queued when the rebuild starts are already reflected in the
+        transactions it reads, so their op ids are recorded as applied too.
+        Rows whose key no longer occurs are zeroed (reads skip count 0).
+        """
+        queued = self._queued_op_ids(user_id)
+        deltas = merge_deltas(
+            rollup_delta(tx, 1)
+            for tx in self.transactions.find(
+                {"user_id": user_id},
+                projection={
+                    "user_id": 1, "timestamp": 1, "amount": 1, "type": 1, "wallet_id": 1,
+                    "scope_id": 1, "category_id": 1, "_snap.category_path": 1,
+                },
+            )
+        )
+        rebuilt = {_ident(delta["key"]): delta for delta in deltas}
+        existing = {
+            _ident(row): {field: row[field] for field in ROLLUP_KEY_FIELDS}
+            for row in self.collection.find({"user_id": user_id}, projection={field: 1 for field in ROLLUP_KEY_FIELDS})
+            if all(field in row for field in ROLLUP_KEY_FIELDS)
+        }
+
+        now = int(time.time())
+        ops = []
+        for ident in set(rebuilt) | set(existing) | set(queued):
+            delta = rebuilt.get(ident)
+            if delta:
+                key = delta["key"]
+                fields = {"count": delta["count"], "sum": delta["sum"], "updated_at": now}
+                if delta.get("category_name"):
+                    fields["category_name"] = delta["category_name"]
+            else:
+                key = existing.get(ident) or queued[ident]["key"]
+                fields = {"count": 0, "sum": 0.0, "updated_at": now}
+            update: Dict[str, Any] = {"$set": fields}
+            if ident in queued:
+                update["$addToSet"] = {"ops": {"$each": queued[ident]["ops"]}}
+            ops.append(UpdateOne(dict(key), update, upsert=True))
+        if ops:
+            self.collection.bulk_write(ops, ordered=False)
+        self.state.update_one(
+            {"user_id": user_id},
+            {"$set": {"bootstrapped": True, "rebuilt_at": now}},
+            upsert=True,
+        )
+        _bootstrapped_users.add(user_id)
+        return len(rebuilt)
+
+    def _queued_op_ids(self, user_id: str) -> Dict[tuple, Dict[str, Any]]:
+        """{row ident: {"key", "ops"}} of the user's rollup jobs not yet acked (see apply_deltas)."""
+        from mm.services.wallet_balance_worker import JOB_COLLECTION
+
+        queued: Dict[tuple, Dict[str, Any]] = {}
+        for job in get_collection(JOB_COLLECTION).find(
+            {"partition": f"{user_id}:rollups", "type": "rollup"},
+            projection={"deltas": 1},
+        ):
+            for index, delta in enumerate(job.get("deltas") or []):
+                entry = queued.setdefault(_ident(delta["key"]), {"key": delta["key"], "ops": []})
+                entry["ops"].append(f"{job['_id']}:{index}")
+        return queued
+
+    def ensure_bootstrapped(self, user_id: str) -> None:
+        """Build rollups for users whose history predates this collection (once)."""
+        if not user_id or user_id in _bootstrapped_users:
+            return
+        state = self.state.find_one({"user_id": user_id}, projection={"bootstrapped": 1})
+        if state and state.get("bootstrapped"):
+            _bootstrapped_users.add(user_id)
+            return
+        self.rebuild_user(user_id)
+
+    def rebuild_all(self) -> Dict[str, int]:
+        """rebuild_user for every user that has transactions."""
+        return {
+            user_id: self.rebuild_user(user_id)
+            for user_id in self.transactions.distinct("user_id")
+            if user_id
+        }
@@ -1,25 +1,50 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Union
 from bson import ObjectId
 from pymongo import ReturnDocument
-from mm.repositories.base import MongoRepository
+from mm.repositories.base import MongoRepository, Projection
+from mm.services import master_cache
 import time
 
 
+# How many idempotency keys of balance adjustments are remembered per wallet
+APPLIED_OPS_KEPT = 200
+
+
+def _without_applied_ops(projection: Projection) -> Projection:
+    """Read projection that leaves out the applied_ops bookkeeping array."""
+    if projection is None:
+        return {"applied_ops": 0}
+    if isinstance(projection, dict) and not any(v for k, v in projection.items() if k != "_id"):
+        # Exclusion spec: add ours (inclusion specs never return applied_ops)
+        return dict(projection, applied_ops=0)
+    return projection
+
+
 class WalletRepository(MongoRepository):
     def __init__(self):
         super().__init__("wallets")
 
     def list_by_user(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get semua saving space untuk user tertentu"""
+        """Get semua saving space untuk user tertentu (cached, see master_cache)"""
         try:
-            return self.find_many({"user_id": user_id}, limit=100)
+            return master_cache.cached_list(
+                "wallets", user_id, lambda: self.find_many({"user_id": user_id}, limit=100)
+            )
         except Exception:
             return []
 
-    def find_one(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    def find_many(self, query: Dict[str, Any], limit: int = 100, sort: Optional[List] = None, skip: int = 0, projection: Projection = None) -> List[Dict[str, Any]]:
+        """find_many without the internal applied_ops array"""
+        return super().find_many(query, limit=limit, sort=sort, skip=skip, projection=_without_applied_ops(projection))
+
+    def find_by_id(self, id_str: str, projection: Projection = None) -> Optional[Dict[str, Any]]:
+        """find_by_id without the internal applied_ops array"""
+        return super().find_by_id(id_str, projection=_without_applied_ops(projection))
+
+    def find_one(self, query: Dict[str, Any], projection: Projection = None) -> Optional[Dict[str, Any]]:
         """Find satu dokumen"""
         try:
-            result = super().find_one(query)
+            result = super().find_one(query, _without_applied_ops(projection))
             return result
         except Exception as e:
             print(f"❌ [WALLET] Error in wallet find_one: {e}")
@@ -27,13 +52,19 @@ class WalletRepository(MongoRepository):
             print(f"❌ [WALLET] Error traceback: {traceback.format_exc()}")
             return None
 
+    def insert_one(self, data: Dict[str, Any]) -> str:
+        """Insert saving space baru (invalidates the user's cached list)"""
+        inserted_id = super().insert_one(data)
+        master_cache.invalidate("wallets", data.get("user_id"))
+        return inserted_id
+
     def update_wallet(self, wallet_id: str, user_id: str, updates: Dict[str, Any]) -> bool:
         """Update saving space dengan validasi user ownership"""
         try:
             # Convert string ID ke ObjectId
             obj_id = ObjectId(wallet_id) 
             # Pastikan saving space milik user yang bersangkutan
-            existing_wallet = self.collection.find_one({"_id": obj_id, "user_id": user_id})
+            existing_wallet = self.collection.find_one({"_id": obj_id, "user_id": user_id}, projection={"_id": 1})
 
             if not existing_wallet:
                 print(f"❌ [WALLET] Wallet not found or not owned by user")
@@ -42,6 +73,7 @@ class WalletRepository(MongoRepository):
             # Update dengan ObjectId
             result = self.collection.update_one({"_id": obj_id}, {"$set": updates})
             success = result.modified_count > 0
+            master_cache.invalidate("wallets", user_id)
 
             return success
         except Exception as e:
@@ -57,12 +89,13 @@ class WalletRepository(MongoRepository):
             obj_id = ObjectId(wallet_id)
             
             # Pastikan saving space milik user yang bersangkutan
-            existing_wallet = self.collection.find_one({"_id": obj_id, "user_id": user_id})
+            existing_wallet = self.collection.find_one({"_id": obj_id, "user_id": user_id}, projection={"_id": 1})
             if not existing_wallet:
                 return False
             
             # Delete dengan ObjectId
             result = self.collection.delete_one({"_id": obj_id})
+            master_cache.invalidate("wallets", user_id)
             return result.deleted_count > 0
         except Exception:
             return False
@@ -74,25 +107,51 @@ class WalletRepository(MongoRepository):
             return None
         return float(wallet.get("actual_balance", 0))
 
-    def adjust_wallet_balance(self, wallet_id: str, user_id: str, delta: float) -> Optional[float]:
-        """Atomically adjust actual_balance by delta. Returns new balance."""
+    def adjust_wallet_balance(self, wallet_id: str, user_id: str, delta: float, op_id: Union[str, List[str], None] = None) -> Optional[float]:
+        """Atomically adjust actual_balance by delta. Returns new balance.
+
+        op_id makes the adjustment idempotent: it is recorded on the wallet in the
+        same update (last APPLIED_OPS_KEPT ids), and replaying an op that was
+        already applied changes nothing and returns None (see has_applied_op).
+        A list of op ids applies a merged delta only if none of them landed yet.
+        """
         try:
             obj_id = ObjectId(wallet_id)
         except Exception:
             return None
 
+        query: Dict[str, Any] = {"_id": obj_id, "user_id": user_id}
+        update: Dict[str, Any] = {
+            "$inc": {"actual_balance": delta},
+            "$set": {"updated_at": int(time.time())},
+        }
+        op_ids = [op_id] if isinstance(op_id, str) else list(op_id or [])
+        if op_ids:
+            query["applied_ops"] = {"$nin": op_ids}
+            update["$push"] = {"applied_ops": {"$each": op_ids, "$slice": -APPLIED_OPS_KEPT}}
+
         doc = self.collection.find_one_and_update(
-            {"_id": obj_id, "user_id": user_id},
-            {
-                "$inc": {"actual_balance": delta},
-                "$set": {"updated_at": int(time.time())},
-            },
+            query,
+            update,
+            projection={"actual_balance": 1},
             return_document=ReturnDocument.AFTER,
         )
         if not doc:
             return None
+        # Listed wallets carry actual_balance
+        master_cache.invalidate("wallets", user_id)
         return float(doc.get("actual_balance", 0))
 
+    def has_applied_op(self, wallet_id: str, user_id: str, op_id: str) -> bool:
+        """True if an idempotent adjust_wallet_balance with op_id already landed."""
+        try:
+            obj_id = ObjectId(wallet_id)
+        except Exception:
+            return False
+        return self.collection.count_documents(
+            {"_id": obj_id, "user_id": user_id, "applied_ops": op_id}, limit=1
+        ) > 0
+
     def set_wallet_balance(self, wallet_id: str, user_id: str, actual_balance: float) -> bool:
         """Set absolute wallet balance (used for balance adjustments)."""
         return self.update_wallet_balance(wallet_id, user_id, actual_balance)
@@ -104,7 +163,7 @@ class WalletRepository(MongoRepository):
             obj_id = ObjectId(wallet_id)
             
             # Pastikan wallet milik user yang bersangkutan
-            existing_wallet = self.collection.find_one({"_id": obj_id, "user_id": user_id})
+            existing_wallet = self.collection.find_one({"_id": obj_id, "user_id": user_id}, projection={"_id": 1})
             if not existing_wallet:
                 print(f"❌ [WALLET] Wallet not found or not owned by user")
                 return False
@@ -121,6 +180,7 @@ class WalletRepository(MongoRepository):
             
             # Update wallet
             result = self.collection.update_one({"_id": obj_id}, {"$set": updates})
+            master_cache.invalidate("wallets", user_id)
             
             if result.modified_count > 0:
                 return True
@@ -139,7 +199,7 @@ class WalletRepository(MongoRepository):
             # Convert string ID ke ObjectId
             obj_id = ObjectId(wallet_id)
             
-            wallet = self.collection.find_one({"_id": obj_id, "user_id": user_id})
+            wallet = self.collection.find_one({"_id": obj_id, "user_id": user_id}, projection=_without_applied_ops(None))
             if wallet:
                 # Convert ObjectId ke string
                 wallet["_id"] = str(wallet["_id"])
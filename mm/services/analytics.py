@@ -0,0 +1,400 @@
+"""Vectorized period analytics over columnar transaction batches.
+
+Endpoints build a TransactionBatch once (from TransactionRepository.scan_columns
+or a list of transaction dicts) and every total, category breakdown and chart
+series is then a bincount/searchsorted over its arrays instead of a Python loop
+with datetime.fromtimestamp/float per row. NumPy is optional like in mm.ocr:
+without it the same functions fall back to plain loops with identical output.
+"""
+from __future__ import annotations
+
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on deployment
+    np = None
+
+
+SYSTEM_CATEGORIES = ("transfer", "balance_adjustment")
+
+TYPE_CODES = {"income": 0, "expense": 1, "transfer": 2}
+OTHER_TYPE = 3
+_TYPE_NAMES = ("income", "expense", "transfer")
+
+# (category_id, snapshot category name) -> grouping key, or None to drop the row
+CategoryKey = Callable[[str, Optional[str]], Optional[str]]
+
+
+class TransactionBatch:
+    """Parallel arrays of the rows that survived build_batch's filters.
+
+    category_code indexes into categories: [(key, display name), ...].
+    count is the number of transactions a row stands for (1 for raw rows,
+    >1 for pre-grouped rows such as aggregation buckets).
+    """
+
+    __slots__ = ("timestamp", "amount", "count", "type_code", "category_code", "categories")
+
+    def __init__(self):
+        self.timestamp = array("d")
+        self.amount = array("d")
+        self.count = array("l")
+        self.type_code = array("b")
+        self.category_code = array("l")
+        self.categories: List[Tuple[str, str]] = []
+
+    def __len__(self) -> int:
+        return len(self.amount)
+
+    @property
+    def transaction_count(self) -> int:
+        return int(sum(self.count))
+
+
+def build_batch(source: Any, exclude_category_ids: Sequence[str] = SYSTEM_CATEGORIES,
+                exclude_types: Sequence[str] = (), category_key: Optional[CategoryKey] = None) -> TransactionBatch:
+    """Encode transactions into a TransactionBatch.
+
+    source is a TransactionColumns scan or an iterable of transaction dicts.
+    Rows whose category_id is in exclude_category_ids, whose type is in
+    exclude_types, or for which category_key returns None are skipped.
+    """
+    columnar = hasattr(source, "category_name") and hasattr(source, "timestamp")
+    if columnar and np is not None:
+        return _build_batch_columns(source, exclude_category_ids, exclude_types, category_key)
+    if columnar:
+        rows: Iterable[Tuple[Any, ...]] = zip(
+            source.timestamp, source.amount, source.type, source.category_id,
+            source.category_name, [1] * len(source),
+        )
+    else:
+        rows = (_dict_row(tx) for tx in source)
+
+    excluded_categories = set(exclude_category_ids or ())
+    excluded_types = set(exclude_types or ())
+    batch = TransactionBatch()
+    codes: Dict[str, int] = {}
+
+    for timestamp, amount, tx_type, category_id, snap_name, count in rows:
+        if category_id in excluded_categories or tx_type in excluded_types:
+            continue
+        if category_key is not None:
+            key = category_key(category_id, snap_name)
+            if key is None:
+                continue
+            name = key
+        else:
+            key, name = _default_category(category_id, snap_name)
+        code = codes.get(key)
+        if code is None:
+            code = codes[key] = len(batch.categories)
+            batch.categories.append((key, name))
+
+        batch.timestamp.append(timestamp)
+        batch.amount.append(amount)
+        batch.count.append(count)
+        batch.type_code.append(TYPE_CODES.get(tx_type, OTHER_TYPE))
+        batch.category_code.append(code)
+    return batch
+
+
+def _default_category(category_id: str, snap_name: Optional[str]) -> Tuple[str, str]:
+    key = category_id or "uncategorized"
+    return key, snap_name or (category_id.replace("_", " ").title() if category_id else "Uncategorized")
+
+
+def _build_batch_columns(source: Any, exclude_category_ids: Sequence[str], exclude_types: Sequence[str],
+                         category_key: Optional[CategoryKey]) -> TransactionBatch:
+    """build_batch for a TransactionColumns scan with NumPy: masks and category codes
+    come from np.isin/np.unique over the columns; Python only runs once per distinct
+    (category_id, snapshot name) pair. Output is identical to the row loop."""
+    batch = TransactionBatch()
+    if not len(source):
+        return batch
+    types = np.asarray(source.type, dtype=object)
+    category_ids = np.asarray(source.category_id, dtype=object)
+    snap_names = np.asarray(source.category_name, dtype=object)
+
+    keep = np.ones(len(types), dtype=bool)
+    if exclude_category_ids:
+        keep &= ~np.isin(category_ids, list(exclude_category_ids))
+    if exclude_types:
+        keep &= ~np.isin(types, list(exclude_types))
+    rows = np.flatnonzero(keep)
+    if not len(rows):
+        return batch
+    types, category_ids, snap_names = types[rows], category_ids[rows], snap_names[rows]
+
+    # Distinct (category_id, snapshot name) pairs, in order of first appearance
+    id_values, id_codes = np.unique(category_ids, return_inverse=True)
+    has_name = np.not_equal(snap_names, None)
+    name_values, name_codes = np.unique(np.where(has_name, snap_names, ""), return_inverse=True)
+    pair_codes = (id_codes.astype(np.int64) * (len(name_values) + 1)
+                  + np.where(has_name, name_codes + 1, 0))
+    _, first_rows, pair_index = np.unique(pair_codes, return_index=True, return_inverse=True)
+
+    codes: Dict[str, int] = {}
+    pair_to_code = np.full(len(first_rows), -1, dtype=np.int64)
+    for pair in np.argsort(first_rows, kind="stable"):
+        row = first_rows[pair]
+        category_id, snap_name = category_ids[row], snap_names[row]
+        if category_key is not None:
+            key = category_key(category_id, snap_name)
+            if key is None:
+                continue
+            name = key
+        else:
+            key, name = _default_category(category_id, snap_name)
+        code = codes.get(key)
+        if code is None:
+            code = codes[key] = len(batch.categories)
+            batch.categories.append((key, name))
+        pair_to_code[pair] = code
+
+    category_code = pair_to_code[pair_index.reshape(-1)]
+    kept = category_code >= 0
+    rows, types, category_code = rows[kept], types[kept], category_code[kept]
+
+    type_code = np.full(len(rows), OTHER_TYPE, dtype=np.int8)
+    for name, code in TYPE_CODES.items():
+        type_code[types == name] = code
+
+    batch.timestamp.frombytes(_np(source.timestamp, np.float64)[rows].tobytes())
+    batch.amount.frombytes(_np(source.amount, np.float64)[rows].tobytes())
+    batch.count.frombytes(np.ones(len(rows), dtype=np.dtype(batch.count.typecode)).tobytes())
+    batch.type_code.frombytes(type_code.tobytes())
+    batch.category_code.frombytes(category_code.astype(np.dtype(batch.category_code.typecode)).tobytes())
+    return batch
+
+
+def type_totals(batch: TransactionBatch) -> Dict[str, float]:
+    """{"income", "expense", "transfer"} amount sums plus the transaction "count"."""
+    if np is not None and len(batch):
+        sums = np.bincount(_np(batch.type_code, np.int8), weights=_np(batch.amount, np.float64), minlength=OTHER_TYPE + 1)
+        totals = {name: float(sums[code]) for name, code in TYPE_CODES.items()}
+    else:
+        totals = {name: 0.0 for name in TYPE_CODES}
+        for code, amount in zip(batch.type_code, batch.amount):
+            if code < OTHER_TYPE:
+                totals[_TYPE_NAMES[code]] += amount
+    totals["count"] = batch.transaction_count
+    return totals
+
+
+def category_totals(batch: TransactionBatch, tx_type: str) -> List[Dict[str, Any]]:
+    """[{"key", "name", "amount", "count"}] of one transaction type, largest first."""
+    type_code = TYPE_CODES.get(tx_type, OTHER_TYPE)
+    size = len(batch.categories)
+    if not size:
+        return []
+
+    if np is not None:
+        mask = _np(batch.type_code, np.int8) == type_code
+        codes = _np(batch.category_code, np.int64)[mask]
+        amounts = np.bincount(codes, weights=_np(batch.amount, np.float64)[mask], minlength=size)
+        counts = np.bincount(codes, weights=_np(batch.count, np.int64)[mask], minlength=size)
+        present = np.bincount(codes, minlength=size) > 0
+        amounts, counts, present = amounts.tolist(), counts.tolist(), present.tolist()
+    else:
+        amounts, counts, present = [0.0] * size, [0] * size, [False] * size
+        for code, category, amount, count in zip(batch.type_code, batch.category_code, batch.amount, batch.count):
+            if code == type_code:
+                amounts[category] += amount
+                counts[category] += count
+                present[category] = True
+
+    items = [
+        {"key": key, "name": name, "amount": float(amounts[i]), "count": int(counts[i])}
+        for i, (key, name) in enumerate(batch.categories)
+        if present[i]
+    ]
+    items.sort(key=lambda item: item["amount"], reverse=True)
+    return items
+
+
+def category_breakdown(batch: TransactionBatch) -> Dict[str, Any]:
+    """Same shape as app.generate_category_breakdown (ranked expenses/income with percentages)."""
+    expense_list = [{k: v for k, v in item.items() if k != "key"} for item in category_totals(batch, "expense")]
+    income_list = [{k: v for k, v in item.items() if k != "key"} for item in category_totals(batch, "income")]
+
+    for items in (expense_list, income_list):
+        total = sum(item["amount"] for item in items)
+        for item in items:
+            item["percentage"] = round((item["amount"] / total * 100) if total > 0 else 0, 1)
+
+    return {
+        "expenses": expense_list,
+        "income": income_list,
+        "largest_expense": expense_list[0] if expense_list else None,
+        "smallest_expense": expense_list[-1] if len(expense_list) > 1 else None,
+    }
+
+
+def bucket_totals(batch: TransactionBatch, bounds: Sequence[float]) -> Tuple[List[float], List[float]]:
+    """Income and expense sums per [bounds[i], bounds[i+1]) bucket."""
+    buckets = max(len(bounds) - 1, 0)
+    if not buckets:
+        return [], []
+
+    if np is not None and len(batch):
+        ts = _np(batch.timestamp, np.float64)
+        amounts = _np(batch.amount, np.float64)
+        types = _np(batch.type_code, np.int8)
+        index = np.searchsorted(np.asarray(bounds, dtype=np.float64), ts, side="right") - 1
+        inside = (index >= 0) & (index < buckets)
+        series = []
+        for type_code in (TYPE_CODES["income"], TYPE_CODES["expense"]):
+            mask = inside & (types == type_code)
+            series.append(np.bincount(index[mask], weights=amounts[mask], minlength=buckets).tolist())
+        return series[0], series[1]
+
+    import bisect
+    income, expenses = [0.0] * buckets, [0.0] * buckets
+    for timestamp, amount, code in zip(batch.timestamp, batch.amount, batch.type_code):
+        i = bisect.bisect_right(bounds, timestamp) - 1
+        if 0 <= i < buckets:
+            if code == TYPE_CODES["income"]:
+                income[i] += amount
+            elif code == TYPE_CODES["expense"]:
+                expenses[i] += amount
+    return income, expenses
+
+
+def chart_series(batch: TransactionBatch, year: int, month: Optional[int] = None, day: Optional[int] = None) -> Dict[str, List[Any]]:
+    """Dashboard chart: hourly for a day, daily for a month, monthly for a year."""
+    if month and day:
+        start = datetime(year, month, day)
+        starts = [start + timedelta(hours=h) for h in range(25)]
+        labels = [f"{h:02d}:00" for h in range(24)]
+    elif month:
+        start = datetime(year, month, 1)
+        end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+        days = (end - start).days
+        starts = [start + timedelta(days=d) for d in range(days + 1)]
+        labels = [f"{d}" for d in range(1, days + 1)]
+    else:
+        starts = [datetime(year, m, 1) for m in range(1, 13)] + [datetime(year + 1, 1, 1)]
+        labels = [d.strftime("%b") for d in starts[:-1]]
+
+    # Local-time boundaries, so DST/offset changes land in the right bucket
+    income, expenses = bucket_totals(batch, [d.timestamp() for d in starts])
+    return {"labels": labels, "income": income, "expenses": expenses}
+
+
+def _dict_row(tx: Dict[str, Any]) -> Tuple[float, float, str, str, Optional[str], int]:
+    snap = tx.get("_snap") or {}
+    path = snap.get("category_path") or []
+    return (
+        _as_float(tx.get("timestamp")),
+        _as_float(tx.get("amount")),
+        tx.get("type") or "",
+        str(tx.get("category_id") or ""),
+        path[-1] if path else None,
+        int(tx.get("count", 1)),
+    )
+
+
+def _as_float(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _np(values: array, dtype: Any):
+    """Zero-copy NumPy view of an array.array column."""
+    if not len(values):
+        return np.zeros(0, dtype=dtype)
+    return np.frombuffer(values, dtype=np.dtype(values.typecode)).astype(dtype, copy=False)
+
+
+# ---- net worth series -------------------------------------------------------
+
+def net_worth_series(columns: Any, opening: Optional[Dict[str, float]] = None) -> Tuple[List[int], List[float]]:
+    """Running total of the latest balance_after across wallets, one point per transaction.
+
+    columns is a TransactionColumns scan (oldest first); rows without a
+    balance_after are skipped. opening seeds wallet balances from before the scan.
+    Returns (row indexes, totals); the total is maintained incrementally.
+    """
+    wallet_balances: Dict[str, float] = dict(opening or {})
+    running = sum(wallet_balances.values())
+    rows: List[int] = []
+    totals: List[float] = []
+    for i, (wallet_id, balance) in enumerate(zip(columns.wallet_id, columns.balance_after)):
+        if balance != balance:  # NaN: no balance_after yet
+            continue
+        running += balance - wallet_balances.get(wallet_id, 0.0)
+        wallet_balances[wallet_id] = balance
+        rows.append(i)
+        totals.append(running)
+    return rows, totals
+
+
+def resample_last(timestamps: Sequence[float], values: Sequence[float], resolution: str) -> Tuple[List[int], List[float]]:
+    """Keep the last value of every local day/week/month ("raw" keeps everything).
+
+    Returns (bucket start timestamps, values).
+    """
+    if resolution == "raw":
+        return [int(ts) for ts in timestamps], list(values)
+
+    out_ts: List[int] = []
+    out_values: List[float] = []
+    current = None
+    for ts, value in zip(timestamps, values):
+        bucket = _bucket_start(ts, resolution)
+        if bucket == current:
+            out_values[-1] = value
+        else:
+            current = bucket
+            out_ts.append(bucket)
+            out_values.append(value)
+    return out_ts, out_values
+
+
+def lttb_indices(xs: Sequence[float], ys: Sequence[float], threshold: int) -> List[int]:
+    """Largest-Triangle-Three-Buckets: indexes of at most threshold points preserving the shape."""
+    n = len(xs)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        # No room for a middle bucket: keep the endpoints that fit
+        return [0, n - 1][:max(threshold, 0)]
+
+    selected = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        # Average of the next bucket is the third triangle vertex
+        next_start = end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, n)
+        span = max(next_end - next_start, 1)
+        avg_x = sum(xs[next_start:next_end]) / span if next_end > next_start else xs[n - 1]
+        avg_y = sum(ys[next_start:next_end]) / span if next_end > next_start else ys[n - 1]
+
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for i in range(start, min(end, n - 1)):
+            area = abs((ax - avg_x) * (ys[i] - ay) - (ax - xs[i]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = i, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+def _bucket_start(timestamp: float, resolution: str) -> int:
+    moment = datetime.fromtimestamp(timestamp)
+    day = datetime(moment.year, moment.month, moment.day)
+    if resolution == "week":
+        day -= timedelta(days=day.weekday())
+    elif resolution == "month":
+        day = day.replace(day=1)
+    return int(day.timestamp())
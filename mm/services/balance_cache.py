@@ -0,0 +1,57 @@
+"""Per-user total balance cache.
+
+The sidebar total is rendered on every page; it only changes when the wallet
+balance worker writes balances, so the worker invalidates the user's entry
+after each job. Entries live in the master_cache backend (Redis when
+configured) under a per-user generation counter, so a job applied by any
+process's worker invalidates the total for every process.
+"""
+from __future__ import annotations
+
+from typing import Any, Callable, Optional
+
+from bson import json_util
+
+from mm.services.master_cache import get_backend
+
+
+TOTAL_BALANCE_TTL_SECONDS = 60
+KEY_PREFIX = "mm:total-balance"
+
+
+def _generation_key(user_id: str) -> str:
+    return f"{KEY_PREFIX}:{user_id}:gen"
+
+
+def get_total_balance(user_id: str, compute: Callable[[], Any]) -> Any:
+    """Return the cached total balance for user_id, computing it on a miss."""
+    if not user_id:
+        return compute()
+    backend = get_backend()
+    try:
+        generation = backend.get(_generation_key(user_id)) or 0
+        key = f"{KEY_PREFIX}:{user_id}:{generation}"
+        raw = backend.get(key)
+        if raw is not None:
+            return json_util.loads(raw)
+    except Exception as e:
+        print(f"⚠️ [BALANCE_CACHE] Read failed: {e}")
+        return compute()
+
+    value = compute()
+    try:
+        # Under the generation read before computing: a job that lands meanwhile moves readers on
+        backend.set(key, json_util.dumps(value), ex=TOTAL_BALANCE_TTL_SECONDS)
+    except Exception as e:
+        print(f"⚠️ [BALANCE_CACHE] Write failed: {e}")
+    return value
+
+
+def invalidate_total_balance(user_id: Optional[str]) -> None:
+    """Drop the cached total for user_id (called by the wallet balance worker)."""
+    if not user_id:
+        return
+    try:
+        get_backend().incr(_generation_key(user_id))
+    except Exception as e:
+        print(f"⚠️ [BALANCE_CACHE] Invalidate failed: {e}")
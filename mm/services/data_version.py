@@ -0,0 +1,66 @@
+"""Per-user data version for caches of derived views (e.g. public share pages).
+
+Any write to a user's transactions, wallets, scopes or categories, and every
+wallet balance worker job, bumps the version. A cache keyed on it can never
+serve a result computed from older data. Versions live in the master_cache
+backend (Redis when configured, shared by all workers). Each version is the
+nanosecond time of the bump, which doubles as Last-Modified. A version lost to
+eviction is re-minted as "now", never reused.
+
+Without Redis each process keeps its own versions and never sees another
+worker's bumps, so local versions expire after the share page TTL: a stale
+version (and the ETag built from it) outlives a write by at most that long.
+"""
+from __future__ import annotations
+
+import time
+from typing import Any, Optional
+
+from mm.services.master_cache import LocalLRUCache, get_backend
+from mm.services.share_cache import SHARE_PAGE_TTL_SECONDS
+
+
+KEY_PREFIX = "mm:dataver"
+
+
+def _key(user_id: str) -> str:
+    return f"{KEY_PREFIX}:{user_id}"
+
+
+def _set_version(backend: Any, user_id: str, version: str) -> None:
+    # Redis versions are shared and never go stale; local ones must expire
+    ttl = SHARE_PAGE_TTL_SECONDS if isinstance(backend, LocalLRUCache) else None
+    backend.set(_key(user_id), version, ex=ttl)
+
+
+def bump_data_version(user_id: Optional[str]) -> None:
+    """Mark user_id's data as changed."""
+    if not user_id:
+        return
+    try:
+        _set_version(get_backend(), user_id, str(time.time_ns()))
+    except Exception as e:
+        print(f"⚠️ [DATA_VERSION] Bump failed: {e}")
+
+
+def get_data_version(user_id: str) -> str:
+    """Current data version of user_id (minted on first use)."""
+    backend = get_backend()
+    try:
+        version = backend.get(_key(user_id))
+        if version is None:
+            version = str(time.time_ns())
+            _set_version(backend, user_id, version)
+        return str(version)
+    except Exception as e:
+        print(f"⚠️ [DATA_VERSION] Read failed: {e}")
+        # Uncacheable: a fresh value every time
+        return str(time.time_ns())
+
+
+def data_version_time(version: str) -> int:
+    """Unix seconds at which version was minted."""
+    try:
+        return int(version) // 1_000_000_000
+    except (ValueError, TypeError):
+        return int(time.time())
@@ -0,0 +1,251 @@
+"""Versioned index migrations.
+
+MIGRATIONS is an ordered list of versions; each creates (and optionally drops)
+indexes. The highest applied version is stored in the schema_migrations
+collection, so startup only pays for one find_one once everything is applied.
+Creating an index that already exists (same name/keys) is a no-op in MongoDB,
+so replaying a version after a crash is safe.
+
+    flask migrate-indexes [--to N]   apply pending versions
+    flask index-report               missing/unused indexes + hot query plans
+
+Indexes created inline by repositories (worker jobs, checkpoints, rollups,
+share links, ai chats) stay where they are; the report still lists them when
+$indexStats says they are never used.
+"""
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config import get_collection, get_db
+
+
+MIGRATIONS_COLLECTION = "schema_migrations"
+MIGRATIONS_DOC_ID = "indexes"
+
+# IndexOptionsConflict / IndexKeySpecsConflict: same keys or name already indexed differently
+_CONFLICT_CODES = (85, 86)
+# IndexNotFound
+_NOT_FOUND_CODE = 27
+
+
+def _baseline_specs() -> Dict[str, List[Tuple[Any, Dict[str, Any]]]]:
+    from model import index_specs
+    return index_specs
+
+
+# (version, description, {collection: [(keys, options), ...]}, {collection: [index names to drop]})
+MIGRATIONS: List[Tuple[int, str, Any, Dict[str, List[str]]]] = [
+    (1, "baseline single-field indexes from model.index_specs", _baseline_specs, {}),
+    (
+        2,
+        "compound transaction indexes for user/date, wallet scan, manual balance and scope queries",
+        {
+            "transactions": [
+                # Lists/ranges by date and keyset pagination (timestamp, _id) in both directions
+                ([("user_id", 1), ("timestamp", 1), ("_id", 1)], {"name": "idx_tx_user_time"}),
+                # Wallet scans/recalculation, oldest first
+                ([("user_id", 1), ("wallet_id", 1), ("timestamp", 1), ("sequence_number", 1)], {"name": "idx_tx_user_wallet_time"}),
+                # Transactions of a manual balance period + next sequence number
+                ([("user_id", 1), ("wallet_id", 1), ("fk_manual_balance_id", 1), ("sequence_number", 1)], {"name": "idx_tx_user_manual_balance"}),
+                ([("user_id", 1), ("scope_id", 1), ("timestamp", 1)], {"name": "idx_tx_user_scope_time"}),
+            ],
+        },
+        # Prefixes of the compound indexes above; every transaction query filters on user_id
+        {"transactions": ["idx_tx_user", "idx_tx_wallet", "idx_tx_scope", "idx_tx_manual_balance", "idx_tx_sequence"]},
+    ),
+    (
+        3,
+        "word-prefix search terms of transaction notes/tags",
+        {"transactions": [([("user_id", 1), ("_search_terms", 1)], {"name": "idx_tx_user_search"})]},
+        {},
+    ),
+    (
+        4,
+        "partial index of transactions awaiting a wallet balance job (startup recovery)",
+        {"transactions": [(
+            [("balance_sync", 1), ("updated_at", 1)],
+            {"name": "idx_tx_balance_pending", "partialFilterExpression": {"balance_sync": "pending"}},
+        )]},
+        {},
+    ),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# Query shapes the report explains: (name, collection, filter, sort).
+# "$user_id"/"$wallet_id" are replaced with a sampled real value.
+HOT_QUERIES: List[Tuple[str, str, Dict[str, Any], List[Tuple[str, int]]]] = [
+    ("recent transactions", "transactions", {"user_id": "$user_id"}, [("timestamp", -1), ("_id", -1)]),
+    ("transactions by date range", "transactions",
+     {"user_id": "$user_id", "timestamp": {"$gte": 0, "$lt": 2 ** 31}}, [("timestamp", 1)]),
+    ("wallet scan", "transactions", {"user_id": "$user_id", "wallet_id": "$wallet_id"}, [("timestamp", 1), ("sequence_number", 1)]),
+    ("manual balance transactions", "transactions",
+     {"user_id": "$user_id", "wallet_id": "$wallet_id", "fk_manual_balance_id": ""}, [("sequence_number", -1)]),
+    ("scope transactions", "transactions", {"user_id": "$user_id", "scope_id": ""}, [("timestamp", -1)]),
+    ("note search", "transactions", {"user_id": "$user_id", "_search_terms": {"$all": ["ma"]}}, [("timestamp", -1)]),
+    ("pending balance recovery", "transactions",
+     {"balance_sync": "pending", "updated_at": {"$lt": 2 ** 31}}, [("updated_at", 1)]),
+    ("latest manual balance", "manual_balances",
+     {"user_id": "$user_id", "wallet_id": "$wallet_id", "is_latest": True}, [("sequence_number", -1)]),
+]
+
+
+def _normalize_keys(keys: Any) -> List[Tuple[str, int]]:
+    """("field", 1) or [("a", 1), ("b", -1)] -> [("field", 1)] list form."""
+    keys = list(keys)
+    return [tuple(keys)] if isinstance(keys[0], str) else [tuple(k) for k in keys]
+
+
+def _specs_of(migration: Tuple[int, str, Any, Dict[str, List[str]]]) -> Dict[str, List[Tuple[Any, Dict[str, Any]]]]:
+    specs = migration[2]
+    return specs() if callable(specs) else specs
+
+
+def get_applied_version() -> int:
+    doc = get_collection(MIGRATIONS_COLLECTION).find_one({"_id": MIGRATIONS_DOC_ID})
+    return int(doc.get("version", 0)) if doc else 0
+
+
+def apply_index_migrations(target_version: Optional[int] = None) -> List[int]:
+    """Apply pending migrations up to target_version (default: latest). Returns applied versions."""
+    from pymongo.errors import OperationFailure
+
+    target = LATEST_VERSION if target_version is None else target_version
+    current = get_applied_version()
+    if current >= target:
+        return []
+
+    db = get_db()
+    state = db[MIGRATIONS_COLLECTION]
+    applied: List[int] = []
+    for migration in MIGRATIONS:
+        version, description = migration[0], migration[1]
+        if version <= current or version > target:
+            continue
+        started = time.time()
+        for collection_name, index_list in _specs_of(migration).items():
+            coll = db[collection_name]
+            for keys, options in index_list:
+                try:
+                    coll.create_index(_normalize_keys(keys), **(options or {}))
+                except OperationFailure as e:
+                    if e.code not in _CONFLICT_CODES:
+                        raise
+                    # Same keys already indexed under another name (e.g. created by hand)
+                    print(f"⚠️ [INDEXES] {collection_name}.{(options or {}).get('name')}: {e.details.get('errmsg') if e.details else e}")
+        for collection_name, names in migration[3].items():
+            for name in names:
+                try:
+                    db[collection_name].drop_index(name)
+                except OperationFailure as e:
+                    if e.code != _NOT_FOUND_CODE:
+                        raise
+        state.update_one(
+            {"_id": MIGRATIONS_DOC_ID},
+            {
+                "$set": {"version": version, "updated_at": int(time.time())},
+                "$push": {"history": {"version": version, "description": description,
+                                      "applied_at": int(time.time()), "seconds": round(time.time() - started, 2)}},
+            },
+            upsert=True,
+        )
+        applied.append(version)
+        print(f"✅ [INDEXES] Applied v{version}: {description}")
+    return applied
+
+
+def declared_indexes(up_to_version: Optional[int] = None) -> Dict[str, Dict[str, List[Tuple[str, int]]]]:
+    """{collection: {index name: keys}} the migrations leave in place."""
+    declared: Dict[str, Dict[str, List[Tuple[str, int]]]] = {}
+    for migration in MIGRATIONS:
+        if up_to_version is not None and migration[0] > up_to_version:
+            break
+        for collection_name, index_list in _specs_of(migration).items():
+            for keys, options in index_list:
+                keys = _normalize_keys(keys)
+                name = (options or {}).get("name") or "_".join(f"{k}_{d}" for k, d in keys)
+                declared.setdefault(collection_name, {})[name] = keys
+        for collection_name, names in migration[3].items():
+            for name in names:
+                declared.get(collection_name, {}).pop(name, None)
+    return declared
+
+
+def index_report(collections: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """Missing, unused and existing indexes per collection plus explain plans of HOT_QUERIES.
+
+    Unused = zero $indexStats accesses since the server (or index) started,
+    so read it after the app has served real traffic.
+    """
+    db = get_db()
+    declared = declared_indexes()
+    names = list(collections) if collections else sorted(set(declared) | {q[1] for q in HOT_QUERIES})
+    report: Dict[str, Any] = {"applied_version": get_applied_version(), "latest_version": LATEST_VERSION, "collections": {}, "queries": []}
+
+    for collection_name in names:
+        coll = db[collection_name]
+        existing = {idx["name"]: [tuple(k) for k in idx["key"].items()] for idx in coll.list_indexes()}
+        existing_keys = {tuple(keys) for keys in existing.values()}
+        missing = [
+            name for name, keys in declared.get(collection_name, {}).items()
+            if name not in existing and tuple(keys) not in existing_keys
+        ]
+        unused: List[Dict[str, Any]] = []
+        try:
+            for stat in coll.aggregate([{"$indexStats": {}}]):
+                ops = int(stat.get("accesses", {}).get("ops", 0))
+                if stat.get("name") != "_id_" and ops == 0:
+                    since = stat.get("accesses", {}).get("since")
+                    unused.append({"name": stat.get("name"), "since": since.isoformat() if hasattr(since, "isoformat") else since})
+        except Exception as e:
+            print(f"⚠️ [INDEXES] $indexStats failed for {collection_name}: {e}")
+        report["collections"][collection_name] = {
+            "existing": sorted(existing),
+            "missing": missing,
+            "unused": unused,
+        }
+
+    sample = db["transactions"].find_one({}, projection={"user_id": 1, "wallet_id": 1}) or {}
+    placeholders = {"$user_id": sample.get("user_id", ""), "$wallet_id": sample.get("wallet_id", "")}
+    for name, collection_name, query, sort in HOT_QUERIES:
+        query = {k: placeholders.get(v, v) if isinstance(v, str) else v for k, v in query.items()}
+        try:
+            plan = db[collection_name].find(query).sort(sort).limit(20).explain()
+            stages, index_names = _plan_stages(plan.get("queryPlanner", {}).get("winningPlan", {}))
+            stats = plan.get("executionStats", {})
+            report["queries"].append({
+                "name": name,
+                "collection": collection_name,
+                "stages": stages,
+                "indexes": index_names,
+                "collscan": "COLLSCAN" in stages,
+                "in_memory_sort": "SORT" in stages,
+                "docs_examined": stats.get("totalDocsExamined"),
+            })
+        except Exception as e:
+            report["queries"].append({"name": name, "collection": collection_name, "error": str(e)})
+    return report
+
+
+def _plan_stages(plan: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    """Flatten a winningPlan tree into (stage names, index names), root first."""
+    stages: List[str] = []
+    index_names: List[str] = []
+    pending = [plan]
+    while pending:
+        node = pending.pop(0)
+        if not isinstance(node, dict):
+            continue
+        if node.get("stage"):
+            stages.append(node["stage"])
+        if node.get("indexName"):
+            index_names.append(node["indexName"])
+        # Slot-based engine nests the classic plan under queryPlan
+        for child_key in ("queryPlan", "inputStage"):
+            if child_key in node:
+                pending.append(node[child_key])
+        pending.extend(node.get("inputStages", []))
+    return stages, index_names
@@ -0,0 +1,140 @@
+"""Per-user master-data cache (wallets, scopes, categories).
+
+Nearly every page lists the user's wallets, scopes and categories, which only
+change through the repositories' create/update/delete methods (and balance
+writes for wallets). Those methods call invalidate(); readers go through
+cached_list().
+
+Backend: Redis when REDIS_URL is set and the redis package is installed, so
+all gunicorn workers share entries and invalidations; otherwise an in-process
+LRU with the same interface. Entries are keyed by a per-user generation
+counter, so a value computed while a write invalidated the user is stored
+under the old generation and never served.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional, Tuple
+
+from bson import json_util
+
+
+MASTER_CACHE_TTL_SECONDS = int(os.getenv("MASTER_CACHE_TTL_SECONDS", "300"))
+MASTER_CACHE_MAX_ENTRIES = 4096
+KINDS = ("wallets", "scopes", "categories")
+KEY_PREFIX = "mm:master"
+
+
+class LocalLRUCache:
+    """In-process subset of the Redis commands used here (get/set ex/incr)."""
+
+    def __init__(self, max_entries: int = MASTER_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ex: Optional[int] = None) -> bool:
+        with self._lock:
+            self._data[key] = (value, time.time() + ex if ex else None)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return True
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value, expires_at = self._data.get(key, (0, None))
+            value = int(value) + 1
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            return value
+
+
+_backend: Any = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> Any:
+    """Redis client if configured and reachable, else the local LRU."""
+    global _backend
+    if _backend is not None:
+        return _backend
+    with _backend_lock:
+        if _backend is None:
+            backend: Any = None
+            redis_url = os.getenv("REDIS_URL")
+            if redis_url:
+                try:
+                    import redis
+                    backend = redis.Redis.from_url(redis_url, socket_timeout=0.5, decode_responses=True)
+                    backend.ping()
+                except Exception as e:
+                    print(f"⚠️ [MASTER_CACHE] Redis unavailable, using in-process cache: {e}")
+                    backend = None
+            _backend = backend or LocalLRUCache()
+    return _backend
+
+
+def _generation_key(kind: str, user_id: str) -> str:
+    return f"{KEY_PREFIX}:{kind}:{user_id}:gen"
+
+
+def cached_list(kind: str, user_id: str, compute: Callable[[], List[Any]]) -> List[Any]:
+    """Return the cached list of kind for user_id, computing and storing it on a miss."""
+    if not user_id:
+        return compute()
+    backend = get_backend()
+    try:
+        generation = backend.get(_generation_key(kind, user_id)) or 0
+        key = f"{KEY_PREFIX}:{kind}:{user_id}:{generation}"
+        raw = backend.get(key)
+        if raw is not None:
+            return json_util.loads(raw)
+    except Exception as e:
+        print(f"⚠️ [MASTER_CACHE] Read failed for {kind}: {e}")
+        return compute()
+
+    value = compute()
+    try:
+        # Stored serialized so callers can't mutate a shared copy
+        backend.set(key, json_util.dumps(value), ex=MASTER_CACHE_TTL_SECONDS)
+    except Exception as e:
+        print(f"⚠️ [MASTER_CACHE] Write failed for {kind}: {e}")
+    return value
+
+
+def invalidate(kind: str, user_id: Optional[str]) -> None:
+    """Drop the cached list of kind for user_id (called by repository writes).
+
+    Also bumps the user's data version (shared report caches key on it).
+    """
+    if not user_id:
+        return
+    try:
+        get_backend().incr(_generation_key(kind, user_id))
+    except Exception as e:
+        print(f"⚠️ [MASTER_CACHE] Invalidate failed for {kind}: {e}")
+
+    from mm.services.data_version import bump_data_version
+    bump_data_version(user_id)
+
+
+def invalidate_user(user_id: Optional[str]) -> None:
+    """Drop every cached master-data list of user_id."""
+    for kind in KINDS:
+        invalidate(kind, user_id)
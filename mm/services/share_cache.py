@@ -0,0 +1,64 @@
+"""Rendered-page cache for public share links (/myuangly/<username>/<slug>).
+
+A page is keyed on the share's config (id + updated_at), the resolved date
+range, the owner's display name, the owner's data version
+(mm.services.data_version) and the viewer's page/filter args, so any change
+to the share or the owner's data produces a new key instead of needing an
+explicit purge. The same key is the ETag.
+
+Stored in Redis when the master cache uses it; otherwise in a small
+in-process LRU of its own (pages are much larger than master-data lists).
+The TTL bounds staleness when processes don't share a backend.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from mm.services.master_cache import LocalLRUCache, get_backend
+
+
+SHARE_PAGE_TTL_SECONDS = 300
+SHARE_PAGE_MAX_ENTRIES = 256
+KEY_PREFIX = "mm:share-page"
+
+# Request args that change the rendered page
+PAGE_ARGS = ("page", "per_page", "tx_type", "cursor", "total")
+
+_local = LocalLRUCache(max_entries=SHARE_PAGE_MAX_ENTRIES)
+
+
+def _store() -> Any:
+    backend = get_backend()
+    return _local if isinstance(backend, LocalLRUCache) else backend
+
+
+def page_etag(share: Dict[str, Any], owner: Dict[str, Any], data_version: str, args: Any,
+              date_range: Any = None) -> str:
+    """Stable ETag of one rendered share page (date_range: the resolved relative dates, e.g. "this_month")."""
+    ident = {
+        "dates": date_range,
+        "share": str(share.get("_id")),
+        "updated_at": share.get("updated_at"),
+        "owner": [owner.get("name"), owner.get("username")],
+        "version": data_version,
+        "args": {name: args.get(name) for name in PAGE_ARGS if args.get(name) not in (None, "")},
+    }
+    raw = json.dumps(ident, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()
+
+
+def get_page(etag: str) -> Optional[str]:
+    try:
+        return _store().get(f"{KEY_PREFIX}:{etag}")
+    except Exception as e:
+        print(f"⚠️ [SHARE_CACHE] Read failed: {e}")
+        return None
+
+
+def store_page(etag: str, html: str) -> None:
+    try:
+        _store().set(f"{KEY_PREFIX}:{etag}", html, ex=SHARE_PAGE_TTL_SECONDS)
+    except Exception as e:
+        print(f"⚠️ [SHARE_CACHE] Write failed: {e}")
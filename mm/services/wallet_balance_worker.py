@@ -1,23 +1,74 @@
 """Background worker for wallet balance updates.
 
 Transactions are saved immediately; wallet saldo and balance_before/after
-fields are updated asynchronously via a single FIFO queue so the API
-response is not blocked by read-modify-write balance logic.
+fields are updated asynchronously so the API response is not blocked by
+read-modify-write balance logic.
+
+Jobs live in the ``wallet_balance_jobs`` Mongo collection (an outbox), not in
+process memory: a worker leases the oldest available job, runs it and deletes
+it (ack). A crash mid-job leaves the lease to expire so another worker/process
+picks it up again, and wallet deltas carry an idempotency key so a replay never
+applies the same delta twice. Jobs of one (user_id, wallet_id) partition run
+one at a time in enqueue order, across all gunicorn processes.
+
+Each process runs a pool of WALLET_WORKER_POOL_SIZE threads. Partitions are
+hashed onto PARTITION_SLOTS slots and every thread owns a fixed subset of the
+slots, so independent wallets are processed in parallel while one wallet's
+jobs stay on one thread. get_worker_stats() reports per-partition queue depth
+and latency.
+
+The same queue carries "rollup" jobs (one partition per user) that keep the
+tx_rollups monthly sums and the tag_stats document in step with transaction
+inserts, edits and deletes.
 """
 from __future__ import annotations
 
-import queue
+import os
+import re
+import socket
 import threading
 import time
 import traceback
+import zlib
+from collections import OrderedDict
 from typing import Any, Dict, List, Optional
 
 from bson import ObjectId
-
-
-_job_queue: queue.Queue = queue.Queue()
-_worker_thread: Optional[threading.Thread] = None
+from pymongo import ASCENDING, ReturnDocument
+
+
+JOB_COLLECTION = "wallet_balance_jobs"
+LEASE_SECONDS = int(os.getenv("WALLET_WORKER_LEASE_SECONDS", "120"))
+POLL_INTERVAL_SECONDS = float(os.getenv("WALLET_WORKER_POLL_SECONDS", "2"))
+MAX_ATTEMPTS = int(os.getenv("WALLET_WORKER_MAX_ATTEMPTS", "5"))
+# Pending transactions younger than this are assumed to have a job in flight
+RECOVERY_GRACE_SECONDS = 60
+POOL_SIZE = max(1, int(os.getenv("WALLET_WORKER_POOL_SIZE", "4")))
+# Fixed so a job's slot doesn't depend on the pool size of the process that enqueued it
+PARTITION_SLOTS = 64
+# Per-partition latency entries kept in memory for get_worker_stats()
+PARTITION_STATS_KEPT = 1000
+# A recalculate waits this long for more edits of the same wallet ...
+RECALCULATE_DEBOUNCE_SECONDS = float(os.getenv("WALLET_WORKER_RECALC_DEBOUNCE_SECONDS", "2"))
+# ... but is never pushed back further than this after it was first queued
+RECALCULATE_MAX_DELAY_SECONDS = 15
+# Upper bound of transactions applied by one $inc (merged apply jobs or one
+# apply_batch job). Kept well below wallets.APPLIED_OPS_KEPT so pushing a batch's
+# op ids never evicts its own earliest ids before a replay can see them.
+APPLY_MERGE_LIMIT = 50
+
+_worker_threads: List[threading.Thread] = []
 _worker_lock = threading.Lock()
+_wakeups: List[threading.Event] = [threading.Event() for _ in range(POOL_SIZE)]
+_stats_lock = threading.Lock()
+_worker_stats: List[Dict[str, Any]] = [
+    {"processed": 0, "failed": 0, "busy_since": None, "current_partition": None}
+    for _ in range(POOL_SIZE)
+]
+_partition_stats: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_worker_id = f"{socket.gethostname()}:{os.getpid()}"
+_indexes_ready = False
+_recovery_started = False
 
 
 def _tx_delta(transaction_type: str, amount: float) -> float:
@@ -28,26 +79,101 @@ def _tx_delta(transaction_type: str, amount: float) -> float:
     return 0.0
 
 
+def _jobs():
+    from config import get_collection
+
+    global _indexes_ready
+    coll = get_collection(JOB_COLLECTION)
+    if not _indexes_ready:
+        try:
+            coll.create_index([("slot", ASCENDING), ("status", ASCENDING), ("available_at", ASCENDING), ("_id", ASCENDING)], name="idx_job_claim")
+            coll.create_index([("partition", ASCENDING), ("status", ASCENDING), ("_id", ASCENDING)], name="idx_job_partition")
+            coll.create_index([("transaction_id", ASCENDING)], name="idx_job_tx", sparse=True)
+            _indexes_ready = True
+        except Exception:
+            pass
+    return coll
+
+
+def _partition_slot(partition: str) -> int:
+    return zlib.crc32(partition.encode("utf-8")) % PARTITION_SLOTS
+
+
+def _worker_slots(worker_index: int) -> List[Any]:
+    slots: List[Any] = [slot for slot in range(PARTITION_SLOTS) if slot % POOL_SIZE == worker_index]
+    if worker_index == 0:
+        # Jobs enqueued before slots existed
+        slots.append(None)
+    return slots
+
+
+def _partition_key(job: Dict[str, Any]) -> str:
+    """Jobs touching the same (user_id, wallet_id) must run in order."""
+    user_id = job.get("user_id")
+    if job.get("type") == "rollup":
+        return f"{user_id}:rollups"
+    wallet_id = job.get("wallet_id") or job.get("new_wallet_id")
+    steps = job.get("steps") or []
+    if steps:
+        user_id = user_id or steps[0].get("user_id")
+        wallet_id = wallet_id or steps[0].get("wallet_id")
+    return f"{user_id}:{wallet_id}"
+
+
 def _ensure_worker() -> None:
-    global _worker_thread
     with _worker_lock:
-        if _worker_thread is None or not _worker_thread.is_alive():
-            _worker_thread = threading.Thread(
+        for index in range(POOL_SIZE):
+            if index < len(_worker_threads) and _worker_threads[index].is_alive():
+                continue
+            thread = threading.Thread(
                 target=_worker_loop,
-                name="wallet-balance-worker",
+                args=(index,),
+                name=f"wallet-balance-worker-{index}",
                 daemon=True,
             )
-            _worker_thread.start()
+            if index < len(_worker_threads):
+                _worker_threads[index] = thread
+            else:
+                _worker_threads.append(thread)
+            thread.start()
 
 
 def start_wallet_balance_worker() -> None:
-    """Start the background worker thread (idempotent)."""
+    """Start the background worker pool and pending-transaction recovery (idempotent)."""
+    global _recovery_started
     _ensure_worker()
+    with _worker_lock:
+        if _recovery_started:
+            return
+        _recovery_started = True
+    threading.Thread(
+        target=recover_pending_transactions,
+        name="wallet-balance-recovery",
+        daemon=True,
+    ).start()
 
 
 def enqueue_wallet_balance_job(job: Dict[str, Any]) -> None:
     _ensure_worker()
-    _job_queue.put(job)
+    now = time.time()
+    partition = _partition_key(job)
+    slot = _partition_slot(partition)
+    doc = dict(job)
+    doc.update({
+        "partition": partition,
+        "slot": slot,
+        "status": "pending",
+        "attempts": 0,
+        "available_at": now,
+        "created_at": now,
+    })
+    try:
+        _jobs().insert_one(doc)
+    except Exception as exc:
+        # The transaction stays balance_sync="pending"; startup recovery re-enqueues it
+        print(f"❌ [WALLET_WORKER] Could not enqueue {job.get('type')} job: {exc}")
+        return
+    _wakeups[slot % POOL_SIZE].set()
 
 
 def enqueue_apply_transaction(
@@ -67,11 +193,43 @@ def enqueue_apply_transaction(
     })
 
 
+def enqueue_apply_transactions(user_id: str, wallet_id: str, items: List[Dict[str, Any]]) -> None:
+    """One job applying many new transactions of a wallet (bulk inserts).
+
+    items: [{"transaction_id", "transaction_type", "amount"}, ...] in order.
+    Split into jobs of at most APPLY_MERGE_LIMIT items.
+    """
+    for start in range(0, len(items), APPLY_MERGE_LIMIT):
+        chunk = items[start:start + APPLY_MERGE_LIMIT]
+        enqueue_wallet_balance_job({
+            "type": "apply_batch",
+            "user_id": user_id,
+            "wallet_id": wallet_id,
+            "items": chunk,
+            "transaction_ids": [item["transaction_id"] for item in chunk],
+        })
+
+
+def enqueue_rollup_deltas(user_id: str, deltas: List[Dict[str, Any]],
+                          tag_deltas: Optional[List[Dict[str, Any]]] = None) -> None:
+    """Queue tx_rollups count/sum deltas (see mm.repositories.tx_rollups.rollup_delta)
+    and tag_stats deltas (mm.repositories.tag_stats.tag_deltas)."""
+    if not deltas and not tag_deltas:
+        return
+    enqueue_wallet_balance_job({
+        "type": "rollup",
+        "user_id": user_id,
+        "deltas": deltas,
+        "tag_deltas": tag_deltas or [],
+    })
+
+
 def enqueue_revert_transaction(
     wallet_id: str,
     user_id: str,
     transaction_type: str,
     amount: float,
+    timestamp: Optional[int] = None,
 ) -> None:
     enqueue_wallet_balance_job({
         "type": "revert",
@@ -79,6 +237,7 @@ def enqueue_revert_transaction(
         "user_id": user_id,
         "transaction_type": transaction_type,
         "amount": float(amount),
+        "timestamp": timestamp,
     })
 
 
@@ -121,37 +280,407 @@ def enqueue_set_wallet_balance(
 
 
 def enqueue_multi_adjust(steps: List[Dict[str, Any]]) -> None:
-    """Apply multiple wallet deltas in order (e.g. transfers)."""
-    enqueue_wallet_balance_job({
-        "type": "multi_adjust",
-        "steps": steps,
-    })
-
-
-def enqueue_recalculate_wallet(user_id: str, wallet_id: str) -> None:
-    enqueue_wallet_balance_job({
+    """Apply multiple wallet deltas in order (e.g. transfers).
+
+    Steps are split into one job per wallet (order kept within a wallet) so
+    each delta is serialised with the rest of its own wallet's partition.
+    """
+    by_wallet: "OrderedDict[tuple, List[Dict[str, Any]]]" = OrderedDict()
+    for step in steps:
+        by_wallet.setdefault((step.get("user_id"), step.get("wallet_id")), []).append(step)
+    for wallet_steps in by_wallet.values():
+        enqueue_wallet_balance_job({
+            "type": "multi_adjust",
+            "steps": wallet_steps,
+        })
+
+
+def enqueue_recalculate_wallet(user_id: str, wallet_id: str, from_timestamp: Optional[int] = None) -> None:
+    """Queue a recalculation, coalesced with one that hasn't started yet.
+
+    A pending recalculate reads the wallet when it runs, so it already covers
+    this request; its start is pushed back by RECALCULATE_DEBOUNCE_SECONDS
+    (capped at RECALCULATE_MAX_DELAY_SECONDS) so a burst of edits or an import
+    ends in a single pass. from_timestamp (None = whole wallet) is merged to
+    the earliest requested; null sorts before numbers, so $min keeps "full".
+    """
+    job = {
         "type": "recalculate",
         "user_id": user_id,
         "wallet_id": wallet_id,
-    })
+        "from_timestamp": from_timestamp,
+    }
+    now = time.time()
+    try:
+        pending = {"type": "recalculate", "partition": _partition_key(job), "status": "pending"}
+        debounced = _jobs().update_one(
+            dict(pending, created_at={"$gte": now - RECALCULATE_MAX_DELAY_SECONDS}),
+            {
+                "$max": {"available_at": now + RECALCULATE_DEBOUNCE_SECONDS},
+                "$min": {"from_timestamp": from_timestamp},
+            },
+        )
+        if debounced.matched_count:
+            return
+        folded = _jobs().update_one(pending, {"$min": {"from_timestamp": from_timestamp}})
+        if folded.matched_count:
+            return
+    except Exception as exc:
+        print(f"⚠️ [WALLET_WORKER] Could not coalesce recalculate job: {exc}")
+    enqueue_wallet_balance_job(job)
+
+
+def recover_pending_transactions() -> int:
+    """Re-enqueue transactions stuck at balance_sync="pending" without a job.
+
+    Covers jobs lost before the outbox existed, or an enqueue that failed after
+    the transaction was written. Apply jobs are idempotent per transaction, so
+    racing another process' recovery cannot double-apply a delta.
+    """
+    from mm.repositories.transactions import TransactionRepository
+
+    recovered = 0
+    try:
+        now = time.time()
+        lock = _jobs().find_one_and_update(
+            {"_id": "recovery_lock", "lease_until": {"$lt": now}},
+            {"$set": {"status": "lock", "lease_owner": _worker_id, "lease_until": now + LEASE_SECONDS}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if not lock or lock.get("lease_owner") != _worker_id:
+            return 0
+    except Exception:
+        # Another process holds the lock (upsert raced into a duplicate key)
+        return 0
+
+    try:
+        open_jobs = {"status": {"$in": ["pending", "leased"]}}
+        outstanding = set(_jobs().distinct("transaction_id", open_jobs))
+        outstanding.update(_jobs().distinct("transaction_ids", open_jobs))
+        tx_coll = TransactionRepository().collection
+        cursor = tx_coll.find(
+            {"balance_sync": "pending", "updated_at": {"$lt": int(time.time()) - RECOVERY_GRACE_SECONDS}},
+            projection={"user_id": 1, "wallet_id": 1, "type": 1, "amount": 1, "balance_sync_op": 1},
+        )
+        for tx in cursor:
+            tx_id = str(tx["_id"])
+            if tx_id in outstanding or not tx.get("wallet_id"):
+                continue
+            if tx.get("balance_sync_op") == "update":
+                # The old/new deltas of a lost edit are unknown; re-derive the
+                # per-transaction balances from the wallet's current saldo.
+                print(f"⚠️ [WALLET_WORKER] Recovering lost update of {tx_id} with a recalculation")
+                enqueue_recalculate_wallet(tx["user_id"], tx["wallet_id"])
+                _mark_synced(tx_id, tx["user_id"], {})
+            else:
+                enqueue_apply_transaction(
+                    transaction_id=tx_id,
+                    wallet_id=tx["wallet_id"],
+                    user_id=tx["user_id"],
+                    transaction_type=tx.get("type", "expense"),
+                    amount=float(tx.get("amount", 0) or 0),
+                )
+            recovered += 1
+        if recovered:
+            print(f"✅ [WALLET_WORKER] Re-enqueued {recovered} pending transaction(s)")
+    except Exception as exc:
+        print(f"❌ [WALLET_WORKER] Pending transaction recovery failed: {exc}")
+        traceback.print_exc()
+    return recovered
+
+
+def _job_user_ids(job: Dict[str, Any]) -> set:
+    user_ids = {job.get("user_id")}
+    user_ids.update(step.get("user_id") for step in job.get("steps", []))
+    user_ids.discard(None)
+    return user_ids
+
+
+def _claim_next_job(worker_index: int) -> Optional[Dict[str, Any]]:
+    """Lease the oldest runnable job of this worker's slots (or one whose lease expired)."""
+    now = time.time()
+    return _jobs().find_one_and_update(
+        {
+            "slot": {"$in": _worker_slots(worker_index)},
+            "$or": [
+                {"status": "pending", "available_at": {"$lte": now}},
+                {"status": "leased", "lease_until": {"$lt": now}},
+            ],
+        },
+        {
+            "$set": {"status": "leased", "lease_owner": _worker_id, "lease_until": now + LEASE_SECONDS},
+            "$inc": {"attempts": 1},
+        },
+        sort=[("_id", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _partition_busy(job: Dict[str, Any]) -> bool:
+    """An older job of the same partition is still queued, retrying or running.
+
+    A recalculate that hasn't started doesn't hold later jobs back: it reads the
+    wallet when it runs, so running it after them gives the same result. The
+    flip side is that a recalculate must not start while any job of the
+    partition, older or newer, is leased by another worker.
+    """
+    partition = job.get("partition")
+    if job.get("type") == "recalculate" and _jobs().count_documents({
+        "partition": partition,
+        "_id": {"$ne": job["_id"]},
+        "status": "leased",
+    }, limit=1) > 0:
+        return True
+    return _jobs().count_documents({
+        "partition": partition,
+        "_id": {"$lt": job["_id"]},
+        "$or": [
+            {"status": "leased"},
+            {"status": "pending", "type": {"$ne": "recalculate"}},
+        ],
+    }, limit=1) > 0
+
+
+def _claim_apply_batch(job: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Lease the apply jobs queued right behind job on the same wallet.
+
+    Stops at the first job of another type (pending recalculates are skipped,
+    see _partition_busy) so merging never reorders anything.
+    """
+    batch = [job]
+    now = time.time()
+    followers = _jobs().find(
+        {"partition": job.get("partition"), "_id": {"$gt": job["_id"]}, "status": "pending"},
+        sort=[("_id", 1)],
+        limit=APPLY_MERGE_LIMIT - 1,
+    )
+    for follower in followers:
+        if follower.get("type") == "recalculate":
+            continue
+        if follower.get("type") != "apply" or follower.get("available_at", 0) > now:
+            break
+        claimed = _jobs().find_one_and_update(
+            {"_id": follower["_id"], "status": "pending"},
+            {
+                "$set": {"status": "leased", "lease_owner": _worker_id, "lease_until": now + LEASE_SECONDS},
+                "$inc": {"attempts": 1},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+        if not claimed:
+            break
+        batch.append(claimed)
+    return batch
+
 
 
-def _worker_loop() -> None:
+def _release_job(job: Dict[str, Any], delay: float) -> None:
+    _jobs().update_one(
+        {"_id": job["_id"], "lease_owner": _worker_id},
+        {
+            "$set": {"status": "pending", "available_at": time.time() + delay},
+            "$unset": {"lease_owner": "", "lease_until": ""},
+            "$inc": {"attempts": -1},
+        },
+    )
+
+
+def _ack_job(job: Dict[str, Any]) -> None:
+    _jobs().delete_one({"_id": job["_id"], "lease_owner": _worker_id})
+
+
+def _fail_job(job: Dict[str, Any], exc: Exception) -> None:
+    """Retry with backoff; park as "failed" after MAX_ATTEMPTS for inspection."""
+    attempts = int(job.get("attempts", 1))
+    if attempts >= MAX_ATTEMPTS:
+        _jobs().update_one(
+            {"_id": job["_id"]},
+            {"$set": {"status": "failed", "error": str(exc), "failed_at": time.time()}},
+        )
+        return
+    _jobs().update_one(
+        {"_id": job["_id"], "lease_owner": _worker_id},
+        {
+            "$set": {"status": "pending", "available_at": time.time() + 2 ** attempts, "error": str(exc)},
+            "$unset": {"lease_owner": "", "lease_until": ""},
+        },
+    )
+
+
+def _record_stats(worker_index: int, job: Dict[str, Any], started: float, ok: bool) -> None:
+    finished = time.time()
+    wait = max(0.0, started - float(job.get("created_at") or started))
+    run = finished - started
+    partition = job.get("partition") or "?"
+    with _stats_lock:
+        worker = _worker_stats[worker_index]
+        worker["processed" if ok else "failed"] += 1
+        worker["busy_since"] = None
+        worker["current_partition"] = None
+
+        entry = _partition_stats.pop(partition, None) or {
+            "jobs": 0, "failed": 0, "wait_total": 0.0, "run_total": 0.0, "run_max": 0.0,
+        }
+        entry["jobs"] += 1
+        entry["failed"] += 0 if ok else 1
+        entry["wait_total"] += wait
+        entry["run_total"] += run
+        entry["run_max"] = max(entry["run_max"], run)
+        entry["last_wait"] = wait
+        entry["last_run"] = run
+        entry["last_finished_at"] = finished
+        _partition_stats[partition] = entry
+        while len(_partition_stats) > PARTITION_STATS_KEPT:
+            _partition_stats.popitem(last=False)
+
+
+def get_worker_stats(user_id: Optional[str] = None) -> Dict[str, Any]:
+    """Pool state plus per-partition queue depth (outbox) and latency (this process).
+
+    user_id limits the partition listing to that user's wallets.
+    """
+    now = time.time()
+    match: Dict[str, Any] = {"status": {"$in": ["pending", "leased", "failed"]}}
+    if user_id:
+        match["partition"] = {"$regex": f"^{re.escape(user_id)}:"}
+
+    queues: Dict[str, Dict[str, Any]] = {}
+    try:
+        for row in _jobs().aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": {"partition": "$partition", "status": "$status"},
+                "count": {"$sum": 1},
+                "oldest": {"$min": "$created_at"},
+            }},
+        ]):
+            partition = row["_id"].get("partition") or "?"
+            queue = queues.setdefault(partition, {"pending": 0, "leased": 0, "failed": 0, "oldest_age": 0.0})
+            queue[row["_id"].get("status")] = row["count"]
+            if row["_id"].get("status") != "failed" and row.get("oldest"):
+                queue["oldest_age"] = max(queue["oldest_age"], round(now - row["oldest"], 3))
+    except Exception as exc:
+        print(f"❌ [WALLET_WORKER] Could not read queue depth: {exc}")
+
+    with _stats_lock:
+        workers = []
+        for index, worker in enumerate(_worker_stats):
+            alive = index < len(_worker_threads) and _worker_threads[index].is_alive()
+            workers.append({
+                "index": index,
+                "alive": alive,
+                "processed": worker["processed"],
+                "failed": worker["failed"],
+                "current_partition": worker["current_partition"] if not user_id else None,
+                "busy_for": round(now - worker["busy_since"], 3) if worker["busy_since"] else 0.0,
+            })
+        partitions = {}
+        for partition, entry in _partition_stats.items():
+            if user_id and not partition.startswith(f"{user_id}:"):
+                continue
+            partitions[partition] = {
+                "jobs": entry["jobs"],
+                "failed": entry["failed"],
+                "avg_wait": round(entry["wait_total"] / entry["jobs"], 3),
+                "avg_run": round(entry["run_total"] / entry["jobs"], 3),
+                "max_run": round(entry["run_max"], 3),
+                "last_wait": round(entry["last_wait"], 3),
+                "last_run": round(entry["last_run"], 3),
+                "last_finished_at": entry["last_finished_at"],
+            }
+
+    for partition, queue in queues.items():
+        partitions.setdefault(partition, {}).update({"queue": queue})
+
+    return {
+        "pool_size": POOL_SIZE,
+        "partition_slots": PARTITION_SLOTS,
+        "workers": workers,
+        "partitions": partitions,
+    }
+
+
+def _worker_loop(worker_index: int) -> None:
+    wakeup = _wakeups[worker_index]
     while True:
-        job = _job_queue.get()
-        try:
+        if not _run_next_job(worker_index):
+            wakeup.wait(POLL_INTERVAL_SECONDS)
+            wakeup.clear()
+
+
+def _run_next_job(worker_index: int) -> bool:
+    """Claim and run one job of this worker's slots. False when there was none to claim."""
+    from mm.services.balance_cache import invalidate_total_balance
+    from mm.services.data_version import bump_data_version
+
+    try:
+        job = _claim_next_job(worker_index)
+    except Exception as exc:
+        print(f"❌ [WALLET_WORKER] Could not claim job: {exc}")
+        job = None
+    if job is None:
+        return False
+
+    try:
+        if _partition_busy(job):
+            _release_job(job, delay=0.5)
+            return True
+    except Exception as exc:
+        # Leave the lease to expire; the job is retried later
+        print(f"❌ [WALLET_WORKER] Could not check partition {job.get('partition')}: {exc}")
+        return True
+
+    started = time.time()
+    with _stats_lock:
+        _worker_stats[worker_index]["busy_since"] = started
+        _worker_stats[worker_index]["current_partition"] = job.get("partition")
+
+    ok = True
+    batch = [job]
+    try:
+        if job.get("type") == "apply":
+            batch = _claim_apply_batch(job)
+        if len(batch) > 1:
+            _apply_transactions_merged(batch)
+        else:
             _process_job(job)
-        except Exception as exc:
-            print(f"❌ [WALLET_WORKER] Job failed ({job.get('type')}): {exc}")
-            traceback.print_exc()
-        finally:
-            _job_queue.task_done()
+        for done in batch:
+            _ack_job(done)
+    except Exception as exc:
+        ok = False
+        print(f"❌ [WALLET_WORKER] Job failed ({job.get('type')}): {exc}")
+        traceback.print_exc()
+        for failed in batch:
+            try:
+                _fail_job(failed, exc)
+            except Exception:
+                pass
+
+    for done in batch:
+        _record_stats(worker_index, done, started, ok)
+    for user_id in _job_user_ids(job):
+        invalidate_total_balance(user_id)
+        # Balances / balance_after changed: derived views (share pages) are stale
+        bump_data_version(user_id)
+    return True
 
 
 def _process_job(job: Dict[str, Any]) -> None:
     job_type = job.get("type")
     if job_type == "apply":
         _apply_transaction(job)
+    elif job_type == "apply_batch":
+        _apply_transactions_merged([
+            {
+                "transaction_id": item["transaction_id"],
+                "wallet_id": job["wallet_id"],
+                "user_id": job["user_id"],
+                "transaction_type": item.get("transaction_type", "expense"),
+                "amount": float(item.get("amount", 0)),
+            }
+            for item in job.get("items", [])
+        ])
     elif job_type == "revert":
         _revert_transaction(job)
     elif job_type == "update":
@@ -162,12 +691,47 @@ def _process_job(job: Dict[str, Any]) -> None:
         _multi_adjust(job)
     elif job_type == "recalculate":
         _recalculate_wallet(job)
+    elif job_type == "rollup":
+        _apply_rollup_deltas(job)
     else:
         print(f"⚠️ [WALLET_WORKER] Unknown job type: {job_type}")
 
 
-def _apply_transaction(job: Dict[str, Any]) -> None:
+def _refresh_checkpoint(user_id: str, wallet_id: str, timestamp: Optional[int]) -> None:
+    """Re-derive the daily balance checkpoint touched by a balance_after write."""
+    from mm.repositories.balance_checkpoints import BalanceCheckpointRepository
+
+    if timestamp is None:
+        return
+    BalanceCheckpointRepository().refresh_day(user_id, wallet_id, timestamp)
+
+
+def _mark_synced(tx_id: str, user_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Write balance fields onto a transaction and return its (wallet_id, timestamp)."""
     from mm.repositories.transactions import TransactionRepository
+
+    fields = dict(fields)
+    fields["balance_sync"] = "synced"
+    fields["updated_at"] = int(time.time())
+    return TransactionRepository().collection.find_one_and_update(
+        {"_id": ObjectId(tx_id), "user_id": user_id},
+        {"$set": fields, "$unset": {"balance_sync_op": ""}},
+        projection={"wallet_id": 1, "timestamp": 1},
+    )
+
+
+def _adjust_once(wallet_repo, wallet_id: str, user_id: str, delta: float, op_id: str) -> Optional[float]:
+    """Idempotent wallet delta. Returns the new balance, or None if the wallet is
+    missing or the op already landed on an earlier (crashed) attempt; in the
+    latter case the wallet's per-transaction balances are re-derived instead."""
+    balance_after = wallet_repo.adjust_wallet_balance(wallet_id, user_id, delta, op_id=op_id)
+    if balance_after is None and wallet_repo.has_applied_op(wallet_id, user_id, op_id):
+        print(f"⚠️ [WALLET_WORKER] {op_id} already applied; recalculating {wallet_id}")
+        enqueue_recalculate_wallet(user_id, wallet_id)
+    return balance_after
+
+
+def _apply_transaction(job: Dict[str, Any]) -> None:
     from mm.repositories.wallets import WalletRepository
 
     tx_id = job["transaction_id"]
@@ -177,24 +741,82 @@ def _apply_transaction(job: Dict[str, Any]) -> None:
     amount = job["amount"]
 
     wallet_repo = WalletRepository()
-    balance_before = wallet_repo.get_wallet_balance(wallet_id, user_id)
-    if balance_before is None:
-        return
-
     delta = _tx_delta(tx_type, amount)
-    balance_after = wallet_repo.adjust_wallet_balance(wallet_id, user_id, delta)
+    # Keyed on the transaction (not the job) so a recovery re-enqueue is a no-op
+    op_id = f"apply:{tx_id}"
+    balance_after = wallet_repo.adjust_wallet_balance(wallet_id, user_id, delta, op_id=op_id)
     if balance_after is None:
+        if wallet_repo.has_applied_op(wallet_id, user_id, op_id):
+            enqueue_recalculate_wallet(user_id, wallet_id)
+            _mark_synced(tx_id, user_id, {})
         return
 
-    TransactionRepository().collection.update_one(
-        {"_id": ObjectId(tx_id), "user_id": user_id},
-        {"$set": {
-            "balance_before": balance_before,
-            "balance_after": balance_after,
-            "balance_sync": "synced",
-            "updated_at": int(time.time()),
-        }},
+    tx = _mark_synced(tx_id, user_id, {
+        "balance_before": balance_after - delta,
+        "balance_after": balance_after,
+    })
+    if tx:
+        _refresh_checkpoint(user_id, wallet_id, tx.get("timestamp"))
+
+
+def _apply_transactions_merged(batch: List[Dict[str, Any]]) -> None:
+    """Apply consecutive apply jobs (or an apply_batch) of one wallet with a single $inc.
+
+    Per-transaction balance_before/after are derived from the merged result in
+    queue order and written with one bulk_write. If any of the jobs already
+    landed (replay after a crash) the batch falls back to one job at a time,
+    where each job's own idempotency key decides.
+    """
+    from pymongo import UpdateOne
+    from mm.repositories.balance_checkpoints import day_start
+    from mm.repositories.transactions import TransactionRepository
+    from mm.repositories.wallets import WalletRepository
+
+    if not batch:
+        return
+    first = batch[0]
+    wallet_id = first["wallet_id"]
+    user_id = first["user_id"]
+    deltas = [_tx_delta(job["transaction_type"], job["amount"]) for job in batch]
+
+    wallet_repo = WalletRepository()
+    balance_after = wallet_repo.adjust_wallet_balance(
+        wallet_id, user_id, sum(deltas),
+        op_id=[f"apply:{job['transaction_id']}" for job in batch],
     )
+    if balance_after is None:
+        for job in batch:
+            _apply_transaction(job)
+        return
+
+    running = balance_after - sum(deltas)
+    now = int(time.time())
+    ops = []
+    for job, delta in zip(batch, deltas):
+        ops.append(UpdateOne(
+            {"_id": ObjectId(job["transaction_id"]), "user_id": user_id},
+            {
+                "$set": {
+                    "balance_before": running,
+                    "balance_after": running + delta,
+                    "balance_sync": "synced",
+                    "updated_at": now,
+                },
+                "$unset": {"balance_sync_op": ""},
+            },
+        ))
+        running += delta
+
+    tx_coll = TransactionRepository().collection
+    tx_coll.bulk_write(ops, ordered=False)
+
+    tx_ids = [ObjectId(job["transaction_id"]) for job in batch]
+    days = set()
+    for tx in tx_coll.find({"_id": {"$in": tx_ids}}, projection={"timestamp": 1}):
+        if tx.get("timestamp") is not None:
+            days.add(day_start(tx["timestamp"]))
+    for day in sorted(days):
+        _refresh_checkpoint(user_id, wallet_id, day)
 
 
 def _revert_transaction(job: Dict[str, Any]) -> None:
@@ -202,15 +824,14 @@ def _revert_transaction(job: Dict[str, Any]) -> None:
 
     wallet_repo = WalletRepository()
     delta = -_tx_delta(job["transaction_type"], job["amount"])
-    wallet_repo.adjust_wallet_balance(job["wallet_id"], job["user_id"], delta)
+    _adjust_once(wallet_repo, job["wallet_id"], job["user_id"], delta, f"{job['_id']}:revert")
+    _refresh_checkpoint(job["user_id"], job["wallet_id"], job.get("timestamp"))
 
 
 def _update_transaction_balances(job: Dict[str, Any]) -> None:
-    from mm.repositories.transactions import TransactionRepository
     from mm.repositories.wallets import WalletRepository
 
     wallet_repo = WalletRepository()
-    tx_repo = TransactionRepository()
     user_id = job["user_id"]
 
     old_wallet = job.get("old_wallet_id")
@@ -221,33 +842,24 @@ def _update_transaction_balances(job: Dict[str, Any]) -> None:
     new_amount = job.get("new_amount", 0)
 
     if old_wallet and old_type and old_amount > 0:
-        wallet_repo.adjust_wallet_balance(
-            old_wallet, user_id, -_tx_delta(old_type, old_amount)
+        _adjust_once(
+            wallet_repo, old_wallet, user_id, -_tx_delta(old_type, old_amount), f"{job['_id']}:revert"
         )
 
-    balance_before = wallet_repo.get_wallet_balance(new_wallet, user_id)
-    if balance_before is None:
-        return
-
-    balance_after = wallet_repo.adjust_wallet_balance(
-        new_wallet, user_id, _tx_delta(new_type, new_amount)
-    )
+    delta = _tx_delta(new_type, new_amount)
+    balance_after = _adjust_once(wallet_repo, new_wallet, user_id, delta, f"{job['_id']}:apply")
     if balance_after is None:
         return
 
-    tx_repo.collection.update_one(
-        {"_id": ObjectId(job["transaction_id"]), "user_id": user_id},
-        {"$set": {
-            "balance_before": balance_before,
-            "balance_after": balance_after,
-            "balance_sync": "synced",
-            "updated_at": int(time.time()),
-        }},
-    )
+    tx = _mark_synced(job["transaction_id"], user_id, {
+        "balance_before": balance_after - delta,
+        "balance_after": balance_after,
+    })
+    if tx:
+        _refresh_checkpoint(user_id, new_wallet, tx.get("timestamp"))
 
 
 def _set_wallet_balance(job: Dict[str, Any]) -> None:
-    from mm.repositories.transactions import TransactionRepository
     from mm.repositories.wallets import WalletRepository
 
     wallet_repo = WalletRepository()
@@ -259,46 +871,45 @@ def _set_wallet_balance(job: Dict[str, Any]) -> None:
 
     tx_id = job.get("transaction_id")
     if tx_id:
-        TransactionRepository().collection.update_one(
-            {"_id": ObjectId(tx_id), "user_id": job["user_id"]},
-            {"$set": {
-                "balance_sync": "synced",
-                "updated_at": int(time.time()),
-            }},
-        )
+        tx = _mark_synced(tx_id, job["user_id"], {})
+        if tx:
+            _refresh_checkpoint(job["user_id"], job["wallet_id"], tx.get("timestamp"))
 
 
 def _multi_adjust(job: Dict[str, Any]) -> None:
-    from mm.repositories.transactions import TransactionRepository
     from mm.repositories.wallets import WalletRepository
 
     wallet_repo = WalletRepository()
-    tx_repo = TransactionRepository()
 
-    for step in job.get("steps", []):
+    for index, step in enumerate(job.get("steps", [])):
         wallet_id = step["wallet_id"]
         user_id = step["user_id"]
         delta = float(step["delta"])
         tx_id = step.get("transaction_id")
 
-        balance_before = wallet_repo.get_wallet_balance(wallet_id, user_id)
-        balance_after = wallet_repo.adjust_wallet_balance(wallet_id, user_id, delta)
+        balance_after = _adjust_once(wallet_repo, wallet_id, user_id, delta, f"{job['_id']}:{index}")
 
-        if tx_id and balance_before is not None and balance_after is not None:
-            tx_repo.collection.update_one(
-                {"_id": ObjectId(tx_id), "user_id": user_id},
-                {"$set": {
-                    "balance_before": balance_before,
-                    "balance_after": balance_after,
-                    "balance_sync": "synced",
-                    "updated_at": int(time.time()),
-                }},
-            )
+        if tx_id and balance_after is not None:
+            tx = _mark_synced(tx_id, user_id, {
+                "balance_before": balance_after - delta,
+                "balance_after": balance_after,
+            })
+            if tx:
+                _refresh_checkpoint(user_id, wallet_id, tx.get("timestamp"))
+
+
+def _apply_rollup_deltas(job: Dict[str, Any]) -> None:
+    from mm.repositories.tx_rollups import TxRollupRepository
+
+    TxRollupRepository().apply_deltas(job.get("deltas") or [], str(job["_id"]))
+    if job.get("tag_deltas"):
+        from mm.repositories.tag_stats import TagStatsRepository
+        TagStatsRepository().apply_deltas(job["user_id"], job["tag_deltas"], f"{job['_id']}:tags")
 
 
 def _recalculate_wallet(job: Dict[str, Any]) -> None:
     from mm.repositories.transactions import TransactionRepository
 
     TransactionRepository().recalculate_wallet_balances(
-        job["user_id"], job["wallet_id"]
+        job["user_id"], job["wallet_id"], from_timestamp=job.get("from_timestamp")
     )
@@ -208,17 +208,18 @@ domain_models: Dict[str, Dict[str, Any]] = {
 }
 
 
-# Suggested indexes (to be applied via config.ensure_indexes)
+# Baseline indexes ({collection: [(keys, options), ...]}, the config.ensure_indexes shape).
+# Migration 1 of mm/services/index_migrations.py; later changes go there as new versions.
 index_specs: Dict[str, List] = {
     "wallets": [(("user_id", 1), {"name": "idx_wallet_user"})],
     "manual_balances": [
-        [("user_id", 1)],
-        [("wallet_id", 1)],
-        [("user_id", 1), ("wallet_id", 1)],
-        [("user_id", 1), ("wallet_id", 1), ("is_latest", 1)],
-        [("user_id", 1), ("wallet_id", 1), ("balance_date", -1)],
-        [("user_id", 1), ("wallet_id", 1), ("sequence_number", 1)],
-        [("user_id", 1), ("wallet_id", 1), ("is_closed", 1)]
+        (("user_id", 1), {"name": "idx_mb_user"}),
+        (("wallet_id", 1), {"name": "idx_mb_wallet"}),
+        ([("user_id", 1), ("wallet_id", 1)], {"name": "idx_mb_user_wallet"}),
+        ([("user_id", 1), ("wallet_id", 1), ("is_latest", 1)], {"name": "idx_mb_user_wallet_latest"}),
+        ([("user_id", 1), ("wallet_id", 1), ("balance_date", -1)], {"name": "idx_mb_user_wallet_date"}),
+        ([("user_id", 1), ("wallet_id", 1), ("sequence_number", 1)], {"name": "idx_mb_user_wallet_sequence"}),
+        ([("user_id", 1), ("wallet_id", 1), ("is_closed", 1)], {"name": "idx_mb_user_wallet_closed"}),
     ],
     "categories": [
         (("user_id", 1), {"name": "idx_cat_user"}),
@@ -0,0 +1,32 @@
+import pytest
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """Route config.get_collection to a fresh in-memory mongomock database."""
+    mongomock = pytest.importorskip("mongomock")
+    import config
+
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(config, "_mongo_client", client)
+    return config.get_db()
+
+
+@pytest.fixture
+def local_cache(monkeypatch):
+    """A fresh in-process master_cache backend."""
+    from mm.services import master_cache
+
+    backend = master_cache.LocalLRUCache()
+    monkeypatch.setattr(master_cache, "_backend", backend)
+    return backend
+
+
+@pytest.fixture
+def worker(mongo, local_cache, monkeypatch):
+    """wallet_balance_worker against mongomock, with no background threads."""
+    from mm.services import wallet_balance_worker
+
+    monkeypatch.setattr(wallet_balance_worker, "_ensure_worker", lambda: None)
+    monkeypatch.setattr(wallet_balance_worker, "_indexes_ready", False)
+    return wallet_balance_worker
@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from mm.repositories.transactions import TransactionColumns
+from mm.services import analytics
+
+
+def _columns(count, seed=7):
+    rng = random.Random(seed)
+    columns = TransactionColumns()
+    for i in range(count):
+        category_id = rng.choice(["food", "fuel", "", "transfer", "balance_adjustment", "rent"])
+        name = rng.choice([None, None, "Groceries", "Petrol", ""])
+        columns.append({
+            "timestamp": 1_700_000_000 + i * 3600,
+            "amount": rng.randint(1, 500) * 1.5,
+            "type": rng.choice(["income", "expense", "expense", "transfer", "odd"]),
+            "category_id": category_id,
+            "_snap": {"category_path": ["Parent", name]} if name is not None else None,
+        })
+    return columns
+
+
+def _as_tuple(batch):
+    return (list(batch.timestamp), list(batch.amount), list(batch.count), list(batch.type_code),
+            list(batch.category_code), batch.categories)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"exclude_types": ("transfer",)},
+    {"exclude_category_ids": ()},
+    {"category_key": lambda category_id, name: None if category_id == "rent" else (name or category_id).lower()},
+])
+def test_columnar_build_batch_matches_row_loop(monkeypatch, kwargs):
+    pytest.importorskip("numpy")
+    columns = _columns(300)
+    vectorized = analytics.build_batch(columns, **kwargs)
+    monkeypatch.setattr(analytics, "np", None)
+    looped = analytics.build_batch(columns, **kwargs)
+
+    assert _as_tuple(vectorized) == _as_tuple(looped)
+    assert len(vectorized) > 0
+
+
+def _series(count, seed=3):
+    rng = random.Random(seed)
+    xs = [1_700_000_000 + i * 600 for i in range(count)]
+    ys, level = [], 0.0
+    for _ in xs:
+        level += rng.uniform(-50, 50)
+        ys.append(level)
+    return xs, ys
+
+
+@pytest.mark.parametrize("count,threshold", [(1000, 100), (1000, 3), (501, 500), (10, 2), (37, 12)])
+def test_lttb_keeps_endpoints_and_returns_threshold_points(count, threshold):
+    xs, ys = _series(count)
+    keep = analytics.lttb_indices(xs, ys, threshold)
+
+    assert len(keep) == threshold
+    assert keep[0] == 0 and keep[-1] == count - 1
+    assert keep == sorted(set(keep))
+
+
+def test_lttb_keeps_the_spike_a_stride_sample_would_drop():
+    xs, ys = list(range(1000)), [0.0] * 1000
+    ys[503] = 1000.0
+    assert 503 in analytics.lttb_indices(xs, ys, 50)
+
+
+@pytest.mark.parametrize("count,threshold", [(0, 10), (1, 10), (9, 10), (10, 10)])
+def test_lttb_passes_short_series_through(count, threshold):
+    xs, ys = _series(count)
+    assert analytics.lttb_indices(xs, ys, threshold) == list(range(count))
+
+
+def test_resample_last_keeps_the_last_value_of_each_bucket():
+    from datetime import datetime
+
+    day = lambda d, h: datetime(2024, 3, d, h).timestamp()
+    timestamps = [day(4, 8), day(4, 20), day(5, 9), day(7, 23), day(11, 1), day(11, 2)]
+    values = [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+
+    assert analytics.resample_last(timestamps, values, "day") == (
+        [int(day(4, 0)), int(day(5, 0)), int(day(7, 0)), int(day(11, 0))], [2.0, 3.0, 4.0, 6.0])
+    # 2024-03-04 is a Monday
+    assert analytics.resample_last(timestamps, values, "week") == ([int(day(4, 0)), int(day(11, 0))], [4.0, 6.0])
+    assert analytics.resample_last(timestamps, values, "month") == ([int(day(1, 0))], [6.0])
+    assert analytics.resample_last(timestamps, values, "raw") == ([int(ts) for ts in timestamps], values)
+
+
+def test_resample_last_leaves_one_point_per_bucket_unchanged():
+    from datetime import datetime
+
+    timestamps = [datetime(2024, 1, d).timestamp() for d in (1, 2, 5, 9)]
+    values = [10.0, -3.5, 7.0, 0.0]
+    assert analytics.resample_last(timestamps, values, "day") == ([int(ts) for ts in timestamps], values)
+    assert analytics.resample_last([], [], "week") == ([], [])
@@ -0,0 +1,21 @@
+import pytest
+
+pytest.importorskip("pymongo")
+
+from mm.services.balance_cache import get_total_balance
+
+
+def test_worker_apply_invalidates_cached_total(mongo, worker):
+    wallet_id = str(mongo.wallets.insert_one({"user_id": "u1", "actual_balance": 100.0}).inserted_id)
+    tx_id = str(mongo.transactions.insert_one({
+        "user_id": "u1", "wallet_id": wallet_id, "type": "expense", "amount": 40.0, "timestamp": 1_700_000_000,
+    }).inserted_id)
+    assert get_total_balance("u1", lambda: 100.0) == 100.0
+    assert get_total_balance("u1", lambda: -1.0) == 100.0
+
+    worker.enqueue_apply_transaction(tx_id, wallet_id, "u1", "expense", 40.0)
+    slot = mongo.wallet_balance_jobs.find_one()["slot"]
+    assert worker._run_next_job(slot % worker.POOL_SIZE)
+
+    assert mongo.wallets.find_one()["actual_balance"] == 60.0
+    assert get_total_balance("u1", lambda: 60.0) == 60.0
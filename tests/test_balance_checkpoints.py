@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip("pymongo")
+
+from mm.repositories import balance_checkpoints
+from mm.repositories.balance_checkpoints import DAY_SECONDS, BalanceCheckpointRepository
+
+DAY = 1_700_006_400 - 1_700_006_400 % DAY_SECONDS
+
+
+@pytest.fixture
+def repo(mongo, monkeypatch):
+    monkeypatch.setattr(balance_checkpoints, "_indexes_ready", False)
+    monkeypatch.setattr(balance_checkpoints, "_backfilled_users", set())
+    mongo.wallet_balance_checkpoint_state.insert_one({"user_id": "u1", "backfilled_at": 1})
+    return BalanceCheckpointRepository()
+
+
+def test_get_balances_at_uses_latest_checkpoint_before_the_day_plus_partial_day(mongo, repo):
+    mongo.wallet_balance_checkpoints.insert_many([
+        {"user_id": "u1", "wallet_id": "w1", "day": DAY - 3 * DAY_SECONDS, "balance_after": 10.0},
+        {"user_id": "u1", "wallet_id": "w1", "day": DAY - DAY_SECONDS, "balance_after": 30.0},
+        {"user_id": "u1", "wallet_id": "w1", "day": DAY + DAY_SECONDS, "balance_after": 99.0},
+        {"user_id": "u1", "wallet_id": "w2", "day": DAY - 2 * DAY_SECONDS, "balance_after": 5.0},
+        {"user_id": "u2", "wallet_id": "w9", "day": DAY - DAY_SECONDS, "balance_after": 1.0},
+    ])
+    mongo.transactions.insert_many([
+        {"user_id": "u1", "wallet_id": "w2", "timestamp": DAY + 60, "sequence_number": 1, "balance_after": 7.0},
+        {"user_id": "u1", "wallet_id": "w2", "timestamp": DAY + 60, "sequence_number": 2, "balance_after": 8.0},
+        {"user_id": "u1", "wallet_id": "w2", "timestamp": DAY + 7200, "sequence_number": 3, "balance_after": 50.0},
+    ])
+
+    assert repo.get_balances_at("u1", DAY + 3600) == {"w1": 30.0, "w2": 8.0}
+    assert repo.get_balances_at("u1", DAY - 2 * DAY_SECONDS) == {"w1": 10.0}
@@ -0,0 +1,14 @@
+import pytest
+
+pytest.importorskip("pymongo")
+
+from mm.services.index_migrations import LATEST_VERSION, apply_index_migrations, get_applied_version
+
+
+def test_recovery_query_has_a_partial_pending_index(mongo):
+    apply_index_migrations()
+
+    assert get_applied_version() == LATEST_VERSION
+    index = mongo.transactions.index_information()["idx_tx_balance_pending"]
+    assert index["key"] == [("balance_sync", 1), ("updated_at", 1)]
+    assert index["partialFilterExpression"] == {"balance_sync": "pending"}
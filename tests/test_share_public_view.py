@@ -0,0 +1,81 @@
+import pytest
+
+pytest.importorskip("pymongo")
+pytest.importorskip("flask")
+
+from datetime import timedelta
+
+from werkzeug.http import http_date, parse_date
+
+
+@pytest.fixture
+def share_client(mongo, local_cache, monkeypatch):
+    """Flask test client for /myuangly/<username>/<slug> with the page render counted."""
+    import config
+    from mm.services import wallet_balance_worker
+
+    # app imports this at module level; it isn't part of the tree
+    monkeypatch.setattr(config, "get_gemini_api_key", lambda: None, raising=False)
+    # Importing app must not leave worker threads running against later tests' databases
+    monkeypatch.setattr(wallet_balance_worker, "start_wallet_balance_worker", lambda: None)
+    monkeypatch.setenv("INDEX_MIGRATIONS_ON_STARTUP", "0")
+    import app as app_module
+
+    owner_id = mongo.users.insert_one({"username": "ana", "name": "Ana"}).inserted_id
+    mongo.share_public.insert_one({"username": "ana", "slug": "trip", "is_published": True,
+                                   "filters": {}, "date_mode": "all", "updated_at": 1_700_000_000})
+    renders = []
+
+    def render(*args):
+        renders.append(args)
+        return f"page {len(renders)}"
+
+    monkeypatch.setattr(app_module, "_render_share_public_view", render)
+    return app_module.app.test_client(), str(owner_id), renders
+
+
+def test_matching_if_none_match_is_a_304_until_the_data_version_moves(share_client):
+    from mm.services.data_version import bump_data_version
+
+    client, owner_id, renders = share_client
+    first = client.get("/myuangly/ana/trip")
+    etag = first.headers["ETag"]
+    assert (first.status_code, first.get_data(as_text=True)) == (200, "page 1")
+    assert first.headers["Cache-Control"] == "public, no-cache"
+
+    cached = client.get("/myuangly/ana/trip", headers={"If-None-Match": etag})
+    assert (cached.status_code, cached.get_data(), cached.headers["ETag"]) == (304, b"", etag)
+    assert client.get("/myuangly/ana/trip", headers={"If-None-Match": '"other", ' + etag}).status_code == 304
+    assert len(renders) == 1
+
+    bump_data_version(owner_id)
+    fresh = client.get("/myuangly/ana/trip", headers={"If-None-Match": etag})
+    assert (fresh.status_code, fresh.get_data(as_text=True)) == (200, "page 2")
+    assert fresh.headers["ETag"] != etag
+    assert client.get("/myuangly/ana/trip", headers={"If-None-Match": fresh.headers["ETag"]}).status_code == 304
+
+
+def test_if_modified_since_only_304s_a_strictly_newer_copy(share_client):
+    client, _, renders = share_client
+    last_modified = parse_date(client.get("/myuangly/ana/trip").headers["Last-Modified"])
+
+    def status(since, **headers):
+        headers["If-Modified-Since"] = http_date(since)
+        return client.get("/myuangly/ana/trip", headers=headers).status_code
+
+    assert status(last_modified + timedelta(seconds=1)) == 304
+    # Same second: a write right after the copy was cached would look identical
+    assert status(last_modified) == 200
+    assert status(last_modified - timedelta(days=1)) == 200
+    # If-None-Match wins over If-Modified-Since
+    assert status(last_modified + timedelta(seconds=1), **{"If-None-Match": '"stale"'}) == 200
+    # The page itself comes from the rendered-page cache after the first render
+    assert len(renders) == 1
+
+
+def test_unpublished_share_is_not_cached(share_client, mongo):
+    client, _, renders = share_client
+    mongo.share_public.update_one({"slug": "trip"}, {"$set": {"is_published": False}})
+    response = client.get("/myuangly/ana/trip")
+    assert response.status_code == 404 and "ETag" not in response.headers
+    assert renders == []
@@ -0,0 +1,205 @@
+import pytest
+
+pytest.importorskip("pymongo")
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from mm.repositories.transactions import TransactionRepository
+from mm.services import wallet_balance_worker
+
+
+class _FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, spec):
+        for field, direction in reversed(spec):
+            self.docs.sort(key=lambda doc: doc.get(field), reverse=direction < 0)
+        return self
+
+    def skip(self, n):
+        self.docs = self.docs[n:]
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    def __iter__(self):
+        return iter(self.docs)
+
+
+class _FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.projections = []
+
+    def _match(self, query):
+        return [dict(doc) for doc in self.docs if all(doc.get(k) == v for k, v in query.items())]
+
+    def find(self, query, projection=None):
+        self.projections.append(projection)
+        return _FakeCursor(self._match(query))
+
+    def count_documents(self, query):
+        return len(self._match(query))
+
+    def insert_many(self, docs, ordered=True):
+        # Fail on the second row, like a duplicate key would
+        for doc in docs:
+            doc.setdefault("_id", ObjectId())
+        self.docs.append(docs[0])
+        raise BulkWriteError({"nInserted": 1, "writeErrors": [{"index": 1, "code": 11000, "errmsg": "dup"}]})
+
+
+def _repo(docs):
+    repo = TransactionRepository.__new__(TransactionRepository)
+    repo.collection = _FakeCollection(docs)
+    return repo
+
+
+def test_get_user_transactions_paginated_returns_rows():
+    docs = [
+        {"_id": ObjectId(), "user_id": "u1", "type": "expense", "amount": 10 * i, "timestamp": 1_700_000_000 + i}
+        for i in range(5)
+    ] + [{"_id": ObjectId(), "user_id": "u2", "type": "income", "amount": 1, "timestamp": 1_700_000_000}]
+    repo = _repo(docs)
+
+    rows, total = repo.get_user_transactions_paginated("u1", page=2, per_page=2)
+
+    assert total == 5
+    assert [row["amount"] for row in rows] == [20, 10]
+    assert all(isinstance(row["_id"], str) for row in rows)
+
+
+def test_get_user_transactions_paginated_accepts_projection_name():
+    docs = [{"_id": ObjectId(), "user_id": "u1", "type": "income", "amount": 5, "timestamp": 1_700_000_000}]
+    repo = _repo(docs)
+
+    rows, total = repo.get_user_transactions_paginated("u1", projection="list-row")
+
+    assert (len(rows), total) == (1, 1)
+    assert repo.collection.projections[-1]["amount"] == 1
+
+
+def test_insert_many_enqueues_jobs_for_rows_before_a_bulk_write_error(monkeypatch):
+    applied = []
+    rollups = []
+    monkeypatch.setattr(wallet_balance_worker, "enqueue_apply_transactions",
+                        lambda user_id, wallet_id, items: applied.append((wallet_id, items)))
+    repo = _repo([])
+    monkeypatch.setattr(repo, "_enqueue_rollups", rollups.extend)
+    docs = [
+        {"user_id": "u1", "wallet_id": "w1", "type": "expense", "amount": amount, "timestamp": 1_700_000_000,
+         "fk_manual_balance_id": "mb1", "sequence_number": seq}
+        for seq, amount in ((1, 10), (2, 20))
+    ]
+
+    inserted = repo.insert_many(docs)
+
+    assert inserted == [str(docs[0]["_id"])]
+    assert applied == [("w1", [{"transaction_id": inserted[0], "transaction_type": "expense", "amount": 10.0}])]
+    assert [data["amount"] for data, _ in rollups] == [10.0]
+
+
+def _legacy_match(condition, doc):
+    """Evaluate the legacy (no _search_terms) branch with Python's re."""
+    import re
+
+    legacy = condition["$or"][1]["$and"]
+    fields = [doc.get("note") or ""] + list(doc.get("tags") or [])
+    for word in legacy:
+        pattern = word["$or"][0]["note"]["$regex"].replace(r"[^\p{L}\p{N}]", r"[\W_]")
+        if not any(re.search(pattern, value, re.IGNORECASE) for value in fields):
+            return False
+    return True
+
+
+def test_legacy_search_fallback_requires_every_word_as_a_word_prefix():
+    from mm.repositories.transactions import _search_condition, search_terms
+
+    condition = _search_condition("Cof shop")
+    rows = [
+        {"note": "Coffee at the shopping mall"},
+        {"note": "coffee", "tags": ["Shop-local"]},
+        {"note": "coffee only"},
+        {"note": "decaf workshop coffee"},
+    ]
+    legacy = [_legacy_match(condition, row) for row in rows]
+    indexed = [set(condition["$or"][0]["_search_terms"]["$all"]) <= set(search_terms(row["note"], row.get("tags")))
+               for row in rows]
+
+    assert legacy == indexed == [True, True, False, False]
+
+
+def _cursor_rows(mongo):
+    """Heavily tied rows: 3 timestamps x 5 rows, sequence_number tied in pairs and
+    running against _id order, inserted out of order."""
+    import random
+
+    ids = sorted(ObjectId() for _ in range(15))
+    rows = [{"_id": _id, "user_id": "u1", "wallet_id": "w1", "type": "expense", "amount": 1.0,
+             "timestamp": 1_700_000_000 + 60 * (n // 5), "sequence_number": (4 - n % 5) // 2}
+            for n, _id in enumerate(ids)]
+    random.Random(7).shuffle(rows)
+    mongo.transactions.insert_many(rows)
+    return [str(row["_id"]) for row in sorted(rows, key=lambda row: (row["timestamp"], row["_id"]), reverse=True)]
+
+
+def test_cursor_pages_neither_skip_nor_repeat_rows_on_ties(mongo):
+    from mm.repositories.transactions import TransactionRepository
+
+    expected = _cursor_rows(mongo)
+    repo = TransactionRepository()
+
+    pages, cursor = [], None
+    while True:
+        page = repo.get_transactions_with_filters_cursor("u1", cursor=cursor, per_page=4)
+        pages.append([tx["_id"] for tx in page["transactions"]])
+        if not page["next_cursor"]:
+            break
+        cursor = page["next_cursor"]
+    assert [tx_id for page in pages for tx_id in page] == expected
+    assert [len(page) for page in pages] == [4, 4, 4, 3]
+
+    # Walking back from the last page returns the very same pages
+    back = []
+    while page["prev_cursor"]:
+        page = repo.get_transactions_with_filters_cursor("u1", cursor=page["prev_cursor"], per_page=4)
+        back.append([tx["_id"] for tx in page["transactions"]])
+    assert back == pages[-2::-1]
+    assert page["next_cursor"] and not page["prev_cursor"]
+
+
+def test_tampered_or_invalid_cursor_restarts_from_the_first_page(mongo):
+    import base64
+    import json
+
+    from mm.repositories.transactions import TransactionRepository, decode_cursor, encode_cursor
+
+    expected = _cursor_rows(mongo)
+    repo = TransactionRepository()
+    token = repo.get_transactions_with_filters_cursor("u1", per_page=4)["next_cursor"]
+    assert decode_cursor(token)["d"] == "next"
+
+    def forge(**payload):
+        raw = json.dumps(payload).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    tampered = [
+        token[:-3] + ("AAA" if token[-3:] != "AAA" else "BBB"),
+        "not-a-cursor!",
+        "",
+        forge(t="1700000000", i=expected[0], d="next"),
+        forge(t=1_700_000_000, i="nope", d="next"),
+        forge(t=1_700_000_000, i=expected[0], d="sideways"),
+        base64.urlsafe_b64encode(b"[1, 2]").decode("ascii"),
+    ]
+    for bad in tampered:
+        assert decode_cursor(bad) is None, bad
+        page = repo.get_transactions_with_filters_cursor("u1", cursor=bad, per_page=4)
+        assert [tx["_id"] for tx in page["transactions"]] == expected[:4]
+        assert page["prev_cursor"] is None
+
+    assert decode_cursor(encode_cursor({"timestamp": 5, "_id": expected[0]}, "prev")) == {"t": 5, "i": expected[0], "d": "prev"}
@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip("pymongo")
+
+from mm.repositories import tx_rollups
+from mm.repositories.tx_rollups import TxRollupRepository, rollup_delta
+
+
+def _tx(amount, category_id="food"):
+    return {"user_id": "u1", "timestamp": 1_700_000_000, "amount": amount, "type": "expense",
+            "wallet_id": "w1", "scope_id": "s1", "category_id": category_id}
+
+
+def _totals(mongo):
+    return sorted((row["category_id"], row["count"], row["sum"])
+                  for row in mongo.tx_rollups.find({"user_id": "u1", "count": {"$ne": 0}}))
+
+
+@pytest.fixture
+def repo(mongo, monkeypatch):
+    monkeypatch.setattr(tx_rollups, "_bootstrapped_users", set())
+    monkeypatch.setattr(tx_rollups, "_indexes_ready", False)
+    return TxRollupRepository()
+
+
+def test_replayed_rollup_job_after_rebuild_is_a_no_op(mongo, repo):
+    first = _tx(10)
+    mongo.transactions.insert_one(dict(first))
+    repo.apply_deltas([rollup_delta(first, 1)], "job-1")
+
+    repo.rebuild_user("u1")
+    # Lease expired after the delta landed: the job runs again
+    repo.apply_deltas([rollup_delta(first, 1)], "job-1")
+
+    assert _totals(mongo) == [("food", 1, 10.0)]
+
+
+def test_rebuild_marks_queued_rollup_jobs_as_applied(mongo, repo):
+    second = _tx(5, category_id="fuel")
+    mongo.transactions.insert_one(dict(second))
+    job_id = mongo.wallet_balance_jobs.insert_one({
+        "type": "rollup", "partition": "u1:rollups", "status": "pending",
+        "deltas": [rollup_delta(second, 1)],
+    }).inserted_id
+
+    repo.rebuild_user("u1")
+    repo.apply_deltas([rollup_delta(second, 1)], str(job_id))
+
+    assert _totals(mongo) == [("fuel", 1, 5.0)]
+
+
+def test_rebuild_zeroes_rows_without_transactions(mongo, repo):
+    gone = _tx(7, category_id="gone")
+    repo.apply_deltas([rollup_delta(gone, 1)], "job-1")
+
+    repo.rebuild_user("u1")
+
+    assert _totals(mongo) == []
+    assert repo.get_rows("u1") == []
@@ -0,0 +1,200 @@
+import time
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+
+def _wallet(mongo, balance=100.0, user_id="u1"):
+    return str(mongo.wallets.insert_one({"user_id": user_id, "actual_balance": balance}).inserted_id)
+
+
+def _transaction(mongo, wallet_id, amount, tx_type="expense", user_id="u1", **fields):
+    doc = {"user_id": user_id, "wallet_id": wallet_id, "type": tx_type, "amount": amount,
+           "timestamp": 1_700_000_000, "balance_sync": "pending", "updated_at": 0}
+    doc.update(fields)
+    return str(mongo.transactions.insert_one(doc).inserted_id)
+
+
+def _owner(worker, job):
+    return job["slot"] % worker.POOL_SIZE
+
+
+def _balance(mongo, wallet_id):
+    from bson import ObjectId
+    return mongo.wallets.find_one({"_id": ObjectId(wallet_id)})["actual_balance"]
+
+
+def test_claim_leases_a_job_until_its_lease_expires(mongo, worker, monkeypatch):
+    wallet_id = _wallet(mongo)
+    worker.enqueue_apply_transaction(_transaction(mongo, wallet_id, 10.0), wallet_id, "u1", "expense", 10.0)
+    index = _owner(worker, mongo.wallet_balance_jobs.find_one())
+
+    claimed = worker._claim_next_job(index)
+    assert (claimed["status"], claimed["attempts"], claimed["lease_owner"]) == ("leased", 1, worker._worker_id)
+    assert worker._claim_next_job(index) is None
+
+    # The owner died: once the lease runs out another process takes the job over
+    mongo.wallet_balance_jobs.update_one({"_id": claimed["_id"]}, {"$set": {"lease_until": time.time() - 1}})
+    monkeypatch.setattr(worker, "_worker_id", "other-host:1")
+    reclaimed = worker._claim_next_job(index)
+    assert (reclaimed["_id"], reclaimed["attempts"], reclaimed["lease_owner"]) == (claimed["_id"], 2, "other-host:1")
+
+
+def test_replaying_an_applied_op_id_leaves_the_balance_alone(mongo, worker):
+    from mm.repositories.wallets import WalletRepository
+
+    wallet_id = _wallet(mongo)
+    tx_id = _transaction(mongo, wallet_id, 10.0)
+    worker.enqueue_apply_transaction(tx_id, wallet_id, "u1", "expense", 10.0)
+    job = mongo.wallet_balance_jobs.find_one()
+    assert worker._run_next_job(_owner(worker, job))
+    assert _balance(mongo, wallet_id) == 90.0
+
+    # Crash after the $inc but before the ack: the same job runs again
+    mongo.wallet_balance_jobs.insert_one(dict(job, status="pending", attempts=1))
+    assert worker._run_next_job(_owner(worker, job))
+
+    assert _balance(mongo, wallet_id) == 90.0
+    repo = WalletRepository()
+    assert repo.adjust_wallet_balance(wallet_id, "u1", -10.0, op_id=f"apply:{tx_id}") is None
+    assert repo.has_applied_op(wallet_id, "u1", f"apply:{tx_id}")
+
+
+def test_failing_job_backs_off_then_parks_as_failed(mongo, worker, monkeypatch):
+    def boom(job):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(worker, "_process_job", boom)
+    worker.enqueue_recalculate_wallet("u1", _wallet(mongo))
+    job = mongo.wallet_balance_jobs.find_one()
+
+    for attempt in range(1, worker.MAX_ATTEMPTS):
+        assert worker._run_next_job(_owner(worker, job))
+        job = mongo.wallet_balance_jobs.find_one()
+        assert (job["status"], job["attempts"], job["error"]) == ("pending", attempt, "boom")
+        assert job["available_at"] >= time.time() + 2 ** attempt - 5
+        mongo.wallet_balance_jobs.update_one({"_id": job["_id"]}, {"$set": {"available_at": 0}})
+
+    assert worker._run_next_job(_owner(worker, job))
+    job = mongo.wallet_balance_jobs.find_one()
+    assert (job["status"], job["attempts"]) == ("failed", worker.MAX_ATTEMPTS)
+    assert worker._claim_next_job(_owner(worker, job)) is None
+
+
+def test_recovery_re_enqueues_stuck_transactions_once(mongo, worker):
+    wallet_id = _wallet(mongo)
+    stuck = _transaction(mongo, wallet_id, 10.0)
+    _transaction(mongo, wallet_id, 5.0, updated_at=int(time.time()))  # still in its grace period
+
+    assert worker.recover_pending_transactions() == 1
+    assert [job["transaction_id"] for job in mongo.wallet_balance_jobs.find({"type": "apply"})] == [stuck]
+    # Another process booting meanwhile finds the recovery lock taken
+    assert worker.recover_pending_transactions() == 0
+
+
+def test_slot_is_crc32_of_partition_and_only_its_worker_claims_it(mongo, worker, monkeypatch):
+    import zlib
+
+    monkeypatch.setattr(worker, "POOL_SIZE", 4)
+    for n in range(8):
+        worker.enqueue_recalculate_wallet("u1", f"w{n}")
+    mongo.wallet_balance_jobs.insert_one({"type": "recalculate", "user_id": "u1", "wallet_id": "legacy",
+                                          "status": "pending", "available_at": 0, "attempts": 0})
+
+    for job in mongo.wallet_balance_jobs.find({"slot": {"$exists": True}}):
+        partition = f"u1:{job['wallet_id']}"
+        assert (job["partition"], job["slot"]) == (partition, zlib.crc32(partition.encode("utf-8")) % 64)
+        for index in range(worker.POOL_SIZE):
+            assert (job["slot"] in worker._worker_slots(index)) == (index == job["slot"] % worker.POOL_SIZE)
+
+    claimed = {}
+    for index in range(worker.POOL_SIZE):
+        while (job := worker._claim_next_job(index)) is not None:
+            claimed[job["wallet_id"]] = index
+    assert len(claimed) == 9
+    assert claimed.pop("legacy") == 0
+    assert all(index == worker._partition_slot(f"u1:{wallet}") % 4 for wallet, index in claimed.items())
+
+
+def test_two_slots_never_hold_two_leases_on_one_partition(mongo, worker, monkeypatch):
+    monkeypatch.setattr(worker, "POOL_SIZE", 4)
+    def owner(wallet_id):
+        return worker._partition_slot(f"u1:{wallet_id}") % worker.POOL_SIZE
+
+    first = second = _wallet(mongo)
+    while owner(second) == owner(first):
+        second = _wallet(mongo)
+    for wallet_id in (first, first, second):
+        worker.enqueue_apply_transaction(_transaction(mongo, wallet_id, 1.0), wallet_id, "u1", "expense", 1.0)
+    # A stale row of the first wallet's partition left on the legacy slot (owned by worker 0)
+    mongo.wallet_balance_jobs.insert_one({"type": "recalculate", "user_id": "u1", "wallet_id": first,
+                                          "partition": f"u1:{first}", "status": "pending",
+                                          "available_at": 0, "attempts": 0})
+
+    # Two processes sweep every slot; whatever lands on a busy partition is handed back
+    for worker_id in ("host-a:1", "host-b:1"):
+        monkeypatch.setattr(worker, "_worker_id", worker_id)
+        for index in range(worker.POOL_SIZE):
+            job = worker._claim_next_job(index)
+            if job is not None and worker._partition_busy(job):
+                worker._release_job(job, delay=0.5)
+
+    leased = list(mongo.wallet_balance_jobs.find({"status": "leased"}))
+    assert sorted(job["partition"] for job in leased) == sorted([f"u1:{first}", f"u1:{second}"])
+    assert mongo.wallet_balance_jobs.count_documents({"partition": f"u1:{first}", "status": "pending"}) == 2
+
+
+def test_recalculates_coalesce_into_one_debounced_job(mongo, worker):
+    before = time.time()
+    worker.enqueue_recalculate_wallet("u1", "w1", from_timestamp=500)
+    worker.enqueue_recalculate_wallet("u1", "w1", from_timestamp=300)
+    worker.enqueue_recalculate_wallet("u1", "w1", from_timestamp=400)
+
+    (job,) = mongo.wallet_balance_jobs.find()
+    assert job["from_timestamp"] == 300
+    assert job["available_at"] >= before + worker.RECALCULATE_DEBOUNCE_SECONDS
+
+    # (from_timestamp=None relies on BSON ordering null before numbers, which mongomock lacks)
+
+    # Past RECALCULATE_MAX_DELAY_SECONDS the job still absorbs requests but is not pushed back again
+    created_at = time.time() - worker.RECALCULATE_MAX_DELAY_SECONDS - 1
+    mongo.wallet_balance_jobs.update_one({"_id": job["_id"]}, {"$set": {
+        "created_at": created_at, "available_at": created_at, "from_timestamp": 300}})
+    worker.enqueue_recalculate_wallet("u1", "w1", from_timestamp=100)
+    (job,) = mongo.wallet_balance_jobs.find()
+    assert (job["from_timestamp"], job["available_at"]) == (100, created_at)
+
+    # A recalculate that already started is not touched: the next request queues behind it
+    mongo.wallet_balance_jobs.update_one({"_id": job["_id"]}, {"$set": {"status": "leased"}})
+    worker.enqueue_recalculate_wallet("u1", "w1", from_timestamp=50)
+    assert mongo.wallet_balance_jobs.count_documents({"type": "recalculate"}) == 2
+
+
+def test_merged_apply_batch_applies_each_op_exactly_once(mongo, worker):
+    wallet_id = _wallet(mongo)
+    amounts = [10.0, 20.0, 30.0]
+    tx_ids = [_transaction(mongo, wallet_id, amount) for amount in amounts]
+    for tx_id, amount in zip(tx_ids, amounts):
+        worker.enqueue_apply_transaction(tx_id, wallet_id, "u1", "expense", amount)
+    jobs = list(mongo.wallet_balance_jobs.find(sort=[("_id", 1)]))
+    index = _owner(worker, jobs[0])
+
+    assert worker._run_next_job(index)
+    assert mongo.wallet_balance_jobs.count_documents({}) == 0
+    assert _balance(mongo, wallet_id) == 40.0
+    from bson import ObjectId
+    chain = [(tx["balance_before"], tx["balance_after"], tx["balance_sync"])
+             for tx in (mongo.transactions.find_one({"_id": ObjectId(tx_id)}) for tx_id in tx_ids)]
+    assert chain == [(100.0, 90.0, "synced"), (90.0, 70.0, "synced"), (70.0, 40.0, "synced")]
+
+    # The whole batch replays next to one new job: only the new one moves the balance
+    new_tx = _transaction(mongo, wallet_id, 5.0)
+    mongo.wallet_balance_jobs.insert_many([dict(job, status="pending", attempts=0) for job in jobs])
+    worker.enqueue_apply_transaction(new_tx, wallet_id, "u1", "expense", 5.0)
+    while worker._run_next_job(index):
+        pass
+
+    assert _balance(mongo, wallet_id) == 35.0
+    wallet = mongo.wallets.find_one({"_id": ObjectId(wallet_id)})
+    assert sorted(wallet["applied_ops"]) == sorted(f"apply:{tx_id}" for tx_id in tx_ids + [new_tx])